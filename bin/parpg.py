@@ -29,6 +29,9 @@ parser.add_option('-p', '--fife-path',
                   help='Path to the fife module')
 parser.add_option('-m', '--parpg-path',
                   help='Path to the parpg module')
+parser.add_option('-r', '--rebuild-cache', action='store_true', default=False,
+                  help='Parse all data files again instead of using the '
+                       'content cache')
 
 opts, args = parser.parse_args()
 
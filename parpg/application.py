@@ -15,14 +15,17 @@ and the basic Listener for PARPG """
 
 import os
 import sys
+import time
+import logging
 
 from fife import fife
 from fife.extensions import pychan
 from fife.extensions.basicapplication import ApplicationBase
 
-from parpg import console, vfs
+from parpg import console, vfs, contentcache
 from parpg.font import PARPGFont
 from parpg.gamemodel import GameModel
+from parpg.startuploader import StartupLoader
 from parpg.mainmenuview import MainMenuView
 from parpg.mainmenucontroller import MainMenuController
 from parpg.common.listeners.event_listener import EventListener
@@ -33,6 +36,8 @@ from parpg.common.listeners.console_executor import ConsoleExecuter
 from parpg.common.listeners.widget_listener import WidgetListener
 from bGrease.grease_fife.mode import FifeManager
 
+logger = logging.getLogger('application')
+
 class KeyFilter(fife.IKeyFilter):
     """
     This is the implementation of the fife.IKeyFilter class.
@@ -122,12 +127,21 @@ class PARPGApplication(ApplicationBase):
         self.breakRequested = False
         self.returnValues = []
         #self.engine.getModel(self)
+        start_time = time.time()
         self.model = GameModel(self.engine, setting)
-        self.model.readMapFiles()
-        self.model.readObjectDB()
-        self.model.getAgentImportFiles()
-        self.model.readAllAgents()
-        self.model.getDialogues()
+        # The dialogue index and the quests are loaded while the main menu
+        # runs
+        self.startup_loader = StartupLoader(
+            setting.get("parpg", "StartupWorkers", 2))
+        self.model.addStartupStages(self.startup_loader)
+        self.startup_loader.start()
+        self.startup_loader.finish(essential_only=True)
+        cache = contentcache.CACHE
+        logger.info("essential game data loaded in {0:.1f} ms ({1})".format(
+            (time.time() - start_time) * 1000,
+            "{0} files from cache, {1} parsed".format(cache.hits, cache.misses)
+            if cache is not None else "no content cache"
+        ))
         # KLUDGE M. George Hansen 2011-06-04: Hack to allow loaded PyChan XML
         #     scripts to locate their resources.
         os.chdir(setting.get("parpg","DataPath"))
@@ -168,4 +182,10 @@ class PARPGApplication(ApplicationBase):
         if self.listener.quit:
             self.breakRequested = True #pylint: disable-msg=C0103
         else:
+            if not self.startup_loader.isFinished():
+                self.startup_loader.pump()
             self.manager._pump()
+
+    def finishLoading(self):
+        """Waits until all game data is loaded, which a game needs"""
+        self.startup_loader.finish()
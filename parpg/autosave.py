@@ -0,0 +1,171 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Writes autosaves in a worker thread, from a snapshot of the saveable
+state taken on the main thread."""
+
+import os
+import logging
+import threading
+import time
+
+from parpg import savegame, delta
+
+logger = logging.getLogger('autosave')
+
+def replaceFile(source_path, target_path):
+    """Renames a file if it exists, replacing the target"""
+    if not os.path.exists(source_path):
+        return
+    if os.name == "nt" and os.path.exists(target_path):
+        os.remove(target_path)
+    os.rename(source_path, target_path)
+
+def removeFile(path):
+    """Removes a file if it exists"""
+    if os.path.exists(path):
+        os.remove(path)
+
+class SnapshotCopies(object):
+    """Copies the saved values of the objects for the snapshots of the
+    autosaves. The copy of an object is shared with the previous snapshot,
+    unless its values were replaced or marked as changed since then, so
+    that a snapshot only copies what changed."""
+
+    def __init__(self):
+        # The values and their copies of the last snapshot by identifier
+        self.copies = {}
+        self.next_copies = {}
+        # Objects whose values were changed in place since the last snapshot
+        self.changed = set()
+        self.copy_count = 0
+
+    def markChanged(self, identifier):
+        """Marks the saved values of an object as changed in place"""
+        self.changed.add(identifier)
+
+    def copy(self, identifier, values):
+        """Returns a copy of the saved values of an object for the current
+        snapshot, which must not be modified
+        @param identifier: ID of the object
+        @type identifier: str
+        @param values: The saved values of the object
+        @type values: dict"""
+        copied = self.copies.get(identifier)
+        if (copied is None or copied[0] is not values or 
+            identifier in self.changed):
+            copied = (values, delta.copy(values))
+            self.copy_count += 1
+        self.next_copies[identifier] = copied
+        return copied[1]
+
+    def finish(self):
+        """Ends the current snapshot. The objects that weren't copied for it
+        are forgotten."""
+        self.copies = self.next_copies
+        self.next_copies = {}
+        self.changed = set()
+
+    def clear(self):
+        """Forgets all copies, for example when another game is loaded"""
+        self.copies = {}
+        self.next_copies = {}
+        self.changed = set()
+
+class AutoSaver(object):
+    """Writes snapshots of the game to a number of autosave slots, the
+    newest one in the first slot"""
+
+    SLOT_NAME = "autosave_{0}.dat"
+
+    def __init__(self, save_dir, slot_count=3, interval=0.0):
+        """Constructor
+        @param save_dir: Directory to write the autosaves to
+        @type save_dir: str
+        @param slot_count: Number of autosaves to keep
+        @type slot_count: int
+        @param interval: Seconds between timed autosaves, 0 to only
+        autosave when requested
+        @type interval: float"""
+        self.save_dir = save_dir
+        self.slot_count = max(1, slot_count)
+        self.interval = interval
+        self.last_time = time.time()
+        self.thread = None
+
+    def getSlotPath(self, slot):
+        """Returns the path of the file of an autosave slot, starting at 1"""
+        return os.path.join(self.save_dir, self.SLOT_NAME.format(slot))
+
+    def isSaving(self):
+        """Returns whether an autosave is still being written"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def isDue(self, now=None):
+        """Returns whether the interval of the timed autosaves has passed"""
+        if not self.interval:
+            return False
+        if now is None:
+            now = time.time()
+        return now - self.last_time >= self.interval
+
+    def save(self, snapshot):
+        """Starts writing a snapshot in the worker thread, unless an
+        autosave is still being written
+        @param snapshot: The game state, the names and agents of the maps,
+        the items, the original agents of the maps for a delta save or None
+        and the description of the save, as returned by 
+        GameModel.createSnapshot. It must not be modified afterwards.
+        @type snapshot: tuple
+        @return: Whether the autosave was started"""
+        if self.isSaving():
+            return False
+        self.last_time = time.time()
+        self.thread = threading.Thread(target=self.write, args=(snapshot,),
+                                       name="AutoSaver")
+        self.thread.daemon = True
+        self.thread.start()
+        return True
+
+    def wait(self):
+        """Waits until the current autosave is written"""
+        if self.thread is not None:
+            self.thread.join()
+
+    def write(self, snapshot):
+        """Writes a snapshot to the first slot and moves the older autosaves
+        to the next slots, to be called from the worker thread"""
+        start_time = time.time()
+        temp_path = self.getSlotPath(0) + ".tmp"
+        try:
+            if not os.path.isdir(self.save_dir):
+                os.makedirs(self.save_dir)
+            game_state, maps, items, pristine_maps, metadata = snapshot
+            if pristine_maps is not None:
+                maps = savegame.iterMapChanges(maps, pristine_maps)
+            with open(temp_path, "wb") as save_file:
+                savegame.writeSave(save_file, game_state, maps, items,
+                                   compress=True,
+                                   delta=pristine_maps is not None,
+                                   metadata=metadata)
+            for slot in xrange(self.slot_count - 1, 0, -1):
+                replaceFile(self.getSlotPath(slot),
+                            self.getSlotPath(slot + 1))
+            replaceFile(temp_path, self.getSlotPath(1))
+        except Exception, error:
+            logger.error("autosave failed: {0}".format(error))
+            removeFile(temp_path)
+            return
+        logger.info("autosaved in {0:.1f} ms"
+                    .format((time.time() - start_time) * 1000))
@@ -19,6 +19,22 @@ from fife import fife
 
 _AGENT_STATE_NONE, _AGENT_STATE_IDLE, _AGENT_STATE_APPROACH, _AGENT_STATE_RUN, _AGENT_STATE_WANDER, _AGENT_STATE_TALK = xrange(6)
 
+class PositionListener(fife.InstanceChangeListener):
+    """Fife instance listener that reports the position of the agent of a
+    behaviour whenever FIFE moves its instance"""
+    def __init__(self, behaviour):
+        fife.InstanceChangeListener.__init__(self)
+        self.behaviour = behaviour
+
+    def onInstanceChanged(self, instance, info):
+        """@type instance: fife.Instance
+           @param instance: The instance that changed
+           @type info: int
+           @param info: Bitmask of the changes of the instance
+           @return: None"""
+        if info & fife.ICHANGE_LOC:
+            self.behaviour.notifyPosition()
+
 class BaseBehaviour (fife.InstanceActionListener):
     """Fife agent listener"""
     def __init__(self):
@@ -27,6 +43,10 @@ class BaseBehaviour (fife.InstanceActionListener):
         self.state = None
         self.animation_queue = deque()
         self.nextAction = None 
+        # Called with the id and the layer coordinates of the agent when
+        # its position may have changed
+        self.position_observer = None
+        self.position_listener = PositionListener(self)
     
     def attachToLayer(self, agent_ID, layer):
         """Attaches to a certain layer
@@ -37,8 +57,16 @@ class BaseBehaviour (fife.InstanceActionListener):
            @return: None"""
         self.agent = layer.getInstance(agent_ID)
         self.agent.addActionListener(self)
+        self.agent.addChangeListener(self.position_listener)
         self.state = _AGENT_STATE_NONE
         
+    def notifyPosition(self):
+        """Reports the position of the agent to the position observer
+           @return: None"""
+        if self.position_observer is not None and self.agent is not None:
+            coords = self.agent.getLocation().getLayerCoordinates()
+            self.position_observer(self.agent.getId(), (coords.x, coords.y))
+
     def getX(self):
         """Get the NPC's x position on the map.
            @rtype: integer"
@@ -55,9 +83,11 @@ class BaseBehaviour (fife.InstanceActionListener):
         """Sets the agent onto the new layer."""
         if self.agent is not None:
             self.agent.removeActionListener(self)
+            self.agent.removeChangeListener(self.position_listener)
             
         self.agent = layer.getInstance(self.parent.general.identifier)
         self.agent.addActionListener(self)
+        self.agent.addChangeListener(self.position_listener)
         self.state = _AGENT_STATE_NONE
     
     def idle(self):
@@ -74,6 +104,7 @@ class BaseBehaviour (fife.InstanceActionListener):
         act = self.nextAction
         self.nextAction = None 
         self.idle()
+        self.notifyPosition()
         
         if act:
             act.execute()
@@ -110,6 +110,7 @@ class CharacterCreationController(ControllerBase, PARPGWorld):
                 self.char_data.characterstats
             )["primary"]
         )
+        self.model.snapshot_copies.markChanged("PlayerCharacter")
         
     def startNewGame(self):
         """Create the new character and start a new game.
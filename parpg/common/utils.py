@@ -40,19 +40,90 @@ def parseBool(value):
         return value.lower()[0] == "t"
     return False
 
+class DirectoryCache(object):
+    """Listings of VFS directories, which are read once and shared by all
+    locateFiles calls. The data directories don't change while the game
+    runs; invalidate has to be called if they do."""
+
+    def __init__(self):
+        self.vfs = None
+        self.listings = {}
+        self.results = {}
+
+    def getListing(self, directory):
+        """Returns the files and the subdirectories of a VFS directory
+        @param directory: VFS path of the directory
+        @type directory: str
+        @return: A tuple of the lists of the file and directory names"""
+        if self.vfs is not vfs.VFS:
+            # The VFS was replaced, its directories may differ
+            self.invalidate()
+            self.vfs = vfs.VFS
+        listing = self.listings.get(directory)
+        if listing is None:
+            listing = (list(vfs.VFS.listFiles(directory)),
+                       list(vfs.VFS.listDirectories(directory)))
+            self.listings[directory] = listing
+        return listing
+
+    def locateFiles(self, patterns, root):
+        """Returns the paths of the files that match any of the patterns in
+        and below a directory, memoized until invalidate is called"""
+        key = (tuple(patterns), root)
+        if self.vfs is vfs.VFS and key in self.results:
+            return list(self.results[key])
+        filepaths = []
+        directories = [root]
+        while directories:
+            directory = directories.pop(0)
+            filenames, dirnames = self.getListing(directory)
+            for filename in filenames:
+                for pattern in patterns:
+                    if fnmatch.fnmatch(filename, pattern):
+                        filepaths.append('/'.join([directory, filename]))
+                        break
+            # Keep the order of the recursive walk: the files of a directory,
+            # then those of each subdirectory in turn
+            directories[0:0] = ['/'.join([directory, dirname])
+                                for dirname in dirnames]
+        self.results[key] = filepaths
+        return list(filepaths)
+
+    def invalidate(self, root=None):
+        """Forgets the listings of a directory and the directories below
+        it, or of all directories
+        @param root: VFS path of the directory, or None for all
+        @type root: str"""
+        if root is None:
+            self.listings.clear()
+            self.results.clear()
+            return
+        prefix = root + '/'
+        for directory in self.listings.keys():
+            if directory == root or directory.startswith(prefix):
+                del self.listings[directory]
+        # The results of the directories above root include it
+        self.results.clear()
+
+DIRECTORY_CACHE = DirectoryCache()
+
 def locateFiles(pattern, root=os.curdir):
     """Locate all files matching supplied filename pattern in and below
-    supplied root directory."""
-    filepaths = []
-    filenames = vfs.VFS.listFiles(root)
-    for filename in fnmatch.filter(filenames, pattern):
-        vfs_file_path = '/'.join([root, filename])
-        filepaths.append(vfs_file_path)
-    dirnames = vfs.VFS.listDirectories(root)
-    for dirname in dirnames:
-        subdir_filepaths = locateFiles(pattern, '/'.join([root, dirname]))
-        filepaths.extend(subdir_filepaths)
-    return filepaths
+    supplied root directory. The directory listings are cached, see
+    invalidateFiles.
+    @param pattern: A filename pattern, or a list of them to find the files
+    that match any of them in one pass
+    @type pattern: str or list
+    @param root: VFS path of the directory
+    @type root: str
+    @return: A list of the VFS paths of the files"""
+    patterns = (pattern,) if isinstance(pattern, basestring) else pattern
+    return DIRECTORY_CACHE.locateFiles(patterns, root)
+
+def invalidateFiles(root=None):
+    """Makes locateFiles list a VFS directory and the directories below it
+    again, or all directories if root is None"""
+    DIRECTORY_CACHE.invalidate(root)
 
 def dedent_chomp(string):
     """Remove common leading whitespace and chomp each non-blank line."""
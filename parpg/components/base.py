@@ -11,11 +11,76 @@
 #   You should have received a copy of the GNU General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import weakref
+
 from bGrease.component import Component
+from bGrease.component.general import Data
+
+# The registered observers. Bound methods are stored as a weak reference to
+# their object and their function, so that registering doesn't keep the
+# object alive. The other callables are stored with None.
+write_observers = []
+
+def get_observer_key(observer):
+    """Returns the entry of write_observers for a callable"""
+    im_self = getattr(observer, "im_self", None)
+    if im_self is None:
+        return None, observer
+    return weakref.ref(im_self), observer.im_func
+
+def add_write_observer(observer):
+    """Registers a callable that will be called with the entity, the
+    component and the field name every time a component field is written.
+    Bound methods are unregistered when their object is deleted."""
+    key = get_observer_key(observer)
+    if key not in write_observers:
+        write_observers.append(key)
+
+def remove_write_observer(observer):
+    """Unregisters a callable registered with add_write_observer"""
+    key = get_observer_key(observer)
+    if key in write_observers:
+        write_observers.remove(key)
+
+def notify_write_observers(entity, component, name):
+    """Calls the write observers whose objects are still alive and removes
+    the others"""
+    for key in list(write_observers):
+        reference, function = key
+        if reference is None:
+            function(entity, component, name)
+            continue
+        observer_self = reference()
+        if observer_self is None:
+            write_observers.remove(key)
+        else:
+            function(observer_self, entity, component, name)
+
+class ObservedData(Data):
+    """Component data that reports field writes to the write observers"""
+
+    def __init__(self, component, fields, entity, **data):
+        self.__dict__['_ObservedData__component'] = component
+        Data.__init__(self, fields, entity, **data)
+
+    def __setattr__(self, name, value):
+        Data.__setattr__(self, name, value)
+        notify_write_observers(self.entity, self.__component, name)
 
 class Base(Component):
     """Base component for PARPG."""
     
     @property
     def saveable_fields(self):
-        return self.fields.keys()
\ No newline at end of file
+        return self.fields.keys()
+
+    def set(self, entity, data=None, **data_kw):
+        """Set the component data for an entity, adding it to the
+        component if it is not already a member."""
+        if data is not None:
+            for fname in self.fields:
+                if fname not in data_kw and hasattr(data, fname):
+                    data_kw[fname] = getattr(data, fname)
+        data = self[entity] = ObservedData(self, self.fields, entity,
+                                           **data_kw)
+        return data
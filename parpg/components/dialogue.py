@@ -16,7 +16,8 @@ from copy import deepcopy
 from base import Base
 
 class Dialogue(Base):
-    """Component that stores the dialogue"""
+    """Component that stores the name of the dialogue, which is the name of
+    the NPC. GameModel.getDialogue parses the dialogue when it is needed."""
     
     def __init__(self):
         """Constructor"""
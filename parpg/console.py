@@ -26,18 +26,23 @@ class Console:
         exit_help   = "Terminate application"
         grid_help   = "Toggle grid display"
         run_help    = "Toggle player run/walk"
+        dialogues_help = "Show the dialogues that are kept parsed"
         help_help   = "Show this help string"
         load_help   = "Usage: load directory file"
+        maps_help   = "Show the maps that are kept loaded"
         python_help = "Run some python code"
         quit_help   = "Terminate application"
         save_help   = "Usage: save directory file"
         pause_help  = "Pause/Unpause the game"
 
         self.commands = [
+            {"cmd":"dialogues","callback":self.handleDialogues,
+             "help": dialogues_help},
             {"cmd":"exit"  ,"callback":self.handleQuit  ,"help": exit_help},
             {"cmd":"grid"  ,"callback":self.handleGrid  ,"help": grid_help},
             {"cmd":"help"  ,"callback":self.handleHelp  ,"help": help_help},
             {"cmd":"load"  ,"callback":self.handleLoad  ,"help": load_help},
+            {"cmd":"maps"  ,"callback":self.handleMaps  ,"help": maps_help},
             {"cmd":"pause" ,"callback":self.handlePause ,"help": pause_help},
             {"cmd":"python","callback":self.handlePython,"help": python_help},
             {"cmd":"run"   ,"callback":self.handleRun   ,"help": run_help},
@@ -85,6 +90,20 @@ class Console:
             self.app_listener.model.pc_run = 1
             return "PC is now running"
 
+    def handleMaps(self, command):
+        """Implements the maps console command
+           @type command: string
+           @param command: The command to run
+           @return: The resultstring"""
+        return self.app_listener.model.map_cache.getStats()
+
+    def handleDialogues(self, command):
+        """Implements the dialogues console command
+           @type command: string
+           @param command: The command to run
+           @return: The resultstring"""
+        return self.app_listener.model.dialogue_cache.getStats()
+
     def handleHelp(self, command):
         """Implements the help console command 
            @type command: string
@@ -97,6 +116,7 @@ class Console:
 
     def handlePython(self,command):
         globals, locals = self.game_state.getGameEnvironment()
+        globals = dict(globals)
         globals.update({
                         "__name__":"__paprg_console__",
                         "__doc__": None,
@@ -0,0 +1,169 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Cache for the parsed contents of data files.
+
+The parsed objects of each file are pickled into the cache directory,
+together with the modification time, size and SHA-1 hash of the file they
+were parsed from. As long as the file doesn't change they are loaded from
+the cache instead of parsing the file again."""
+
+import os
+import hashlib
+import logging
+import cPickle as pickle
+from cStringIO import StringIO
+
+from parpg import vfs, yamlio
+
+logger = logging.getLogger('contentcache')
+
+# Increase when the format of the cache entries or of the cached objects
+# changes, to discard old entries.
+CACHE_VERSION = 1
+
+# The ContentCache used by load, None to always parse the files
+CACHE = None
+
+class ContentCache(object):
+    """Stores the parsed contents of data files on disk"""
+
+    def __init__(self, source_dir, cache_dir, rebuild=False):
+        """Constructor
+        @param source_dir: Directory that the VFS paths of the files are
+        relative to
+        @type source_dir: str
+        @param cache_dir: Directory to store the cache entries in
+        @type cache_dir: str
+        @param rebuild: Whether to ignore the existing cache entries
+        @type rebuild: bool"""
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.rebuild = rebuild
+        self.hits = 0
+        self.misses = 0
+
+    def getEntryPath(self, path, kind):
+        """Returns the file that caches a parsed file"""
+        key = hashlib.sha1("{0}:{1}".format(kind, path)).hexdigest()
+        return os.path.join(self.cache_dir, key + ".cache")
+
+    def readEntry(self, entry_path):
+        """Returns the cache entry stored in a file, or None"""
+        if self.rebuild or not os.path.exists(entry_path):
+            return None
+        try:
+            with open(entry_path, "rb") as entry_file:
+                entry = pickle.load(entry_file)
+        except Exception, error:
+            logger.warning("ignoring cache entry {0}: {1}"
+                           .format(entry_path, error))
+            return None
+        if entry[0] != CACHE_VERSION:
+            return None
+        return entry
+
+    def writeEntry(self, entry_path, entry):
+        """Stores a cache entry in a file"""
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+            temp_path = entry_path + ".tmp"
+            with open(temp_path, "wb") as entry_file:
+                entry_file.write(data)
+            if os.name == "nt" and os.path.exists(entry_path):
+                os.remove(entry_path)
+            os.rename(temp_path, entry_path)
+        except (IOError, OSError, TypeError, pickle.PicklingError), error:
+            logger.warning("unable to write cache entry {0}: {1}"
+                           .format(entry_path, error))
+
+    def isOnDisk(self, path):
+        """Returns whether a file is on disk, so that load reads it
+        without the VFS
+        @param path: VFS path of the file
+        @type path: str"""
+        return os.path.isfile(os.path.join(self.source_dir, path))
+
+    def load(self, path, parse, kind):
+        """Returns the parsed contents of a file.
+        @param path: VFS path of the file
+        @type path: str
+        @param parse: Function that parses an open file
+        @type parse: callable
+        @param kind: Name that identifies what parse returns, so the same
+        file can be cached in different forms
+        @type kind: str
+        @return: The result of parse"""
+        file_path = os.path.join(self.source_dir, path)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            # The file isn't on disk but in another source of the VFS
+            return parse(vfs.VFS.open(path))
+        entry_path = self.getEntryPath(path, kind)
+        entry = self.readEntry(entry_path)
+        if (entry is not None and entry[1] == stat.st_mtime and
+            entry[2] == stat.st_size):
+            self.hits += 1
+            return entry[4]
+        with open(file_path, "rb") as source_file:
+            data = source_file.read()
+        content_hash = hashlib.sha1(data).hexdigest()
+        if entry is not None and entry[3] == content_hash:
+            # Only the modification time changed
+            self.hits += 1
+            self.writeEntry(entry_path, (CACHE_VERSION, stat.st_mtime,
+                                         stat.st_size, content_hash,
+                                         entry[4]))
+            return entry[4]
+        self.misses += 1
+        contents = parse(StringIO(data))
+        self.writeEntry(entry_path, (CACHE_VERSION, stat.st_mtime,
+                                     stat.st_size, content_hash, contents))
+        return contents
+
+def load(path, parse, kind):
+    """Returns the parsed contents of a VFS file, from the content cache if
+    there is one.
+    @param path: VFS path of the file
+    @type path: str
+    @param parse: Function that parses an open file
+    @type parse: callable
+    @param kind: Name that identifies what parse returns
+    @type kind: str
+    @return: The result of parse"""
+    if CACHE is None:
+        return parse(vfs.VFS.open(path))
+    return CACHE.load(path, parse, kind)
+
+def is_on_disk(path):
+    """Returns whether load reads a VFS file without the VFS, which may
+    only be used by the main thread
+    @param path: VFS path of the file
+    @type path: str"""
+    return CACHE is not None and CACHE.isOnDisk(path)
+
+def parse_yaml_all(stream):
+    """Returns a list of the documents of a YAML stream"""
+    return list(yamlio.load_all(stream))
+
+def load_yaml(path):
+    """Returns the parsed YAML document in a VFS file"""
+    return load(path, yamlio.load, "yaml")
+
+def load_yaml_all(path):
+    """Returns a list of the parsed YAML documents in a VFS file"""
+    return load(path, parse_yaml_all, "yaml_all")
@@ -0,0 +1,85 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Differences between nested dictionaries.
+
+The changes that turn one dictionary into another are a dictionary with a
+tuple for each key that differs: (SET, value) if the key was added or its
+value replaced, (REMOVED,) if the key was removed and (CHANGED, changes)
+if both values are dictionaries, with the changes between them."""
+
+SET = "set"
+REMOVED = "removed"
+CHANGED = "changed"
+
+def copy(value):
+    """Returns a copy of a value made of the basic types of the saves, with
+    every dict, list and set in it copied, so that the copy doesn't change
+    when the value does. The immutable values are not copied.
+    @param value: The value to copy
+    @return: The copy"""
+    if isinstance(value, dict):
+        return dict((key, copy(item)) for key, item in value.iteritems())
+    if isinstance(value, list):
+        return [copy(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(copy(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return type(value)(copy(item) for item in value)
+    return value
+
+def diff(old, new):
+    """Returns the changes that turn a dictionary into another one
+    @param old: The original dictionary
+    @type old: dict
+    @param new: The changed dictionary
+    @type new: dict
+    @return: The changes, empty if the dictionaries are equal"""
+    changes = {}
+    for key, value in new.iteritems():
+        if key in old:
+            old_value = old[key]
+            if old_value == value:
+                continue
+            if isinstance(old_value, dict) and isinstance(value, dict):
+                changes[key] = (CHANGED, diff(old_value, value))
+                continue
+        changes[key] = (SET, value)
+    for key in old:
+        if key not in new:
+            changes[key] = (REMOVED,)
+    return changes
+
+def apply(target, changes):
+    """Applies changes returned by diff to a dictionary
+    @param target: The dictionary to change, which is modified
+    @type target: dict
+    @param changes: The changes to apply
+    @type changes: dict
+    @return: The target"""
+    for key, change in changes.iteritems():
+        if change[0] == SET:
+            target[key] = change[1]
+        elif change[0] == REMOVED:
+            target.pop(key, None)
+        elif change[0] == CHANGED:
+            value = target.get(key)
+            if not isinstance(value, dict):
+                # The original dictionary changed since the changes were
+                # made, keep as much of them as possible
+                value = target[key] = {}
+            apply(value, change[1])
+        else:
+            raise ValueError("unknown change {0!r}".format(change[0]))
+    return target
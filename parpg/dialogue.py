@@ -22,6 +22,22 @@ except ImportError:
     # Python version 2.4-2.6 doesn't have the OrderedDict
     from parpg.common.ordereddict import OrderedDict
 
+def compileCondition(condition):
+    """
+    Compile the Python expression of a condition to a code object that can be
+    passed to eval.
+    
+    @param condition: Boolean Python expression, or None.
+    @type condition: basestring
+    @return: the compiled expression, or None if there is no condition.
+    @rtype: code
+    
+    @raise SyntaxError: the expression is not valid Python.
+    """
+    if (condition is None):
+        return None
+    return compile(condition, '<condition>', 'eval')
+
 class Dialogue(object):
     """
     Represents a complete dialogue and acts as a container for the dialogue
@@ -64,16 +80,16 @@ class Dialogue(object):
         if (sections is not None):
             all_sections += sections
         if (__debug__):
-            section_ids = [section.id for section in all_sections]
+            section_ids = set(section.id for section in all_sections)
+            section_ids.update(['end', 'back'])
         for section in all_sections:
             # Sanity check: All DialogueResponses should have next_section_id
             # attributes that refer to valid DialogueSections in the Dialogue.
             if (__debug__):
                 for response in section.responses:
-                    assert response.next_section_id in section_ids + \
-                        ['end', 'back'], ('"{0}" does not refer to a ' 
-                                          'DialogueSection in this Dialogue')\
-                        .format(response.next_section_id)
+                    assert response.next_section_id in section_ids, \
+                        ('"{0}" does not refer to a DialogueSection in this '
+                         'Dialogue').format(response.next_section_id)
             self.sections[section.id] = section
     
     def __str__(self):
@@ -100,6 +116,58 @@ class DialogueNode(object):
         self.actions = actions or []
 
 
+class ConditionalNode(object):
+    """
+    Mixin for L{DialogueNodes<DialogueNode>} with a condition. The condition
+    is compiled when it is set, so that a syntax error is raised when the
+    dialogue is loaded and evaluating it doesn't parse it again.
+    
+    @ivar compiled_condition: the compiled condition, or None if there is no
+        condition.
+    @type compiled_condition: code
+    """
+    __slots__ = []
+    
+    def condition():
+        def fget(self):
+            return self._condition
+        
+        def fset(self, condition):
+            self.compiled_condition = compileCondition(condition)
+            self._condition = condition
+        
+        return locals()
+    condition = property(**condition())
+    
+    def setCompiledCondition(self, condition, compiled_condition):
+        """
+        Set the condition together with its already compiled code, as it is
+        stored in a dialogue bundle.
+        
+        @param condition: Boolean Python expression, or None.
+        @type condition: basestring
+        @param compiled_condition: the compiled expression, or None.
+        @type compiled_condition: code
+        """
+        self._condition = condition
+        self.compiled_condition = compiled_condition
+    
+    def __getstate__(self):
+        # Code objects can't be pickled, so the condition is compiled again
+        # when the node is unpickled.
+        state = dict(self.__dict__)
+        for name in type(self).__slots__:
+            if (name != 'compiled_condition' and hasattr(self, name)):
+                state[name] = getattr(self, name)
+        return state
+    
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            if (name != '_condition'):
+                setattr(self, name, value)
+        self.condition = state.get('_condition')
+
+
 class DialogueSection(DialogueNode):
     """DialogueNode that represents a distinct section of the dialogue."""
     __slots__ = ['id', 'text', 'responses', 'actions']
@@ -125,7 +193,7 @@ class DialogueSection(DialogueNode):
             self.responses = list(responses)
 
 
-class DialogueGreeting(DialogueSection):
+class DialogueGreeting(ConditionalNode, DialogueSection):
     """
     Represents a root section of dialogue in a L{Dialogue} along with the
     conditional statement used to determine the whether this section should be
@@ -137,8 +205,11 @@ class DialogueGreeting(DialogueSection):
     @ivar condition: Boolean Python expression used to determine if the
         L{DialogueSection} referenced is a valid starting section.
     @type condition: basestring
+    @ivar compiled_condition: the compiled condition.
+    @type compiled_condition: code
     """
-    __slots__ = ['id', 'condition', 'text', 'actions', 'responses']
+    __slots__ = ['id', '_condition', 'compiled_condition', 'text', 'actions',
+                 'responses']
     
     def __init__(self, id_, condition, text, responses=None, actions=None):
         """
@@ -157,18 +228,21 @@ class DialogueGreeting(DialogueSection):
         @param actions: dialogue actions that should be executed when the
             L{DialogueSection} is reached.
         @type actions: list of L{DialogueActions<DialogueAction>}
+        
+        @raise SyntaxError: the condition is not a valid Python expression.
         """
         DialogueSection.__init__(self, id_=id_, text=text, responses=responses,
                                  actions=actions)
         self.condition = condition
 
 
-class DialogueResponse(DialogueNode):
+class DialogueResponse(ConditionalNode, DialogueNode):
     """
     L{DialogueNode} that represents one possible player response to a
     particular L{DialogueSection}.
     """
-    __slots__ = ['text', 'actions', 'condition', 'next_section_id']
+    __slots__ = ['text', 'actions', '_condition', 'compiled_condition',
+                 'next_section_id']
     
     def __init__(self, text, next_section_id, actions=None, condition=None):
         """
@@ -186,6 +260,8 @@ class DialogueResponse(DialogueNode):
             whether the L{DialogueResponse} should be displayed to the player
             as a valid response.
         @type condition: basestring
+        
+        @raise SyntaxError: the condition is not a valid Python expression.
         """
         DialogueNode.__init__(self, text=text, actions=actions)
         self.condition = condition
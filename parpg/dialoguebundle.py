@@ -0,0 +1,376 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Binary bundle of compiled dialogues.
+
+The dialogues are written in YAML, and compile_dialogues.py in
+tools/utilities compiles all of them into one bundle. The game memory-maps
+the bundle and decodes the sections of a dialogue when they are first
+reached, instead of parsing the YAML files.
+
+Layout of a bundle:
+ - A header with the magic bytes, the bundle version, the magic number of
+   the Python version that wrote it, and the offset and size of the index.
+ - A marshalled record for each dialogue, with the NPC name, the avatar and
+   the offsets of the records of its sections.
+ - A marshalled record for each section, with its text, actions and
+   responses. Conditions are stored as compiled code objects, which is why
+   the bundle can only be read by the Python version that wrote it.
+ - The index: the table of the strings that the records refer to by
+   number, and the NPC name, the YAML file, the modification time and size
+   that the YAML file had when it was compiled and the record of each
+   dialogue. The game reads the YAML files that changed since then instead
+   of their records."""
+
+import os
+import imp
+import mmap
+import struct
+import marshal
+from collections import Mapping
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python version 2.4-2.6 doesn't have the OrderedDict
+    from parpg.common.ordereddict import OrderedDict
+
+from parpg.dialogue import (Dialogue, DialogueSection, DialogueGreeting,
+                            DialogueResponse)
+from parpg.dialogueactions import DialogueAction
+
+MAGIC = "PARPGDLG"
+
+# Increase when the layout of the bundle changes
+BUNDLE_VERSION = 2
+
+# Magic bytes, bundle version, Python magic number, index offset and size
+HEADER = struct.Struct("<8sI4sII")
+
+# Kinds of section records
+SECTION = 0
+GREETING = 1
+
+# String number of None
+NO_STRING = -1
+
+class BundleFormatError(Exception):
+    """The file is not a dialogue bundle that this version can read"""
+
+class StringTable(object):
+    """Numbers the distinct strings of a bundle"""
+
+    def __init__(self):
+        self.strings = []
+        self.numbers = {}
+
+    def add(self, string):
+        """Returns the number of a string, adding it if it is new"""
+        if string is None:
+            return NO_STRING
+        # Equal str and unicode strings are stored once, as the first one
+        number = self.numbers.get(string)
+        if number is None:
+            number = self.numbers[string] = len(self.strings)
+            self.strings.append(string)
+        return number
+
+class BundleWriter(object):
+    """Writes dialogues into a bundle"""
+
+    def __init__(self):
+        self.strings = StringTable()
+        self.dialogues = []
+        self.records = []
+        self.size = HEADER.size
+
+    def addRecord(self, record):
+        """Appends a marshalled record and returns its offset and size"""
+        data = marshal.dumps(record)
+        offset = self.size
+        self.records.append(data)
+        self.size += len(data)
+        return offset, len(data)
+
+    def encodeActions(self, actions):
+        """Returns the record of the actions of a section or response"""
+        string = self.strings.add
+        return tuple((string(type(action).keyword),) + action.arguments
+                     for action in actions)
+
+    def encodeSection(self, section):
+        """Adds the record of a section and returns its offset and size"""
+        string = self.strings.add
+        responses = tuple(
+            (string(response.text), string(response.next_section_id),
+             string(response.condition), response.compiled_condition,
+             self.encodeActions(response.actions))
+            for response in getattr(section, "responses", ())
+        )
+        if isinstance(section, DialogueGreeting):
+            condition = (string(section.condition),
+                         section.compiled_condition)
+            kind = GREETING
+        else:
+            condition = (NO_STRING, None)
+            kind = SECTION
+        return self.addRecord((kind, string(section.id), string(section.text))
+                              + condition +
+                              (self.encodeActions(section.actions),
+                               responses))
+
+    def addDialogue(self, dialogue, source_path, source_stat=(None, None)):
+        """Adds a dialogue
+        @param dialogue: The dialogue
+        @type dialogue: L{Dialogue}
+        @param source_path: VFS path of the YAML file of the dialogue
+        @type source_path: str
+        @param source_stat: Modification time and size of the YAML file, or
+        None if it is unknown
+        @type source_stat: tuple"""
+        string = self.strings.add
+        sections = tuple((string(section_id),) + self.encodeSection(section)
+                         for section_id, section in
+                         dialogue.sections.iteritems())
+        offset, size = self.addRecord((
+            string(dialogue.npc_name), string(dialogue.avatar_path),
+            string(dialogue.default_greeting.id),
+            tuple(string(greeting.id) for greeting in dialogue.greetings),
+            sections
+        ))
+        self.dialogues.append((string(dialogue.npc_name), string(source_path))
+                              + tuple(source_stat) + (offset, size))
+
+    def write(self, stream):
+        """Writes the bundle to a stream"""
+        index = marshal.dumps((tuple(self.strings.strings),
+                               tuple(self.dialogues)))
+        stream.write(HEADER.pack(MAGIC, BUNDLE_VERSION, imp.get_magic(),
+                                 self.size, len(index)))
+        for record in self.records:
+            stream.write(record)
+        stream.write(index)
+
+def getSourceStat(source_dir, source_path):
+    """Returns the modification time and size of a YAML file, or None if
+    it isn't on disk"""
+    try:
+        stat = os.stat(os.path.join(source_dir, source_path))
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+def writeBundle(stream, dialogues, source_dir=None):
+    """Writes dialogues into a bundle
+    @param stream: The stream to write the bundle to
+    @type stream: file
+    @param dialogues: The dialogues and the VFS paths of their YAML files
+    @type dialogues: iterable of tuples
+    @param source_dir: Directory that the VFS paths are relative to, to
+    record the modification times and sizes of the YAML files
+    @type source_dir: str"""
+    writer = BundleWriter()
+    for dialogue, source_path in dialogues:
+        source_stat = None
+        if source_dir is not None:
+            source_stat = getSourceStat(source_dir, source_path)
+        writer.addDialogue(dialogue, source_path,
+                           source_stat or (None, None))
+    writer.write(stream)
+
+class BundledDialogue(Dialogue):
+    """L{Dialogue} whose sections are decoded from a bundle when they are
+    first used"""
+    __slots__ = []
+
+    def __init__(self, npc_name, avatar_path, default_greeting, greetings,
+                 sections):
+        # The bundle compiler checked the sections already
+        self.npc_name = npc_name
+        self.avatar_path = avatar_path
+        self.default_greeting = default_greeting
+        self.greetings = greetings
+        self.sections = sections
+
+class BundledSections(Mapping):
+    """The sections of a bundled dialogue by their ids, decoded when they
+    are first accessed"""
+
+    def __init__(self, bundle, records):
+        """Constructor
+        @param bundle: The bundle of the dialogue
+        @type bundle: L{DialogueBundle}
+        @param records: The offsets and sizes of the records of the
+        sections by the section ids
+        @type records: OrderedDict"""
+        self.bundle = bundle
+        self.records = records
+        self.decoded = {}
+
+    def __getitem__(self, section_id):
+        section = self.decoded.get(section_id)
+        if section is None:
+            offset, size = self.records[section_id]
+            section = self.bundle.decodeSection(offset, size)
+            self.decoded[section_id] = section
+        return section
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def getDecodedCount(self):
+        """Returns the number of sections that were decoded"""
+        return len(self.decoded)
+
+class DialogueBundle(object):
+    """A memory-mapped bundle of dialogues"""
+
+    def __init__(self, path):
+        """Opens a bundle
+        @param path: Path of the bundle file
+        @type path: str
+        @raise IOError: The file can't be read
+        @raise BundleFormatError: The file isn't a bundle that this version
+        can read"""
+        with open(path, "rb") as bundle_file:
+            try:
+                self.data = mmap.mmap(bundle_file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            except (ValueError, mmap.error), error:
+                raise BundleFormatError("can't map {0}: {1}".format(path,
+                                                                    error))
+        if len(self.data) < HEADER.size:
+            raise BundleFormatError("{0} is too short".format(path))
+        magic, version, python_magic, index_offset, index_size = \
+            HEADER.unpack(self.data[:HEADER.size])
+        if magic != MAGIC:
+            raise BundleFormatError("{0} is not a dialogue bundle"
+                                    .format(path))
+        if version != BUNDLE_VERSION or python_magic != imp.get_magic():
+            raise BundleFormatError("{0} was compiled by another version, "
+                                    "compile the dialogues again"
+                                    .format(path))
+        try:
+            self.strings, dialogues = self.readRecord(index_offset,
+                                                      index_size)
+        except (ValueError, EOFError, TypeError), error:
+            raise BundleFormatError("the index of {0} is damaged: {1}"
+                                    .format(path, error))
+        self.files = {}
+        self.dialogue_records = {}
+        self.source_stats = {}
+        for (npc_name, source_path, source_mtime, source_size, offset,
+             size) in dialogues:
+            source_path = self.strings[source_path]
+            self.files[self.strings[npc_name]] = source_path
+            self.dialogue_records[source_path] = (offset, size)
+            if source_mtime is not None:
+                self.source_stats[source_path] = (source_mtime, source_size)
+
+    def __contains__(self, source_path):
+        """Returns whether the bundle contains the dialogue of a YAML
+        file"""
+        return source_path in self.dialogue_records
+
+    def discardChangedFiles(self, source_dir):
+        """Stops using the dialogues whose YAML files changed since they
+        were compiled, so that the files are parsed instead. Files that
+        aren't on disk are assumed to be unchanged.
+        @param source_dir: Directory that the VFS paths are relative to
+        @type source_dir: str
+        @return: The VFS paths of the changed files"""
+        changed = []
+        for source_path, source_stat in self.source_stats.items():
+            stat = getSourceStat(source_dir, source_path)
+            if stat is not None and stat != source_stat:
+                del self.dialogue_records[source_path]
+                del self.source_stats[source_path]
+                changed.append(source_path)
+        return sorted(changed)
+
+    def getFiles(self):
+        """Returns the VFS paths of the YAML files of the dialogues by the
+        names of their NPCs"""
+        return dict(self.files)
+
+    def close(self):
+        """Unmaps the bundle"""
+        self.data.close()
+
+    def readRecord(self, offset, size):
+        return marshal.loads(self.data[offset:offset + size])
+
+    def getString(self, number):
+        if number == NO_STRING:
+            return None
+        return self.strings[number]
+
+    def decodeActions(self, actions):
+        """Creates the actions of a section or response"""
+        return [DialogueAction.registered_actions[self.strings[keyword]](
+                    *args, **kwargs)
+                for keyword, args, kwargs in actions]
+
+    def decodeSection(self, offset, size):
+        """Creates a section from its record"""
+        (kind, section_id, text, condition, compiled_condition, actions,
+         responses) = self.readRecord(offset, size)
+        string = self.getString
+        dialogue_responses = []
+        for (response_text, next_section_id, response_condition,
+             compiled_response_condition, response_actions) in responses:
+            response = DialogueResponse(
+                text=string(response_text),
+                next_section_id=string(next_section_id),
+                actions=self.decodeActions(response_actions)
+            )
+            response.setCompiledCondition(string(response_condition),
+                                          compiled_response_condition)
+            dialogue_responses.append(response)
+        if kind == GREETING:
+            section = DialogueGreeting(id_=string(section_id),
+                                       condition=None, text=string(text),
+                                       responses=dialogue_responses,
+                                       actions=self.decodeActions(actions))
+            section.setCompiledCondition(string(condition),
+                                         compiled_condition)
+        else:
+            section = DialogueSection(id_=string(section_id),
+                                      text=string(text),
+                                      responses=dialogue_responses,
+                                      actions=self.decodeActions(actions))
+        return section
+
+    def loadDialogue(self, source_path):
+        """Returns the dialogue of a YAML file, with the default greeting
+        and the greetings decoded and the other sections decoded on demand
+        @param source_path: VFS path of the YAML file
+        @type source_path: str
+        @return: The dialogue
+        @rtype: L{BundledDialogue}"""
+        (npc_name, avatar_path, default_greeting, greetings,
+         section_records) = self.readRecord(*self.dialogue_records[source_path])
+        sections = BundledSections(self, OrderedDict(
+            (self.strings[section_id], (offset, size))
+            for section_id, offset, size in section_records))
+        return BundledDialogue(
+            npc_name=self.strings[npc_name],
+            avatar_path=self.getString(avatar_path),
+            default_greeting=sections[self.strings[default_greeting]],
+            greetings=[sections[self.strings[greeting]]
+                       for greeting in greetings],
+            sections=sections
+        )
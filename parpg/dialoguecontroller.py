@@ -41,14 +41,14 @@ class DialogueController(ControllerBase):
         self.dialogue = None
         self.view = view
         
-    def startTalk(self, npc):
-        if npc.dialogue is not None:
+    def startTalk(self, npc, dialogue):
+        if dialogue is not None:
             self.model.active_map.centerCameraOnPlayer()            
             npc.fifeagent.behaviour.talk(
                 self.model.game_state.\
                 getObjectById("PlayerCharacter").fifeagent
             )
-            self.dialogue = self.view.hud.showDialogue(npc)
+            self.dialogue = self.view.hud.showDialogue(npc, dialogue)
             self.dialogue.initiateDialogue()
             self.model.pause(True)
             self.view.hud.enabled = False
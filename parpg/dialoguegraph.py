@@ -0,0 +1,250 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Static analysis of the graph of the sections of a dialogue.
+
+The dialogue processor keeps a stack of sections. A dialogue starts with
+the default greeting or one of the greetings on the stack, a response that
+goes to a section pushes it, a response that goes "back" pops the current
+section and a response that goes to "end" ends the dialogue. The graph has
+an edge for every response that goes to a section, so a path from a
+greeting is a sequence of pushes and its length is the depth of the stack.
+
+Conditions are not evaluated, the analysis assumes that every response can
+be chosen."""
+
+from collections import OrderedDict, deque
+
+END = "end"
+BACK = "back"
+
+class DialogueGraph(object):
+    """The sections of a dialogue and the sections their responses go to"""
+
+    def __init__(self, dialogue):
+        """Constructor
+        @param dialogue: The dialogue to analyze
+        @type dialogue: L{Dialogue}"""
+        self.npc_name = dialogue.npc_name
+        self.start_ids = [dialogue.default_greeting.id]
+        self.start_ids.extend(greeting.id for greeting in dialogue.greetings)
+        # The sections that the responses of each section go to, once each
+        self.edges = OrderedDict()
+        self.ending_ids = set()
+        self.back_ids = set()
+        self.dead_ends = []
+        self.unknown_targets = []
+        self.response_count = 0
+        for section_id, section in dialogue.sections.items():
+            targets = []
+            responses = getattr(section, "responses", [])
+            for response in responses:
+                target = response.next_section_id
+                if target == END:
+                    self.ending_ids.add(section_id)
+                elif target == BACK:
+                    self.back_ids.add(section_id)
+                elif target not in targets:
+                    targets.append(target)
+            self.response_count += len(responses)
+            if not responses:
+                self.dead_ends.append(section_id)
+            self.edges[section_id] = targets
+        for section_id, targets in self.edges.iteritems():
+            for target in targets:
+                if target not in self.edges:
+                    self.unknown_targets.append((section_id, target))
+        self.reachable = self.findReachable(self.start_ids)
+        self.components = self.findComponents()
+
+    def findReachable(self, start_ids):
+        """Returns the ids of the sections that can be reached from the
+        given sections, in the order they are found"""
+        reachable = OrderedDict()
+        pending = deque()
+        for section_id in start_ids:
+            if section_id in self.edges and section_id not in reachable:
+                reachable[section_id] = True
+                pending.append(section_id)
+        while pending:
+            for target in self.edges[pending.popleft()]:
+                if target in self.edges and target not in reachable:
+                    reachable[target] = True
+                    pending.append(target)
+        return reachable.keys()
+
+    def findComponents(self):
+        """Returns the strongly connected components of the graph, each a
+        list of section ids. A component is returned after all components
+        that it has edges to. The search is iterative, so that long chains
+        of sections don't exceed the recursion limit."""
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+        for root in self.edges:
+            if root in index:
+                continue
+            work = [(root, iter(self.edges[root]))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                section_id, targets = work[-1]
+                for target in targets:
+                    if target not in self.edges:
+                        continue
+                    if target not in index:
+                        index[target] = lowlink[target] = len(index)
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(self.edges[target])))
+                        break
+                    elif target in on_stack:
+                        lowlink[section_id] = min(lowlink[section_id],
+                                                  index[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent],
+                                              lowlink[section_id])
+                    if lowlink[section_id] == index[section_id]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == section_id:
+                                break
+                        component.reverse()
+                        components.append(component)
+        return components
+
+    def isCyclic(self, component):
+        """Returns whether a strongly connected component contains a
+        cycle"""
+        return (len(component) > 1 or
+                component[0] in self.edges[component[0]])
+
+    def getUnreachableSections(self):
+        """Returns the ids of the sections that no greeting leads to"""
+        reachable = set(self.reachable)
+        return [section_id for section_id in self.edges
+                if section_id not in reachable]
+
+    def getDeadEnds(self):
+        """Returns the ids of the reachable sections without responses,
+        which the player can't leave"""
+        reachable = set(self.reachable)
+        return [section_id for section_id in self.dead_ends
+                if section_id in reachable]
+
+    def getTraps(self):
+        """Returns the ids of the reachable sections with responses from
+        which no sequence of responses leads to "end" or "back", so that the
+        dialogue can't be ended"""
+        predecessors = dict((section_id, []) for section_id in self.edges)
+        for section_id, targets in self.edges.iteritems():
+            for target in targets:
+                if target in predecessors:
+                    predecessors[target].append(section_id)
+        exits = set(self.ending_ids | self.back_ids)
+        pending = list(exits)
+        while pending:
+            section_id = pending.pop()
+            for predecessor in predecessors[section_id]:
+                if predecessor not in exits:
+                    exits.add(predecessor)
+                    pending.append(predecessor)
+        dead_ends = set(self.dead_ends)
+        return [section_id for section_id in self.reachable
+                if section_id not in exits and section_id not in dead_ends]
+
+    def getBackMisuses(self):
+        """Returns the ids of the greetings with a response that goes
+        "back". A greeting is the only section on the stack when the
+        dialogue starts, so going back from it fails."""
+        return [section_id for section_id in self.start_ids
+                if section_id in self.back_ids]
+
+    def getCycles(self):
+        """Returns the reachable cycles as lists of section ids. Every time
+        the player goes around a cycle the sections are pushed again, unless
+        a response goes back."""
+        reachable = set(self.reachable)
+        return [component for component in self.components
+                if component[0] in reachable and self.isCyclic(component)]
+
+    def getMaxDepth(self):
+        """Returns the largest number of sections on the stack, or None if
+        a cycle makes it unbounded"""
+        depths = {}
+        for component in self.components:
+            if self.isCyclic(component):
+                depth = None
+            else:
+                section_id = component[0]
+                depth = 1
+                for target in self.edges[section_id]:
+                    if target not in depths:
+                        continue
+                    if depths[target] is None:
+                        depth = None
+                        break
+                    depth = max(depth, depths[target] + 1)
+            for section_id in component:
+                depths[section_id] = depth
+        max_depth = 0
+        for section_id in self.start_ids:
+            depth = depths.get(section_id, 0)
+            if depth is None:
+                return None
+            max_depth = max(max_depth, depth)
+        return max_depth
+
+    def getProblems(self):
+        """Returns a description of each problem of the dialogue"""
+        problems = []
+        for section_id, target in self.unknown_targets:
+            problems.append("section {0} goes to unknown section {1}"
+                            .format(section_id, target))
+        for section_id in self.getBackMisuses():
+            problems.append("greeting {0} goes back, but there is no "
+                            "section to go back to".format(section_id))
+        for section_id in self.getUnreachableSections():
+            problems.append("section {0} is unreachable".format(section_id))
+        for section_id in self.getDeadEnds():
+            problems.append("section {0} has no responses"
+                            .format(section_id))
+        for section_id in self.getTraps():
+            problems.append("the dialogue can't end after section {0}"
+                            .format(section_id))
+        return problems
+
+    def getReport(self):
+        """Returns a description of the size of the dialogue, the depth of
+        its section stack, its cycles and its problems"""
+        max_depth = self.getMaxDepth()
+        lines = ["{0}: {1} sections, {2} reachable, {3} responses, "
+                 "stack depth {4}".format(
+                     self.npc_name, len(self.edges), len(self.reachable),
+                     self.response_count,
+                     "unbounded" if max_depth is None else max_depth)]
+        for cycle in self.getCycles():
+            lines.append("    cycle through {0}".format(", ".join(cycle)))
+        for problem in self.getProblems():
+            lines.append("    " + problem)
+        return "\n".join(lines)
@@ -0,0 +1,297 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Index of the dialogue files by the names of their NPCs, and a bounded
+cache of the parsed dialogues.
+
+Finding the dialogue of an NPC only needs the NPC_NAME of each dialogue
+file, which the index reads from the top-level lines of the file without
+building the sections of the dialogue. The names are stored in the cache
+directory together with the size and modification time of each file, so
+only new or changed files are read again. The dialogues themselves are
+parsed when an NPC is first talked to, or when its map is preloaded, and
+only a limited number of them is kept."""
+
+import os
+import marshal
+import logging
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python version 2.4-2.6 doesn't have the OrderedDict
+    from parpg.common.ordereddict import OrderedDict
+
+from parpg import vfs, yamlio, contentcache
+from parpg.common.utils import locateFiles
+
+logger = logging.getLogger('dialogueindex')
+
+# Increase when the layout of the index changes
+INDEX_VERSION = 1
+
+INDEX_NAME = "dialogues.idx"
+
+NPC_NAME_KEY = "NPC_NAME:"
+
+# Bytes read at a time while looking for the NPC name
+CHUNK_SIZE = 512
+
+def readNpcName(stream):
+    """Returns the NPC_NAME of a dialogue file, reading only up to the line
+    that defines it
+    @param stream: The dialogue file
+    @type stream: file
+    @return: The name, or None if the file doesn't define one"""
+    header = ""
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        header += chunk
+        lines = header.splitlines()
+        if chunk:
+            # The last line may continue in the next chunk
+            lines = lines[:-1]
+        for line in lines:
+            if line.startswith(NPC_NAME_KEY):
+                return yamlio.load(line)["NPC_NAME"]
+        if not chunk:
+            return None
+
+class DialogueIndex(object):
+    """The NPC names of the dialogue files in a directory tree"""
+
+    def __init__(self, source_dir, index_path=None, rebuild=False):
+        """Constructor
+        @param source_dir: Directory that the VFS paths are relative to
+        @type source_dir: str
+        @param index_path: File that the index is stored in, or None to not
+        store it
+        @type index_path: str
+        @param rebuild: Whether to ignore the stored index
+        @type rebuild: bool"""
+        self.source_dir = source_dir
+        self.index_path = index_path
+        self.entries = {} if rebuild else self.readIndex()
+        self.changed = False
+        self.scanned_files = 0
+
+    def readIndex(self):
+        """Returns the stored entries, or an empty dictionary if there is no
+        usable index"""
+        if self.index_path is None:
+            return {}
+        try:
+            with open(self.index_path, "rb") as index_file:
+                version, entries = marshal.load(index_file)
+        except (IOError, EOFError, ValueError, TypeError):
+            return {}
+        if version != INDEX_VERSION or not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def writeIndex(self):
+        """Stores the entries if they changed"""
+        if self.index_path is None or not self.changed:
+            return
+        temp_path = self.index_path + ".tmp"
+        try:
+            index_dir = os.path.dirname(self.index_path)
+            if index_dir and not os.path.isdir(index_dir):
+                os.makedirs(index_dir)
+            with open(temp_path, "wb") as index_file:
+                marshal.dump((INDEX_VERSION, self.entries), index_file)
+            if os.name == "nt" and os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            os.rename(temp_path, self.index_path)
+        except (IOError, OSError), error:
+            logger.warning("unable to write the dialogue index: {0}"
+                           .format(error))
+            return
+        self.changed = False
+
+    def scanFile(self, filepath):
+        """Reads the NPC name of a dialogue file, logging errors"""
+        self.scanned_files += 1
+        try:
+            return readNpcName(vfs.VFS.open(filepath))
+        except Exception, error:
+            logger.error("Error reading dialogue file {0}: {1}"
+                         .format(filepath, error))
+            return None
+
+    def getNpcName(self, filepath):
+        """Returns the NPC name of a dialogue file, from the index if the
+        file didn't change"""
+        try:
+            stat = os.stat(os.path.join(self.source_dir, filepath))
+        except OSError:
+            # The file isn't on disk but in another source of the VFS
+            return self.scanFile(filepath)
+        stamp = (stat.st_size, stat.st_mtime)
+        entry = self.entries.get(filepath)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        npc_name = self.scanFile(filepath)
+        self.entries[filepath] = (stamp, npc_name)
+        self.changed = True
+        return npc_name
+
+    def locateDialogues(self, root, pattern="*.yaml"):
+        """Returns the dialogue files in and below a directory
+        @param root: VFS path of the directory
+        @type root: str
+        @param pattern: Pattern of the names of the dialogue files
+        @type pattern: str
+        @return: A dictionary of the VFS paths of the files by the names of
+        their NPCs"""
+        dialogue_files = {}
+        filepaths = locateFiles(pattern, root)
+        for filepath in filepaths:
+            npc_name = self.getNpcName(filepath)
+            if npc_name is None:
+                continue
+            if npc_name in dialogue_files:
+                logger.warning("{0} has a dialogue in {1} and {2}, using "
+                               "the latter".format(npc_name,
+                                                   dialogue_files[npc_name],
+                                                   filepath))
+            dialogue_files[npc_name] = filepath
+        # Forget about files that were removed
+        found = set(filepaths)
+        for filepath in self.entries.keys():
+            if filepath.startswith(root + '/') and filepath not in found:
+                del self.entries[filepath]
+                self.changed = True
+        self.writeIndex()
+        return dialogue_files
+
+def locateDialogues(root, pattern="*.yaml"):
+    """Returns the dialogue files in and below a VFS directory, using an
+    index in the directory of the content cache if there is one
+    @param root: VFS path of the directory
+    @type root: str
+    @param pattern: Pattern of the names of the dialogue files
+    @type pattern: str
+    @return: A dictionary of the VFS paths of the files by the names of
+    their NPCs"""
+    cache = contentcache.CACHE
+    if cache is None:
+        dialogue_index = DialogueIndex(os.curdir)
+    else:
+        dialogue_index = DialogueIndex(cache.source_dir,
+                                       os.path.join(cache.cache_dir,
+                                                    INDEX_NAME),
+                                       cache.rebuild)
+    dialogue_files = dialogue_index.locateDialogues(root, pattern)
+    logger.info("found {0} dialogue files, read {1}"
+                .format(len(dialogue_files), dialogue_index.scanned_files))
+    return dialogue_files
+
+class DialogueCache(object):
+    """The parsed dialogues by the names of their NPCs, ordered from the
+    least to the most recently used. When there are more dialogues than the
+    budget allows, the least recently used ones are dropped."""
+
+    def __init__(self, parse, max_dialogues=0):
+        """Constructor
+        @param parse: Function that parses the dialogue file with the given
+        VFS path and returns the dialogue, or None if it can't be parsed
+        @type parse: callable
+        @param max_dialogues: Number of dialogues to keep, 0 for no limit
+        @type max_dialogues: int"""
+        self.parse = parse
+        self.max_dialogues = max_dialogues
+        self.files = {}
+        self.dialogues = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, npc_name):
+        """Returns whether there is a dialogue for an NPC"""
+        return npc_name in self.files
+
+    def setFiles(self, dialogue_files):
+        """Sets the dialogue files and forgets about the parsed dialogues
+        @param dialogue_files: The VFS paths of the files by the names of
+        their NPCs
+        @type dialogue_files: dict"""
+        self.files = dict(dialogue_files)
+        self.dialogues.clear()
+
+    def isResident(self, npc_name):
+        """Returns whether the dialogue of an NPC is parsed"""
+        return npc_name in self.dialogues
+
+    def getDialogue(self, npc_name):
+        """Returns the dialogue of an NPC, parsing it if it isn't resident,
+        and marks it as the most recently used one
+        @param npc_name: Name of the NPC
+        @type npc_name: str
+        @return: The dialogue, or None if the NPC has none or it can't be
+        parsed"""
+        if npc_name in self.dialogues:
+            self.hits += 1
+            dialogue = self.dialogues.pop(npc_name)
+        else:
+            filepath = self.files.get(npc_name)
+            if filepath is None:
+                return None
+            self.misses += 1
+            dialogue = self.parse(filepath)
+            if dialogue is None:
+                return None
+        self.add(npc_name, dialogue)
+        return dialogue
+
+    def parseDialogues(self, npc_names, parse=None):
+        """Parses the dialogues of NPCs that aren't resident, without
+        storing them. It uses only the file names, so it may be called from
+        another thread if the parse function may be.
+        @param npc_names: Names of the NPCs
+        @type npc_names: iterable
+        @param parse: Function to use instead of the parse function of the
+        cache, which may return None to skip a dialogue
+        @type parse: callable
+        @return: A dictionary of the parsed dialogues by the NPC names"""
+        if parse is None:
+            parse = self.parse
+        dialogues = {}
+        for npc_name in npc_names:
+            filepath = self.files.get(npc_name)
+            if filepath is None or npc_name in self.dialogues:
+                continue
+            dialogue = parse(filepath)
+            if dialogue is not None:
+                dialogues[npc_name] = dialogue
+        return dialogues
+
+    def add(self, npc_name, dialogue):
+        """Stores a parsed dialogue as the most recently used one, dropping
+        the least recently used dialogues that exceed the budget"""
+        self.dialogues.pop(npc_name, None)
+        self.dialogues[npc_name] = dialogue
+        while self.max_dialogues and len(self.dialogues) > self.max_dialogues:
+            dropped_name, dropped = self.dialogues.popitem(last=False)
+            logger.debug("dropped dialogue of {0}".format(dropped_name))
+
+    def clear(self):
+        """Forgets about the parsed dialogues"""
+        self.dialogues.clear()
+
+    def getStats(self):
+        """Returns a description of the parsed dialogues and how often they
+        were found resident"""
+        return ("{0} of {1} dialogues resident: {2}; {3} hits, {4} misses"
+                .format(len(self.dialogues), len(self.files),
+                        ", ".join(reversed(self.dialogues.keys())) or "none",
+                        self.hits, self.misses))
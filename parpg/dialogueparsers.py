@@ -24,22 +24,17 @@ dialogue-related data.
     original (and mostly unhelpful) error message.
 @TODO Technomage 2010-11-13: Support reading and writing unicode.
 """
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from StringIO import StringIO
 from collections import Sequence
 try:
     from collections import OrderedDict
 except ImportError:
     # Python version 2.4-2.6 doesn't have the OrderedDict
     from parpg.common.ordereddict import OrderedDict
-import re
 import textwrap
 
 import yaml
 
-from parpg import COPYRIGHT_HEADER
+from parpg import COPYRIGHT_HEADER, yamlio
 from parpg.dialogue import (Dialogue, DialogueSection, DialogueResponse,
     DialogueGreeting)
 from parpg.dialogueactions import DialogueAction
@@ -94,6 +89,112 @@ class AbstractDialogueParser(object):
                                   'override the validate method.')
 
 
+class DialogueLineFormatter(object):
+    """
+    Stream that a YAML dumper writes a serialized L{Dialogue} into. Each line
+    is formatted for readability as soon as the dumper has completed it and
+    then written to the output stream, so only the current line is buffered.
+    
+    A GOTO line is followed by an indented blank line, which separates the
+    responses of a section, and long SAY, REPLY and CONDITION lines are
+    wrapped at word boundaries with escaped line breaks.
+    """
+    max_line_length = 76 # 79 - 3 chars for escaping newlines
+    wrapped_keys = ('SAY', 'REPLY', 'CONDITION')
+    
+    def __init__(self, output_stream):
+        """
+        Initialize a new L{DialogueLineFormatter} instance.
+        
+        @param output_stream: open stream into which the formatted lines
+            should be written.
+        @type output_stream: BufferType
+        """
+        self.output_stream = output_stream
+        self.partial_line = ''
+        self.separator = ''
+        self.text_wrappers = {}
+    
+    def write(self, data):
+        """
+        Format and write the lines that the data completes.
+        
+        @param data: serialized YAML as written by the dumper.
+        @type data: basestring
+        """
+        if (isinstance(data, unicode)):
+            data = data.encode('utf-8')
+        lines = (self.partial_line + data).split('\n')
+        self.partial_line = lines.pop()
+        if (lines):
+            self._writeLines(lines)
+    
+    def close(self):
+        """Format and write the last line if it isn't terminated."""
+        if (self.partial_line):
+            self._writeLines([self.partial_line])
+            self.partial_line = ''
+    
+    def _writeLines(self, lines):
+        formatted_lines = []
+        for line in lines:
+            stripped_line = line.lstrip()
+            if (stripped_line.startswith('GOTO: ')):
+                formatted_lines.append(line)
+                formatted_lines.append(line[:len(line) - len(stripped_line)])
+                continue
+            if (len(line) > self.max_line_length):
+                initial_indent = self._getWrapIndent(line, stripped_line)
+                if (initial_indent is not None):
+                    line = self._wrapLine(line, initial_indent)
+            formatted_lines.append(line)
+        # The lines are separated, not terminated, by line breaks.
+        self.output_stream.write(self.separator + '\n'.join(formatted_lines))
+        self.separator = '\n'
+    
+    def _getWrapIndent(self, line, stripped_line):
+        """
+        Return the length of the indentation, including a sequence entry
+        indicator, of a line with a double-quoted SAY, REPLY or CONDITION, or
+        None if the line has none of these.
+        """
+        if (stripped_line.startswith('-')):
+            item = stripped_line[1:].lstrip()
+            if (len(item) == len(stripped_line) - 1):
+                return None
+            stripped_line = item
+        key, colon, value = stripped_line.partition(':')
+        if (key not in self.wrapped_keys or not colon):
+            return None
+        quoted_value = value.lstrip()
+        if (len(quoted_value) == len(value) or len(quoted_value) < 2 or
+            not quoted_value.startswith('"') or
+            not quoted_value.endswith('"')):
+            return None
+        return len(line) - len(stripped_line)
+    
+    def _wrapLine(self, line, initial_indent):
+        subsequent_indent = initial_indent + 4
+        text_wrapper = self.text_wrappers.get(initial_indent)
+        if (text_wrapper is None):
+            text_wrapper = textwrap.TextWrapper(
+                self.max_line_length,
+                subsequent_indent=' ' * subsequent_indent,
+                break_long_words=False,
+                break_on_hyphens=False
+            )
+            self.text_wrappers[initial_indent] = text_wrapper
+        wrapped_lines = text_wrapper.wrap(line)
+        # Escape the first space of the continuation lines, as the YAML
+        # parser strips the indentation of a double-quoted scalar.
+        continuation_indent = ' ' * (subsequent_indent - 1) + '\\ '
+        wrapped_lines[1:] = [
+            continuation_indent + wrapped_line[subsequent_indent:]
+            for wrapped_line in wrapped_lines[1:]
+        ]
+        return '\\\n'.join(wrapped_lines)
+
+
 class YamlDialogueParser(AbstractDialogueParser):
     """
     L{AbstractDialogueParser} subclass responsible for parsing dialogues
@@ -101,7 +202,7 @@ class YamlDialogueParser(AbstractDialogueParser):
     """
     logger = logging.getLogger('dialogueparser.OldYamlDialogueParser')
     
-    def load(self, stream, loader_class=yaml.Loader):
+    def load(self, stream, loader_class=yamlio.Loader):
         """
         Parse a YAML stream and attempt to construct a new L{Dialogue}
         instance.
@@ -110,17 +211,21 @@ class YamlDialogueParser(AbstractDialogueParser):
             a L{Dialogue}.
         @type stream: BufferType
         @param loader_class: PyYAML loader class to use for reading the
-            serialization.
+            serialization, by default the safe loader of L{yamlio}.
         @type loader_class: yaml.BaseLoader subclass
         """
         loader = loader_class(stream)
         dialogue = self._constructDialogue(loader, loader.get_single_node())
         return dialogue
     
-    def dump(self, dialogue, output_stream, dumper_class=yaml.Dumper):
+    def dump(self, dialogue, output_stream, dumper_class=yamlio.Dumper):
         """
         Serialize a L{Dialogue} instance as YAML and dump it to an open stream.
         
+        The dialogue is emitted one section at a time and every line is
+        formatted as soon as it is complete, so the serialization is never
+        held in memory as a whole.
+        
         @param dialogue: dialogue to serialize.
         @type dialogue: L{Dialogue}
         @param stream: open stream into which the serialized L{Dialogue} should
@@ -130,109 +235,106 @@ class YamlDialogueParser(AbstractDialogueParser):
             serialization.
         @type dumper_class: yaml.BaseDumper subclass
         """
-        intermediate_stream = StringIO()
+        output_stream.write(COPYRIGHT_HEADER)
+        line_formatter = DialogueLineFormatter(output_stream)
         # KLUDE Technomage 2010-11-16: The "width" argument seems to be broken,
         #     as it doesn't take into about current line indentation and fails
         #     to correctly wrap at word boundaries.
-        dumper = dumper_class(intermediate_stream, default_flow_style=False,
+        dumper = dumper_class(line_formatter, default_flow_style=False,
                               indent=4, width=99999, line_break='\n',
-                              allow_unicode=True, explicit_start=True,
-                              explicit_end=True, tags=False)
-        dialogue_node = self._representDialogue(dumper, dialogue)
-        dumper.open()
-        dumper.serialize(dialogue_node)
-        dumper.close()
-        file_contents = intermediate_stream.getvalue()
-        
-        file_contents = re.sub(r'(\n|\r|\r\n)(\s*)(GOTO: .*)', r'\1\2\3\1\2',
-                               file_contents)
-        lines = file_contents.splitlines()
-        max_line_length = 76 # 79 - 3 chars for escaping newlines
-        for i in range(len(lines)):
-            line = lines[i]
-            match = re.match(
-                r'^(\s*(?:-\s+)?)(SAY|REPLY|CONDITION):\s+"(.*)"$',
-                line
-            )
-            if (match and len(line) > max_line_length):
-                # Wrap long lines for readability.
-                initial_indent = len(match.group(1))
-                subsequent_indent = initial_indent + 4
-                text_wrapper = textwrap.TextWrapper(
-                    max_line_length,
-                    subsequent_indent=' ' * subsequent_indent,
-                    break_long_words=False,
-                    break_on_hyphens=False
-                )
-                new_lines = text_wrapper.wrap(line)
-                new_lines = (
-                    new_lines[:1] + [re.sub(r'^(\s*) (.*)$', r'\1\ \2', l)
-                                     for l in new_lines[1:]]
-                )
-                lines[i] = '\\\n'.join(new_lines)
-        
-        output_stream.write(COPYRIGHT_HEADER)
-        output_stream.write('\n'.join(lines))
-        
+                              allow_unicode=True)
+        dumper.emit(yaml.StreamStartEvent())
+        dumper.emit(yaml.DocumentStartEvent(explicit=True))
+        self._emitDialogue(dumper, dialogue)
+        dumper.emit(yaml.DocumentEndEvent(explicit=True))
+        dumper.emit(yaml.StreamEndEvent())
+        line_formatter.close()
     
-    def _representDialogue(self, dumper, dialogue):
-        dialogue_node = dumper.represent_dict({})
-        dialogue_dict = OrderedDict()
-        dialogue_dict['NPC_NAME'] = dialogue.npc_name
-        dialogue_dict['AVATAR_PATH'] = dialogue.avatar_path
-        dialogue_dict['DEFAULT_GREETING'] = \
-            self._representDialogueSection(dumper,
-                                           dialogue.default_greeting)
+    def _emitDialogue(self, dumper, dialogue):
         # NOTE Technomage 2010-11-16: Dialogue stores its sections in an
         #     OrderedDict, so a round-trip load, dump, and load will preserve
         #     the order of DialogueSections.
+        greeting_ids = set(greeting.id for greeting in dialogue.greetings)
+        greeting_ids.add(dialogue.default_greeting.id)
+        sections = [section for section_id, section in
+                    dialogue.sections.items()
+                    if section_id not in greeting_ids]
+        
+        dumper.emit(yaml.MappingStartEvent(None, None, True, flow_style=False))
+        self._emitNode(dumper, dumper.represent_data('NPC_NAME'))
+        self._emitNode(dumper, dumper.represent_data(dialogue.npc_name))
+        self._emitNode(dumper, dumper.represent_data('AVATAR_PATH'))
+        self._emitNode(dumper, dumper.represent_data(dialogue.avatar_path))
+        self._emitNode(dumper, dumper.represent_data('DEFAULT_GREETING'))
+        self._emitNode(dumper,
+                       self._representDialogueSection(
+                           dumper,
+                           dialogue.default_greeting
+                       ))
         if (len(dialogue.greetings) > 0):
-            greetings_list_node = dumper.represent_list([])
-            greetings_list = greetings_list_node.value
+            self._emitNode(dumper, dumper.represent_data('GREETINGS'))
+            dumper.emit(yaml.SequenceStartEvent(None, None, True,
+                                                flow_style=False))
             for greeting in dialogue.greetings:
-                greeting_node = \
-                    self._representRootDialogueSection(dumper, greeting)
-                greetings_list.append(greeting_node)
-            dialogue_dict['GREETINGS'] = greetings_list_node
-        if (len(dialogue.setions) > 0):
-            sections_list_node = dumper.represent_list([])
-            sections_list = sections_list_node.value
-            for section in dialogue.sections.values():
-                section_node = self._representDialogueSection(dumper, section)
-                sections_list.append(section_node)
-            dialogue_dict['SECTIONS'] = sections_list_node
-        
-        for key, value in dialogue_dict.items():
-            if (isinstance(key, yaml.Node)):
-                key_node = key
-            else:
-                key_node = dumper.represent_data(key)
-            if (isinstance(value, yaml.Node)):
-                value_node = value
-            else:
-                value_node = dumper.represent_data(value)
-            dialogue_node.value.append((key_node, value_node))
-        return dialogue_node
+                self._emitNode(dumper,
+                               self._representRootDialogueSection(dumper,
+                                                                  greeting))
+            dumper.emit(yaml.SequenceEndEvent())
+        if (len(sections) > 0):
+            self._emitNode(dumper, dumper.represent_data('SECTIONS'))
+            dumper.emit(yaml.SequenceStartEvent(None, None, True,
+                                                flow_style=False))
+            for section in sections:
+                self._emitNode(dumper,
+                               self._representDialogueSection(dumper, section))
+            dumper.emit(yaml.SequenceEndEvent())
+        dumper.emit(yaml.MappingEndEvent())
+    
+    def _emitNode(self, dumper, node):
+        """
+        Emit the events of a represented node, the same way the dumper's
+        serializer would, and forget about the represented objects so that
+        they don't pile up while a large dialogue is dumped.
+        """
+        self._emitNodeEvents(dumper, node)
+        dumper.represented_objects = {}
+        dumper.object_keeper = []
+    
+    def _emitNodeEvents(self, dumper, node):
+        if (isinstance(node, yaml.ScalarNode)):
+            detected_tag = dumper.resolve(yaml.ScalarNode, node.value,
+                                          (True, False))
+            default_tag = dumper.resolve(yaml.ScalarNode, node.value,
+                                         (False, True))
+            implicit = (node.tag == detected_tag), (node.tag == default_tag)
+            dumper.emit(yaml.ScalarEvent(None, node.tag, implicit, node.value,
+                                         style=node.style))
+        elif (isinstance(node, yaml.SequenceNode)):
+            implicit = (node.tag ==
+                        dumper.resolve(yaml.SequenceNode, node.value, True))
+            dumper.emit(yaml.SequenceStartEvent(None, node.tag, implicit,
+                                                flow_style=node.flow_style))
+            for item_node in node.value:
+                self._emitNodeEvents(dumper, item_node)
+            dumper.emit(yaml.SequenceEndEvent())
+        else:
+            implicit = (node.tag ==
+                        dumper.resolve(yaml.MappingNode, node.value, True))
+            dumper.emit(yaml.MappingStartEvent(None, node.tag, implicit,
+                                               flow_style=node.flow_style))
+            for key_node, value_node in node.value:
+                self._emitNodeEvents(dumper, key_node)
+                self._emitNodeEvents(dumper, value_node)
+            dumper.emit(yaml.MappingEndEvent())
     
     def _representRootDialogueSection(self, dumper, greeting):
-        greeting_node = dumper.represent_dict({})
-        greeting_dict = OrderedDict()
-        greeting_dict['ID'] = greeting.id
-        greeting_dict['CONDITION'] = dumper.represent_scalar(
-            'tag:yaml.org,2002:str',
-            greeting.condition,
-            style='"'
-        )
-        for key, value in greeting_dict.items():
-            if (isinstance(key, yaml.Node)):
-                key_node = key
-            else:
-                key_node = dumper.represent_data(key)
-            if (isinstance(value, yaml.Node)):
-                value_node = value
-            else:
-                value_node = dumper.represent_data(value)
-            greeting_node.value.append((key_node, value_node))
+        greeting_node = self._representDialogueSection(dumper, greeting)
+        # The condition follows the ID of the section.
+        condition_node = dumper.represent_scalar('tag:yaml.org,2002:str',
+                                                 greeting.condition,
+                                                 style='"')
+        greeting_node.value.insert(1, (dumper.represent_data('CONDITION'),
+                                       condition_node))
         return greeting_node
     
     def _representDialogueSection(self, dumper, dialogue_section):
@@ -405,11 +507,17 @@ class YamlDialogueParser(AbstractDialogueParser):
                         actions.append(action)
         except (AttributeError, TypeError, ValueError) as e:
             raise DialogueFormatError(e)
-        else:
-            greeting = DialogueSection(id=id, text=text,
-                                           condition=condition,
-                                           responses=responses,
-                                           actions=actions)
+        
+        try:
+            greeting = DialogueGreeting(id_=id, text=text,
+                                        condition=condition,
+                                        responses=responses,
+                                        actions=actions)
+        except SyntaxError as error:
+            raise DialogueFormatError(
+                'invalid condition "{0}" in greeting {1}: {2}'
+                .format(condition, id, error)
+            )
         
         return greeting
     
@@ -471,10 +579,18 @@ class YamlDialogueParser(AbstractDialogueParser):
         except (AttributeError, TypeError, ValueError) as e:
             raise DialogueFormatError(e)
         
-        dialogue_response = DialogueResponse(text=text,
-                                             next_section_id=next_section_id,
-                                             actions=actions,
-                                             condition=condition)
+        try:
+            dialogue_response = DialogueResponse(
+                text=text,
+                next_section_id=next_section_id,
+                actions=actions,
+                condition=condition
+            )
+        except SyntaxError as error:
+            raise DialogueFormatError(
+                'invalid condition "{0}" in response "{1}": {2}'
+                .format(condition, text, error)
+            )
         return dialogue_response
     
     def _constructDialogueAction(self, loader, action_node):
@@ -619,10 +735,18 @@ class OldYamlDialogueParser(YamlDialogueParser):
         except (AttributeError, TypeError, ValueError) as e:
             raise DialogueFormatError(e)
         
-        dialogue_response = DialogueResponse(text=text,
-                                             next_section_id=next_section_id,
-                                             actions=actions,
-                                             condition=condition)
+        try:
+            dialogue_response = DialogueResponse(
+                text=text,
+                next_section_id=next_section_id,
+                actions=actions,
+                condition=condition
+            )
+        except SyntaxError as error:
+            raise DialogueFormatError(
+                'invalid condition "{0}" in response "{1}": {2}'
+                .format(condition, text, error)
+            )
         return dialogue_response
     
     def _constructDialogueAction(self, loader, action_node):
@@ -152,27 +152,30 @@ class DialogueProcessor(object):
         """
         Evaluate the L{RootDialogueSections<RootDialogueSection>} conditions
         and return the valid L{DialogueSection} which should be displayed
-        first.
+        first. When the conditions of several greetings are met the last one
+        is chosen, so the greetings are evaluated from the last to the first
+        until a condition is met.
         
         @return: Valid root dialogue section.
         @rtype: L{DialogueSection}
-        
-        @raise: RuntimeError - evaluation of a DialogueGreeting condition fails
-            by raising an exception (e.g. due to a syntax error).
         """
         dialogue = self.dialogue
         dialogue_greeting = None
-        for greeting in dialogue.greetings:
+        for greeting in reversed(dialogue.greetings):
+            condition = greeting.compiled_condition
             try:
-                condition_met = eval(greeting.condition, self.game_state)
+                condition_met = condition is None or \
+                                eval(condition, self.game_state)
             except Exception as exception:
                 error_message = dedent_chomp('''
                     exception raised in DialogueGreeting {id} condition:
                     {exception}
                 ''').format(id=greeting.id, exception=exception)
                 self._logger.error(error_message)
-            if (condition_met):
-                dialogue_greeting = greeting
+            else:
+                if (condition_met):
+                    dialogue_greeting = greeting
+                    break
         if (dialogue_greeting is None):
             dialogue_greeting = dialogue.default_greeting
         
@@ -286,7 +289,7 @@ class DialogueProcessor(object):
         """
         valid_responses = []
         for dialogue_response in dialogue_section.responses:
-            condition = dialogue_response.condition
+            condition = dialogue_response.compiled_condition
             try:
                 condition_met = condition is None or \
                                 eval(condition, self.game_state)
@@ -298,11 +301,12 @@ class DialogueProcessor(object):
                             response=dialogue_response, exception=exception)
                 self._logger.error(error_message)
             else:
-                self._logger.debug(
-                    'condition "{0}" for {1} evaluated to {2}'
-                    .format(dialogue_response.condition, dialogue_response,
-                            condition_met)
-                )
+                if (self._logger.isEnabledFor(logging.DEBUG)):
+                    self._logger.debug(
+                        'condition "{0}" for {1} evaluated to {2}'
+                        .format(dialogue_response.condition,
+                                dialogue_response, condition_met)
+                    )
                 if (condition_met):
                     valid_responses.append(dialogue_response)
         
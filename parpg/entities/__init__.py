@@ -16,6 +16,8 @@
 import sys
 
 from general import General
+from parpg import components
+from parpg.components import character_statistics
 
 def createEntity(info, identifier, world, extra = None):
     """Called when we need to get an actual object.
@@ -38,3 +40,56 @@ def createEntity(info, identifier, world, extra = None):
         for key, value in data.items():
             setattr(comp_obj, key, value)
     return new_ent
+
+def serializeEntity(entity):
+    """Gets the values of an entity that are saved.
+       @type entity: bGrease.Entity
+       @param entity: The entity to serialize
+       @return: A tuple of a dictionary with the saveable component values
+       and a dictionary with the Statistics, Inventory and Equipment of the
+       entity, if it has them"""
+    identifier = entity.general.identifier
+    entity_data = {}
+    object_data = {}
+    entity_data["general"] = {"identifier": identifier}
+    for name, component in components.components.iteritems():
+        comp_vals = getattr(entity, name)
+        if not comp_vals:
+            continue
+        comp_data = {}
+        #Items that are in containers will be saved with them.
+        for field in component.saveable_fields:
+            try:
+                comp_data[field] = getattr(comp_vals, field)
+            except AttributeError:
+                #The entity doesn't have this specific value,
+                #ignore it
+                pass
+        if comp_data:
+            entity_data[name] = comp_data
+        if name == "characterstats":
+            object_data["Statistics"] = (
+                character_statistics.get_stat_values(comp_vals)["primary"]
+            )
+        elif name == "container" and hasattr(comp_vals, "children"):
+            inventory_data = {}
+            inventory_data["Slots"] = len(comp_vals.children)
+            items = []
+            for child in comp_vals.children:
+                if not child:
+                    continue
+                items.append({"ID": child.entity.general.identifier,
+                              "Slot": child.slot})
+            inventory_data["Items"] = items
+            object_data["Inventory"] = inventory_data
+        elif name == "equip":
+            equip_data = {}
+            for field in component.fields:
+                if hasattr(comp_vals, field):
+                    equipable = getattr(comp_vals, field)
+                    if equipable:
+                        equip_data[field] = {
+                            "ID": equipable.entity.general.identifier
+                        }
+            object_data["Equipment"] = equip_data
+    return entity_data, object_data
@@ -329,7 +329,10 @@ class TalkAction(Action):
             self.npc.fifeagent.behaviour.getLocation()
         )
 
-        if self.npc.dialogue.dialogue is not None:
+        dialogue = None
+        if self.npc.dialogue is not None:
+            dialogue = self.model.getDialogue(self.npc.dialogue.dialogue)
+        if dialogue is not None:
             dialogue_controller = DialogueController(
                 self.controller.engine,
                 self.view,
@@ -339,7 +342,7 @@ class TalkAction(Action):
             self.controller.application.manager.push_mode(
                 dialogue_controller
             )
-            dialogue_controller.startTalk(self.npc)
+            dialogue_controller.startTalk(self.npc, dialogue)
         else:
             self.npc.fifeagent.behaviour.agent.say("Leave me alone!", 1000)
             
@@ -419,6 +422,7 @@ class DropItemAction(Action):
         agent_values["Position"] = (coords.x, coords.y)
         agent_values["Rotation"] = 0
         agent_values["Map"] = map_name
+        self.model.snapshot_copies.markChanged(identifier)
         self.model.deleteObject(identifier)
         self.model.addAgent(self.model.ALL_AGENTS_KEY, 
                             {identifier: agent_values})
@@ -134,6 +134,14 @@ class GameMap(fife.MapChangeListener):
         # Make World aware that this is now the active map.
         self.model.active_map = self
 
+    def getInstanceCount(self):
+        """Returns the number of instances on all layers of the map, as a
+        measure of its size
+           @return: The number of instances"""
+        if not self.map:
+            return 0
+        return sum(len(layer.getInstances()) for layer in self.map.getLayers())
+
     def addPC(self):
         """Add the player character to the map
            @return: None"""
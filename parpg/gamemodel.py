@@ -17,32 +17,30 @@
 import sys
 import os.path
 import logging
+import time
 from copy import deepcopy
+from cStringIO import StringIO
 
 from fife import fife
 from fife.extensions.serializers.xmlobject import XMLObjectLoader 
 from bGrease.geometry import Vec2d
 from serializers import XmlSerializer
 
-from parpg import vfs
+from parpg import vfs, contentcache, yamlio, savegame, delta, objectindex
+from parpg import dialogueindex, autosave
+from parpg.dialoguebundle import DialogueBundle, BundleFormatError
+from parpg.saveindex import SaveIndex
 from gamestate import GameState
 from gamemap import GameMap
-from common.utils import locateFiles
+from mappreloader import MapPreloader
+from mapcache import MapCache
 from common.utils import parseBool
 from parpg.dialogueparsers import YamlDialogueParser, DialogueFormatError
-from parpg.entities import createEntity
+from parpg.entities import createEntity, serializeEntity
 from parpg import behaviours
-from parpg import components
-from parpg.components import fifeagent, container, equip, character_statistics
+from parpg.components import fifeagent, container, equip
 import characterstatistics as char_stats
 
-try:
-    import xml.etree.cElementTree as ElementTree
-except ImportError:
-    import xml.etree.ElementTree as ElementTree
-
-import yaml
-
 logger = logging.getLogger('gamemodel')
 
 class GameModel(object):
@@ -70,7 +68,9 @@ class GameModel(object):
         self.savegame = None
         quests_directory = settings.get("parpg", "QuestsPath")
         #setup functions for the GameEnvironment        
-        self.game_state = GameState(quests_dir=quests_directory)
+        # The quests are read by a startup stage, see addStartupStages
+        self.game_state = GameState(quests_dir=quests_directory,
+                                    read_quests=False)
         funcs = {
                  "moveObject":self.moveObject, 
                  "deleteObject":self.deleteObject, 
@@ -83,9 +83,26 @@ class GameModel(object):
         self.target_map_name = None
         self.object_db = {}
         self.active_map = None
+        self.hover_key = None
+        self.hover_instance = None
         self.map_files = {}
+        self.map_preloader = MapPreloader()
+        self.map_cache = MapCache(
+            settings.get("parpg", "MaxResidentMaps", 0),
+            settings.get("parpg", "MaxResidentInstances", 0),
+            size_of=GameMap.getInstanceCount,
+            on_evict=self.unloadMap
+        )
+        self.game_state.maps = self.map_cache
         self.agents = {}
         self.agents[self.ALL_AGENTS_KEY] = {}
+        # The agents of the maps of a loaded game that weren't active yet
+        self.saved_maps = savegame.SavedMaps(self.getPristineAgents)
+        # The agents of the maps as they are in the agent files, which delta
+        # saves are relative to
+        self.pristine_agents = {}
+        # The copies of the saved values of the last autosave snapshot
+        self.snapshot_copies = autosave.SnapshotCopies()
         self.items = {}
         self.engine = engine
         self.fife_model = engine.getModel()
@@ -101,8 +118,21 @@ class GameModel(object):
         self.object_db_file = '/'.join([objects_directory,
                                         settings.get("parpg", "ObjectDatabaseFile")])
         self.dialogue_directory = settings.get("parpg", "DialoguesPath")
-        self.dialogues = {}
+        self.dialogue_cache = dialogueindex.DialogueCache(
+            self.parseDialogue,
+            settings.get("parpg", "MaxResidentDialogues", 0)
+        )
+        # The compiled dialogues, which are used instead of the YAML files
+        # that didn't change since they were compiled
+        self.data_directory = settings.get("parpg", "DataPath")
+        self.dialogue_bundle_file = os.path.join(
+            self.data_directory,
+            settings.get("parpg", "DialogueBundle", "dialogues.bundle")
+        )
+        self.dialogue_bundle = None
         self.agent_import_files = {}
+        # The import files whose objects were loaded into FIFE
+        self.loaded_import_files = set()
         self.obj_loader = XMLObjectLoader(self.engine)
         # FIXME M. George Hansen 2011-06-06: character stats scripts aren't
         #     finished, unfortunately.
@@ -158,7 +188,7 @@ class GameModel(object):
         for namespace in self.agents:
             if ID in self.agents[namespace]:
                 return True
-        return False
+        return self.saved_maps.isNameUsed(ID)
     
     def createUniqueID(self, ID):
         if self.isIDUsed(ID):
@@ -193,52 +223,194 @@ class GameModel(object):
             del self.items[object_id]
         return self.game_state.deleteObject(object_id)
         
+    def getSaveState(self):
+        """Returns the whole state of the game for saving it as YAML"""
+        self.saved_maps.readAll()
+        agents = dict(self.saved_maps.agents)
+        agents.update(self.agents)
+        save_state = {}
+        save_state["Agents"] = agents
+        save_state["Items"] = self.items
+        save_state["GameState"] = self.game_state.getStateForSaving()
+        return save_state
+
+    def iterMapsToSave(self):
+        """Yields the names and the saved values of the agents of each map,
+        the agents that can be on any map and the current map first"""
+        first_maps = (self.ALL_AGENTS_KEY, self.game_state.current_map_name)
+        for map_name in first_maps:
+            if self.agents.has_key(map_name):
+                yield map_name, self.agents[map_name]
+        for map_name, agents in self.agents.iteritems():
+            if map_name not in first_maps:
+                yield map_name, agents
+        self.saved_maps.readAll()
+        for map_name, agents in self.saved_maps.agents.iteritems():
+            yield map_name, agents
+
+    def getPristineAgents(self, map_name):
+        """Returns the agents of a map as they are in its agents file
+        @param map_name: Name of the map
+        @type map_name: str
+        @return: A dictionary with the agents by their names, which must
+        not be modified"""
+        if not self.pristine_agents.has_key(map_name):
+            agents_file = None
+            if map_name == self.ALL_AGENTS_KEY:
+                agents_file = self.all_agents_file
+            elif map_name in self.map_files:
+                agents_file = self.getAgentsFileOfMap(map_name)
+            agents = {}
+            if agents_file is not None and vfs.VFS.exists(agents_file):
+                for agent in contentcache.load_yaml_all(agents_file):
+                    if agent is not None:
+                        agents.update(agent)
+            self.pristine_agents[map_name] = agents
+        return self.pristine_agents[map_name]
+
+    def getPristineMaps(self, map_names):
+        """Returns the original agents of the given maps by map name, for
+        writing a delta save"""
+        return dict((map_name, self.getPristineAgents(map_name))
+                    for map_name in map_names)
+
+    def useDeltaSaves(self):
+        """Returns whether saves only contain the changes of the agents"""
+        return self.settings.get("parpg", "DeltaSaves", True)
+
+    def createSnapshot(self):
+        """Returns a copy of the saveable state, which the game can go on 
+        changing while the copy is written. The values of the saved agents
+        and items may share lists and dictionaries with the components, so
+        they are copied completely, but only those that changed since the
+        last snapshot. The others share the copies of that snapshot.
+        @return: A tuple of the game state, a list of the names and agents
+        of the maps, the items, the original agents of the maps for a 
+        delta save or None and the description of the save"""
+        copy = self.snapshot_copies.copy
+        maps = [(map_name, dict((agent_name, copy(agent_name, agent_values))
+                                for agent_name, agent_values in
+                                agents.iteritems()))
+                for map_name, agents in self.iterMapsToSave()]
+        items = dict((identifier, copy(identifier, item_values))
+                     for identifier, item_values in self.items.iteritems())
+        self.snapshot_copies.finish()
+        only_changed = self.useDeltaSaves()
+        pristine_maps = None
+        if only_changed:
+            pristine_maps = self.getPristineMaps(
+                map_name for map_name, agents in maps)
+        game_state = self.game_state.getStateForSaving(only_changed)
+        return (delta.copy(game_state), maps, items, pristine_maps,
+                self.getSaveMetadata())
+
+    def getSaveMetadata(self):
+        """Returns the description of the game that the load dialog shows
+        @return: A dictionary with the current map, the name of the player
+        character, the play time and the time of saving"""
+        metadata = {"Map": self.game_state.current_map_name,
+                    "PlayTime": self.game_state.play_time,
+                    "SavedAt": time.time()}
+        if self.game_state.hasObject("PlayerCharacter"):
+            player = self.game_state.getObjectById("PlayerCharacter")
+            if player.description:
+                metadata["Character"] = player.description.view_name
+        return metadata
+
     def save(self, path, filename):
-        """Writes the saver to a file.
+        """Writes the saver to a file. The file is in the compressed binary
+           save format, unless its name ends with .yaml. It is written to a
+           temporary file first, so that an existing save is only replaced
+           by a complete one. The description of the save is added to the
+           index of the directory.
            @type filename: string
            @param filename: the name of the file to write to
            @return: None"""
         fname = '/'.join([path, filename])
+        temp_fname = fname + ".tmp"
         try:
-            save_file = open(fname, 'w')
+            save_file = open(temp_fname, 'wb')
         except(IOError):
             sys.stderr.write("Error: Can't create save game: " + fname + "\n")
             return
 
-        save_state = {}
-        save_state["Agents"] = self.agents
-        save_state["Items"] = self.items
-        save_state["GameState"] = self.game_state.getStateForSaving()
-        
-        yaml.dump(save_state, save_file)
-        
-        save_file.close()       
+        start_time = time.time()
+        metadata = self.getSaveMetadata()
+        try:
+            with save_file:
+                if filename.endswith(".yaml"):
+                    yamlio.dump(self.getSaveState(), save_file)
+                    metadata = None
+                elif self.useDeltaSaves():
+                    maps = list(self.iterMapsToSave())
+                    pristine_maps = self.getPristineMaps(
+                        map_name for map_name, agents in maps)
+                    savegame.writeSave(
+                        save_file, self.game_state.getStateForSaving(True),
+                        savegame.iterMapChanges(maps, pristine_maps),
+                        self.items, compress=True, delta=True,
+                        metadata=metadata)
+                else:
+                    savegame.writeSave(save_file, 
+                                       self.game_state.getStateForSaving(),
+                                       self.iterMapsToSave(), self.items,
+                                       compress=True, metadata=metadata)
+            autosave.replaceFile(temp_fname, fname)
+        except Exception:
+            autosave.removeFile(temp_fname)
+            raise
+        save_index = SaveIndex(path)
+        save_index.update(filename, metadata)
+        save_index.write()
+        logger.info("saved {0} in {1:.1f} ms"
+                    .format(fname, (time.time() - start_time) * 1000))
 
     def load(self, path, filename):
-        """Loads a saver from a file.
+        """Loads a saver from a file, in the binary save format or as YAML.
+           Only the agents of the current map and those that can be on any
+           map are added, the other maps are added when they get active.
            @type filename: string
            @param filename: the name of the file (including path) to load from
            @return: None"""
         fname = os.path.join(path, filename)
 
         try:
-            load_file = open(fname, 'r')
+            load_file = open(fname, 'rb')
         except(IOError):
             sys.stderr.write("Error: Can't find save game file '" + fname + "'\n")
             return        
         self.deleteMaps()
         self.clearAgents()
         
-        save_state = yaml.load(load_file)
-        self.game_state.restoreFromState(save_state["GameState"])
-        maps = save_state["Agents"]
-        for map_name in maps:
-            for agent_name in maps[map_name]:
-                agent = {agent_name:maps[map_name][agent_name]}
-                self.addAgent(map_name, agent)
-        self.items = save_state["Items"]               
-      
-        load_file.close()             
+        start_time = time.time()
+        if savegame.isSaveFile(load_file):
+            # The reader is kept to decode the other maps when they get
+            # active, so it reads from a copy and the file can be closed
+            reader = savegame.SaveReader(StringIO(load_file.read()))
+            load_file.close()
+            game_state = reader.readGameState()
+            items = reader.readItems()
+            self.saved_maps = savegame.SavedMaps(
+                self.getPristineAgents, reader=reader, is_delta=reader.delta)
+        else:
+            save_state = yamlio.load(load_file)
+            load_file.close()
+            game_state = save_state["GameState"]
+            items = save_state["Items"]
+            self.saved_maps = savegame.SavedMaps(
+                self.getPristineAgents, save_state["Agents"],
+                is_delta=save_state.get("Delta", False))
+
+        self.game_state.restoreFromState(game_state)
+        # The maps of delta saves without changes are restored from the
+        # agent files
+        for map_name in (self.ALL_AGENTS_KEY, game_state["CurrentMap"]):
+            agents = self.saved_maps.restore(map_name)
+            if agents is not None:
+                self.readAgentsOfMap(map_name, self.getAgentList(agents))
+        self.items = items
+        logger.info("loaded {0} in {1:.1f} ms"
+                    .format(fname, (time.time() - start_time) * 1000))
          
     def teleport(self, agent, position):
         """Called when a an agent is moved instantly to a new position. 
@@ -253,38 +425,47 @@ class GameModel(object):
         location.setMapCoordinates(coord)
         agent.teleport(location)         
                
+    def getCameraTransform(self, camera):
+        """Returns the values that determine which instances the camera 
+        shows at a screen position
+        @type camera: fife.Camera
+        @param camera: The camera
+        @rtype: tuple
+        @return: The camera coordinates, zoom, rotation and tilt"""
+        coords = camera.getLocation().getMapCoordinates()
+        return (coords.x, coords.y, coords.z, camera.getZoom(),
+                camera.getRotation(), camera.getTilt())
+
     def getObjectAtCoords(self, coords):
-        """Get the object which is at the given coords
+        """Get the object which is at the given coords. The result is
+        reused while the coords, the camera and the scene stay the same.
         @type coords: fife.Screenpoint
         @param coords: Coordinates where to check for an object
         @rtype: fife.Object
         @return: An object or None"""
-        instances = self.active_map.cameras[
-                                            self.active_map.my_cam_id].\
-            getMatchingInstances(coords, self.active_map.agent_layer)
-        # no object returns an empty tuple
-        if(instances != ()):
-            front_y = 0
-            
-
-            for obj in instances:
-                # check to see if this in our list at all
-                if(self.objectActive(obj.getId())):
-                    # check if the object is on the foreground
-                    obj_map_coords = \
-                                      obj.getLocation().getMapCoordinates()
-                    obj_screen_coords = self.active_map.\
-                        cameras[self.active_map.my_cam_id]\
-                        .toScreenCoordinates(obj_map_coords)
-
-                    if obj_screen_coords.y > front_y:
-                        #Object on the foreground
-                        front_y = obj_screen_coords.y
-                        return obj
-                    else:
-                        return None
-        else:
-            return None
+        camera = self.active_map.cameras[self.active_map.my_cam_id]
+        hover_key = (coords.x, coords.y, self.active_map, 
+                     self.getCameraTransform(camera),
+                     self.game_state.scene_version)
+        if hover_key == self.hover_key:
+            return self.hover_instance
+        instances = camera.getMatchingInstances(coords, 
+                                                self.active_map.agent_layer)
+        front_obj = None
+        front_y = None
+        for obj in instances:
+            # check to see if this in our list at all
+            if(self.objectActive(obj.getId())):
+                # check if the object is on the foreground
+                obj_map_coords = obj.getLocation().getMapCoordinates()
+                obj_screen_coords = camera.toScreenCoordinates(obj_map_coords)
+                if front_y is None or obj_screen_coords.y > front_y:
+                    #Object on the foreground
+                    front_y = obj_screen_coords.y
+                    front_obj = obj
+        self.hover_key = hover_key
+        self.hover_instance = front_obj
+        return front_obj
 
     def getCoords(self, click):
         """Get the map location x, y coordinates from the screen coordinates
@@ -314,10 +495,43 @@ class GameModel(object):
         """Returns wheter the game is paused or not"""
         return self.active_map.isPaused()
     
-    def readMapFiles(self):
-        """Read all a available map-files and store them"""
-        maps_file = vfs.VFS.open(self.game_state.maps_file)
-        self.map_files = yaml.load(maps_file)["Maps"]
+    def addStartupStages(self, loader):
+        """Adds the stages that read the game data to a startup loader. The
+        files are parsed in the worker threads if they are read through the
+        content cache, which reads them from the disk and not through the
+        VFS.
+        @param loader: The startup loader
+        @type loader: parpg.startuploader.StartupLoader"""
+        threaded = contentcache.CACHE is not None
+        quest_engine = self.game_state.quest_engine
+        loader.addStage("maps", 
+                        lambda: contentcache.load_yaml(
+                            self.game_state.maps_file),
+                        self.setMapFiles, threaded=threaded)
+        loader.addStage("object_db",
+                        lambda: contentcache.load_yaml_all(
+                            self.object_db_file),
+                        self.addObjectInfos, threaded=threaded)
+        loader.addStage("object_files",
+                        lambda: objectindex.locateObjects(
+                            self.objects_directory, "*.xml"),
+                        self.agent_import_files.update, threaded=False)
+        loader.addStage("all_agents",
+                        lambda: contentcache.load_yaml_all(
+                            self.all_agents_file),
+                        self.addAllAgents, threaded=threaded)
+        loader.addStage("dialogue_files", self.locateDialogueFiles,
+                        self.dialogue_cache.setFiles, essential=False,
+                        threaded=False)
+        loader.addStage("quest_files", quest_engine.locateQuestFiles,
+                        essential=False, threaded=False)
+        loader.addStage("quests", quest_engine.loadQuestFiles,
+                        quest_engine.readQuests, requires=("quest_files",),
+                        essential=False, threaded=threaded)
+
+    def setMapFiles(self, maps):
+        """Stores the map files of the parsed maps file"""
+        self.map_files = maps["Maps"]
     
     def addAgent(self, namespace, agent):
         """Adds an agent to the agents dictionary
@@ -325,7 +539,6 @@ class GameModel(object):
         @type namespace: str
         @param agent: The agent to be added
         @type agent: dict """
-        from fife.extensions.serializers.xml_loader_tools import loadImportFile
         if not self.agents.has_key(namespace):
             self.agents[namespace] = {}
             
@@ -334,59 +547,104 @@ class GameModel(object):
         del agent[agent.keys()[0]]
         agent[unique_agent_id] = agent_values
         self.agents[namespace].update(agent)
-        object_model = ""
-        if agent_values["Entity"].has_key("graphics") \
-           and agent_values["Entity"]["graphics"].has_key("gfx"): 
-            object_model = agent_values["Entity"]["graphics"]["gfx"]
-        elif agent_values.has_key("Template"):
-            template = self.object_db[agent_values["Template"]]
-            object_model = template["graphics"]["gfx"]
-        else:
-            object_model = self.GENERIC_ITEM_GFX
-        import_file = self.agent_import_files[object_model]
+
+    def loadObjectImport(self, object_id):
+        """Loads the import file of a FIFE object the first time an instance
+        of it is created
+        @param object_id: The gfx id of the object
+        @type object_id: str """
+        import_file = self.agent_import_files.get(object_id)
+        if import_file is None or import_file in self.loaded_import_files:
+            return
+        self.loaded_import_files.add(import_file)
+        if self.fife_model.getObject(str(object_id), "PARPG"):
+            # The map file imported it already
+            return
+        from fife.extensions.serializers.xml_loader_tools import loadImportFile
         loadImportFile(self.obj_loader, import_file, self.engine)
         
-    def readAgentsOfMap(self, map_name):
-        """Read the agents of the map
+    def getAgentsFileOfMap(self, map_name):
+        """Returns the file containing the agents of a map
+        @param map_name: Name of the map
+        @type map_name: str """
+        return self.map_files[map_name].replace(".xml", "_agents.yaml")
+
+    def getScriptsFileOfMap(self, map_name):
+        """Returns the file containing the scripts of a map
+        @param map_name: Name of the map
+        @type map_name: str """
+        return self.map_files[map_name].replace(".xml", "_scripts.yaml")
+
+    def preloadMap(self, map_name):
+        """Starts parsing the agents and scripts of a map in the background
         @param map_name: Name of the map
         @type map_name: str """
+        if (not map_name in self.map_files or 
+            map_name == self.game_state.current_map_name or
+            self.map_preloader.isPreloading(map_name)):
+            return
+        agents_data = None
+        if not self.hasAgentsOfMap(map_name):
+            agents_data = vfs.VFS.open(self.getAgentsFileOfMap(map_name)).read()
+        scripts_data = None
+        map_scripts_file = self.getScriptsFileOfMap(map_name)
+        if vfs.VFS.exists(map_scripts_file):
+            scripts_data = vfs.VFS.open(map_scripts_file).read()
+        # The dialogues can only be parsed in the worker thread if they are
+        # read from the bundle or through the content cache, not through the
+        # VFS. The others are parsed when they are needed.
+        load_dialogues = None
+        if (self.dialogue_bundle is not None or 
+            contentcache.CACHE is not None):
+            def load_dialogues(npc_names):
+                return self.dialogue_cache.parseDialogues(
+                    npc_names, self.preparseDialogue)
+        self.map_preloader.preload(map_name, agents_data, scripts_data,
+                                   load_dialogues,
+                                   self.getAgentNamesOfMap(map_name))
+
+    def readAgentsOfMap(self, map_name, agents=None):
+        """Read the agents of the map
+        @param map_name: Name of the map
+        @type map_name: str 
+        @param agents: The already parsed agents of the map
+        @type agents: list"""
         #Get the agents of the map
-        map_agents_file = self.map_files[map_name].\
-                            replace(".xml", "_agents.yaml")   
-        agents_data = vfs.VFS.open(map_agents_file)
-        agents = yaml.load_all(agents_data)
+        if agents is None:
+            agents_data = vfs.VFS.open(self.getAgentsFileOfMap(map_name))
+            agents = yamlio.load_all(agents_data)
         self.agents[map_name] = {}
         for agent in agents:
             if not agent == None:
                 self.addAgent(map_name, agent)  
         
-    def readScriptsOfMap(self, map_name, world):
+    def readScriptsOfMap(self, map_name, world, scripts_data=None):
         """Read the scripts of the map
         @param map_name: Name of the map
         @type map_name: str 
         @param world: The current active world
-        @type world: parpg.world.World"""
-        map_scripts_file = (
-            self.map_files[map_name].replace(".xml", "_scripts.yaml")
-        )
-        if vfs.VFS.exists(map_scripts_file):
+        @type world: parpg.world.World
+        @param scripts_data: The already parsed scripts of the map
+        @type scripts_data: dict"""
+        if scripts_data is None:
+            map_scripts_file = self.getScriptsFileOfMap(map_name)
+            if not vfs.VFS.exists(map_scripts_file):
+                return
             scripts_file = vfs.VFS.open(map_scripts_file)
-            scripts_data = yaml.load(scripts_file)
-            scripts = (scripts_data["Scripts"])
-            conditions = (
-                scripts_data["Conditions"] if 
-                scripts_data.has_key("Conditions") else ()
-            )
-            scripting = world.systems.scripting
-            for name, actions in scripts.iteritems():
-                scripting.setScript(name, actions)
-            for condition in conditions:
-                scripting.addCondition(*condition)            
+            scripts_data = yamlio.load(scripts_file)
+        scripts = (scripts_data["Scripts"])
+        conditions = (
+            scripts_data["Conditions"] if 
+            scripts_data.has_key("Conditions") else ()
+        )
+        scripting = world.systems.scripting
+        for name, actions in scripts.iteritems():
+            scripting.setScript(name, actions)
+        for condition in conditions:
+            scripting.addCondition(*condition)            
             
-    def readAllAgents(self):
-        """Read the agents of the all_agents_file and store them"""
-        agents_file = vfs.VFS.open(self.all_agents_file)
-        agents = yaml.load_all(agents_file)
+    def addAllAgents(self, agents):
+        """Stores the parsed agents of the all_agents_file"""
         for agent in agents:
             if agent is not None:
                 self.addAgent(self.ALL_AGENTS_KEY, agent)  
@@ -414,17 +672,65 @@ class GameModel(object):
         """Resets the agents dictionary"""
         self.agents = {}
         self.agents[self.ALL_AGENTS_KEY] = {}
+        self.saved_maps = savegame.SavedMaps(self.getPristineAgents)
+        self.snapshot_copies.clear()
+
+    def getAgentList(self, agents):
+        """Converts a dictionary of agents to the list of single agent 
+        dictionaries that readAgentsOfMap expects"""
+        return [{agent_name: agent_values} 
+                for agent_name, agent_values in agents.iteritems()]
+
+    def getAgentNamesOfMap(self, map_name):
+        """Returns the names of the agents of a map that were read, or
+        loaded from a saved game
+        @param map_name: Name of the map
+        @type map_name: str
+        @return: A list of the names"""
+        names = [agent_name for agent_name, agent_values in 
+                 self.agents[self.ALL_AGENTS_KEY].iteritems()
+                 if agent_values["Map"] == map_name]
+        names.extend(self.agents.get(map_name, {}).keys())
+        self.saved_maps.read(map_name)
+        names.extend(self.saved_maps.agents.get(map_name, {}).keys())
+        return names
+
+    def hasAgentsOfMap(self, map_name):
+        """Returns whether the agents of a map were read, or loaded from a
+        saved game"""
+        return (self.agents.has_key(map_name) or 
+                self.saved_maps.isSaved(map_name))
     
     def loadMap(self, map_name):
-        """Load a new map.
+        """Load a new map, unless it is still resident.
            @type map_name: string
            @param map_name: Name of the map to load
            @return: None"""
-        if not map_name in self.game_state.maps:  
-            map_file = self.map_files[map_name]
+        def load():
             new_map = GameMap(self.engine, self)
-            self.game_state.maps[map_name] = new_map
-            new_map.load(map_file)    
+            new_map.load(self.map_files[map_name])
+            return new_map
+        self.map_cache.fetch(map_name, load)
+
+    def evictMaps(self):
+        """Unloads the least recently visited maps that exceed the budget 
+        of resident maps"""
+        self.map_cache.evict(keep=(self.game_state.current_map_name,))
+
+    def unloadMap(self, map_name, game_map):
+        """Writes the state of the objects that are still on a map back to
+        the agents and deletes the map from FIFE
+           @type map_name: string
+           @param map_name: Name of the map
+           @type game_map: GameMap
+           @param game_map: The map
+           @return: None"""
+        for entity in self.game_state.getObjectsFromMap(map_name):
+            self.saveObject(entity)
+            self.game_state.deleteObject(entity.general.identifier).delete()
+        if game_map.map:
+            self.fife_model.deleteMap(game_map.map)
+        logger.info("unloaded map {0}".format(map_name))
 
     def createAgent(self, agent, inst_id, world):
         if self.game_state.hasObject(inst_id):
@@ -440,6 +746,7 @@ class GameModel(object):
                      entity_data["graphics"].has_key("gfx") 
                      else self.GENERIC_ITEM_GFX
                      )
+        self.loadObjectImport(object_id)
         map_obj = self.fife_model.getObject(str(object_id), "PARPG")
         if not map_obj:
             logging.warning("Object with inst_id={0}, ns=PARPG, "
@@ -478,9 +785,10 @@ class GameModel(object):
                         entity_data["behaviour"]["behaviour_type"])()
         else:
             entity_data["fifeagent"]["behaviour"] = behaviours.Base()
-        if self.dialogues.has_key(inst_id):
+        if inst_id in self.dialogue_cache:
+            # The dialogue is parsed when the agent is talked to
             entity_data["dialogue"] = {}
-            entity_data["dialogue"]["dialogue"] = self.dialogues[inst_id]
+            entity_data["dialogue"]["dialogue"] = inst_id
         if (entity_data.has_key("containable") and not 
             entity_data["containable"].has_key("item_type")
             ):
@@ -527,8 +835,25 @@ class GameModel(object):
                 equip.equip(obj.equip, item.equipable, slot)
         if (obj.fifeagent and (obj.lockable and not obj.lockable.closed)):
             obj.fifeagent.behaviour.animate("opened", repeating=True)
+        if not self.hasItemsByType(agent):
+            # Keep the saved values as they were read, so that unchanged
+            # agents don't end up in delta saves
+            self.game_state.markSaved(obj)
         return obj
 
+    def hasItemsByType(self, agent):
+        """Returns whether items of an agent get created by their type, with
+        new ids that have to be saved"""
+        items = []
+        if agent.has_key("Inventory"):
+            items.extend(agent["Inventory"].get("Items", ()))
+        if agent.has_key("Equipment"):
+            items.extend(agent["Equipment"].itervalues())
+        for data in items:
+            if data.has_key("type"):
+                return True
+        return False
+
     def createInventoryItems(self, inv, obj, world):
         slots = inv["Slots"]
         obj.container.children = list()
@@ -577,11 +902,19 @@ class GameModel(object):
         item = createEntity(item_data, identifier, world, None)
         item.containable.item_type = item_type
         self.game_state.addObject(identifier, None, item)
-        self.updateObjectDB(world)
+        # The rest is saved with the next updateObjectDB, usually after all
+        # items of an inventory were created
+        self.saveObject(item)
         return item
 
     def placeAgents(self, world):
         """Places the current maps agents """
+        for agent in self.iterPlaceAgents(world):
+            pass
+
+    def iterPlaceAgents(self, world):
+        """Places the current maps agents, one for each iteration, so that
+        the work can be spread over several frames."""
         if not self.active_map:
             return
         agents = self.getAgentsOfMap(self.game_state.current_map_name)
@@ -591,6 +924,7 @@ class GameModel(object):
             if self.active_map.agent_layer.getInstances(agent):
                 continue
             self.createAgent(agents[agent], agent, world)
+            yield agent
 
     def placePC(self, world):
         """Places the PlayerCharacter on the map"""
@@ -627,15 +961,19 @@ class GameModel(object):
             @return: nothing"""
         self.engine.getModel().deleteMaps()
         self.engine.getModel().deleteObjects()
+        self.loaded_import_files.clear()
         self.game_state.clearObjects()
-        self.game_state.maps = {}
+        self.map_cache.clear()
+        self.map_preloader.clear()
         
-    def setActiveMap(self, map_name, world):
+    def setActiveMap(self, map_name, world, agents=None):
         """Sets the active map that is to be rendered.
            @type map_name: String
            @param map_name: The name of the map to load
            @param world: The active world
            @type world: parpg.world.World
+           @type agents: list
+           @param agents: The already parsed agents of the map
            @return: None"""
         # Turn off the camera on the old map before we turn on the camera
         # on the new map.
@@ -644,8 +982,11 @@ class GameModel(object):
         self.active_map = self.game_state.maps[map_name]
         self.active_map.makeActive()
         self.game_state.current_map_name = map_name
-        if not self.agents.has_key(map_name):
-            self.readAgentsOfMap(map_name)
+        saved_agents = self.saved_maps.pop(map_name)
+        if saved_agents is not None:
+            self.readAgentsOfMap(map_name, self.getAgentList(saved_agents))
+        elif not self.agents.has_key(map_name):
+            self.readAgentsOfMap(map_name, agents)
 
     def createMapObject (self, layer, attributes, inst_id, world):
         """Create an object and add it to the current map.
@@ -709,6 +1050,9 @@ class GameModel(object):
         if obj.fifeagent.behaviour:
             obj.fifeagent.behaviour.parent = obj
             fifeagent.setup_behaviour(obj.fifeagent)
+            obj.fifeagent.behaviour.position_observer = \
+                                        self.game_state.setObjectPosition
+            obj.fifeagent.behaviour.notifyPosition()
             obj.fifeagent.behaviour.speed = self.settings.get("parpg", "PCSpeed")
             #Start the behaviour            
             obj.fifeagent.behaviour.idle()
@@ -728,13 +1072,12 @@ class GameModel(object):
            @param ident: ID of object
            @rtype: boolean
            @return: Status of result (True/False)"""
-        for game_object in \
-           self.game_state.getObjectsFromMap(self.game_state.current_map_name):
-            if (game_object.general.identifier == ident):
-                # we found a match
-                return game_object
-        # no match
-        return False    
+        game_object = self.game_state.getObjectById(
+                                        ident, 
+                                        self.game_state.current_map_name)
+        if game_object is None:
+            return False
+        return game_object
 
     def movePlayer(self, position):
         """Code called when the player should move to another location
@@ -754,121 +1097,149 @@ class GameModel(object):
            @return: None"""
         agent.teleport(position)
         self.agents[agent.ID]["Position"] = position
+        self.snapshot_copies.markChanged(agent.ID)
 
-    def readObjectDB(self):
-        """Reads the Object Information Database from a file. """
-        database_file = vfs.VFS.open(self.object_db_file)
-        database = yaml.load_all(database_file)
+    def addObjectInfos(self, database):
+        """Stores the parsed documents of the Object Information Database"""
         for object_info in database:
             self.object_db.update(object_info)
 
+    def getObjectData(self, identifier):
+        """Returns the dictionary that the values of an object are saved in
+        @type identifier: str
+        @param identifier: ID of the object
+        @return: The dictionary of the object in the agents of its map, or 
+        in the items if it is in a container"""
+        map_id = self.game_state.getMapOfObject(identifier)
+        if map_id:
+            all_agents = self.agents[self.ALL_AGENTS_KEY]
+            if all_agents.has_key(identifier):
+                return all_agents[identifier]
+            return self.agents[map_id][identifier]
+        if not self.items.has_key(identifier):
+            self.items[identifier] = {}
+        return self.items[identifier]
+
+    def saveAgentPosition(self, entity, agent_data):
+        """Stores the position and rotation of an agent on a map in its 
+        saved values. Values that didn't change are left as they are, so 
+        that they keep matching the agents file."""
+        identifier = entity.general.identifier
+        inst = entity.fifeagent.layer.getInstance(identifier)
+        loc = inst.getLocation().getExactLayerCoordinates()
+        position = (loc.x, loc.y, loc.z)
+        saved_position = tuple(agent_data.get("Position", ()))
+        if saved_position + (0.0,) * (3 - len(saved_position)) != position:
+            agent_data["Position"] = position
+            self.snapshot_copies.markChanged(identifier)
+        if self.agents[self.ALL_AGENTS_KEY].has_key(identifier):
+            map_name = self.game_state.getMapOfObject(identifier)
+            if agent_data.get("Map") != map_name:
+                agent_data["Map"] = map_name
+                self.snapshot_copies.markChanged(identifier)
+        rotation = inst.getRotation()
+        if agent_data.get("Rotation") != rotation:
+            agent_data["Rotation"] = rotation
+            self.snapshot_copies.markChanged(identifier)
+
+    def saveObject(self, entity):
+        """Updates the saved values of an entity"""
+        agent_data = self.getObjectData(entity.general.identifier)
+        entity_data, object_data = serializeEntity(entity)
+        agent_data.update(object_data)
+        agent_data["Entity"] = entity_data
+        self.snapshot_copies.markChanged(entity.general.identifier)
+        if entity.fifeagent and entity.fifeagent.layer:
+            self.saveAgentPosition(entity, agent_data)
+
     def updateObjectDB(self, world):
-        """Updates the values in the object database with the worlds values"""
+        """Updates the values in the object database with the worlds values.
+        Only the entities whose components were written since the last 
+        update are serialized again."""
+        for entity in self.game_state.popUnsavedEntities():
+            if entity in world.entities:
+                self.saveObject(entity)
+        # The agents move without writing to their components
+        current_map_name = self.game_state.current_map_name
+        for entity in self.game_state.getObjectsWithComponent(
+                current_map_name, "fifeagent"):
+            if entity.fifeagent.layer:
+                self.saveAgentPosition(
+                    entity, self.getObjectData(entity.general.identifier))
         
-        all_agents = self.agents[self.ALL_AGENTS_KEY]
-        for entity in world.entities:
-            identifier = entity.general.identifier
-            agent_data = {}
-            map_id = self.game_state.getMapOfObject(identifier)
-            if map_id:
-                if all_agents.has_key(identifier):
-                    agent_data = self.agents[self.ALL_AGENTS_KEY][identifier]
-                else:
-                    agent_data = self.agents[map_id][identifier]
+    def openDialogueBundle(self):
+        """Opens the bundle of the compiled dialogues if there is one
+        @return: Whether the bundle was opened"""
+        if self.dialogue_bundle is not None:
+            self.dialogue_bundle.close()
+            self.dialogue_bundle = None
+        if not os.path.exists(self.dialogue_bundle_file):
+            return False
+        try:
+            self.dialogue_bundle = DialogueBundle(self.dialogue_bundle_file)
+        except (IOError, BundleFormatError) as error:
+            logger.warning("not using the dialogue bundle: {0}".format(error))
+            return False
+        return True
 
-            else:
-                if not self.items.has_key(identifier):
-                    self.items[identifier] = {}
-                agent_data = self.items[identifier]
-            entity_data = {}
-            entity_data["general"] = {"identifier": identifier}
-            for name, component in components.components.iteritems():
-                if getattr(entity, name):
-                    comp_data = {}
-                    comp_vals = getattr(entity, name)
-                    #Items that are in containers will be saved with them.
-                    for field in component.saveable_fields:
-                        try:
-                            comp_data[field] = getattr(comp_vals, field)
-                        except AttributeError:                            
-                            #The entity doesn't have this specific value,
-                            #ignore it
-                            pass
-                    if comp_data:
-                        entity_data[name] = comp_data
-                    if name == "fifeagent":
-                        if entity.fifeagent.layer:
-                            layer = entity.fifeagent.layer
-                            inst = layer.getInstance(identifier)
-                            loc = inst.getLocation().getExactLayerCoordinates()
-                            agent_data["Position"] = (loc.x, loc.y, loc.z)
-                            if all_agents.has_key(identifier):
-                                agent_data["Map"] = map_id
-                            agent_data["Rotation"]  = inst.getRotation()
-                    elif name == "characterstats":
-                        agent_data["Statistics"] = (
-                            character_statistics.get_stat_values(
-                                entity.characterstats
-                            )["primary"]
-                        )
-                    elif name == "container" and hasattr(comp_vals, 
-                                                         "children"):
-                        inventory_data = {}
-                        inventory_data["Slots"] = len(comp_vals.children)
-                        items = []
-                        for child in comp_vals.children:
-                            if not child:
-                                continue
-                            items.append(
-                                {"ID": child.entity.general.identifier,
-                                 "Slot": child.slot}
-                            )
-                        inventory_data["Items"] = items
-                        agent_data["Inventory"] = inventory_data
-                    elif name == "equip":
-                        equip_data = {}
-                        for field in component.fields:
-                            if(hasattr(comp_vals, field)):
-                                equipable = getattr(comp_vals, field)
-                                if equipable:
-                                    equip_data[field] = {
-                                        "ID": 
-                                         equipable.entity.general.identifier
-                                    }
-                        agent_data["Equipment"] = equip_data
-            agent_data["Entity"] = entity_data           
-        
-    def getAgentImportFiles(self):
-        """Searches the agents directory for import files """
-        filepaths = locateFiles("*.xml", self.objects_directory)
-        for filepath in filepaths:
-            try:
-                xml_file = vfs.VFS.open(filepath)
-                root = ElementTree.parse(xml_file).getroot()
-                if root.tag == "object":
-                    self.agent_import_files[root.attrib["id"]] = filepath
-            except SyntaxError as error:
-                logging.error("Error parsing file {0}: {1}".format(filepath,
-                                                                   error))
-    
-    def getDialogues(self):
-        """Searches the dialogue directory for dialogues """
-        files = locateFiles("*.yaml", self.dialogue_directory)
+    def locateDialogueFiles(self):
+        """Returns the dialogue files by the names of their NPCs, from the
+        bundle of the compiled dialogues if there is one, otherwise from the
+        index of the YAML files"""
+        if self.openDialogueBundle():
+            logger.info("using the dialogue bundle {0}"
+                        .format(self.dialogue_bundle_file))
+            changed_files = self.dialogue_bundle.discardChangedFiles(
+                self.data_directory)
+            if changed_files:
+                logger.info("parsing the dialogues that changed since they "
+                            "were compiled: {0}"
+                            .format(", ".join(changed_files)))
+            return self.dialogue_bundle.getFiles()
+        return dialogueindex.locateDialogues(self.dialogue_directory)
+
+    def parseDialogue(self, dialogue_filepath):
+        """Parses a dialogue file, or decodes it from the bundle of the
+        compiled dialogues
+        @param dialogue_filepath: The path of the dialogue file
+        @type dialogue_filepath: str
+        @return: The dialogue, or None if the file can't be parsed"""
+        if (self.dialogue_bundle is not None and 
+            dialogue_filepath in self.dialogue_bundle):
+            return self.dialogue_bundle.loadDialogue(dialogue_filepath)
         dialogue_parser = YamlDialogueParser()
-        for dialogue_filepath in files:
-            # Note Technomage 2010-11-13: the new DialogueEngine uses its own
-            #     parser now, YamlDialogueParser.
-#            dialogues = yaml.load_all(file(dialogue_file, "r"))
-            dialogue_file = vfs.VFS.open(dialogue_filepath)
-            try:
-                dialogue = dialogue_parser.load(dialogue_file)
-            except DialogueFormatError as error:
-                logging.error('unable to load dialogue file {0}: {1}'
-                              .format(dialogue_filepath, error))
-            else:
-                self.dialogues[dialogue.npc_name] = dialogue
-            # Note Technomage 2010-11-13: the below code is used to load
-            #     multiple dialogues from a single file. Is this functionality
-            #     used/necessary?
-#            for dialogue in dialogues:
-#                self.dialogues[dialogue["NPC"]] = dialogue
+        try:
+            return contentcache.load(dialogue_filepath, dialogue_parser.load,
+                                     "dialogue")
+        except DialogueFormatError as error:
+            logging.error('unable to load dialogue file {0}: {1}'
+                          .format(dialogue_filepath, error))
+            return None
+
+    def preparseDialogue(self, dialogue_filepath):
+        """Parses a dialogue file like parseDialogue, but only if that
+        doesn't need the VFS, so that it can be called from the worker thread
+        @param dialogue_filepath: The path of the dialogue file
+        @type dialogue_filepath: str
+        @return: The dialogue, or None if the file can't be parsed without
+        the VFS or at all"""
+        if ((self.dialogue_bundle is None or 
+             dialogue_filepath not in self.dialogue_bundle) and
+            not contentcache.is_on_disk(dialogue_filepath)):
+            return None
+        return self.parseDialogue(dialogue_filepath)
+
+    def addDialogues(self, dialogues):
+        """Stores parsed dialogues, like the ones of a preloaded map
+        @param dialogues: The dialogues by the names of their NPCs
+        @type dialogues: dict"""
+        for npc_name, dialogue in dialogues.iteritems():
+            self.dialogue_cache.add(npc_name, dialogue)
+
+    def getDialogue(self, npc_name):
+        """Returns the dialogue of an NPC, parsing it the first time it is
+        needed
+        @param npc_name: Name of the NPC
+        @type npc_name: str
+        @return: The dialogue, or None if the NPC has none"""
+        return self.dialogue_cache.getDialogue(npc_name)
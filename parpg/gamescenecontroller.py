@@ -17,6 +17,7 @@
 
 
 from datetime import datetime
+import time
 import random
 import glob
 import os
@@ -36,6 +37,7 @@ from entities.action import (ChangeMapAction, ExamineAction, TalkAction,
                             )
 
 from parpg.world import PARPGWorld
+from parpg.autosave import AutoSaver
 
 #For debugging/code analysis
 if False:
@@ -52,6 +54,10 @@ class GameSceneController(PARPGWorld, ControllerBase):
     "Scene" state is when the player can move around and interact
     with objects. Like, talking to a npc or examining the contents of a box. 
     '''
+    
+    # Maps behind change_map objects within this distance of the player are
+    # preloaded
+    PRELOAD_DISTANCE = 10
 
 
     def __init__(self, engine, view, model, application):
@@ -93,6 +99,19 @@ class GameSceneController(PARPGWorld, ControllerBase):
          }
         self.model.game_state.funcs.update(funcs)
         self.systems.scripting.game_state = self.model.game_state
+        self.systems.scripting.frame_budget = self.model.settings.get(
+                                            "parpg", "ScriptFrameBudget", 0.0)
+        self.map_load_budget = self.model.settings.get(
+                                            "parpg", "MapLoadFrameBudget", 10.0)
+        self.map_transition = None
+        self.preload_version = None
+        self.last_pump_time = None
+        settings = self.model.settings
+        self.auto_saver = AutoSaver(
+            os.path.join(settings.get("parpg", "DataPath"), "saves"),
+            settings.get("parpg", "AutosaveSlots", 3),
+            settings.get("parpg", "AutosaveInterval", 0.0)
+        )
         
         #this can be helpful for IDEs code analysis
         if False:
@@ -352,44 +371,125 @@ class GameSceneController(PARPGWorld, ControllerBase):
     def handleCommands(self):
         """Check if a command is to be executed
         """
-        if self.model.map_change:
+        if self.model.map_change and self.map_transition is None:
             self.pause(True)
-            if self.model.active_map:
-                self.model.updateObjectDB(self)
-                player_char = self.model.game_state.\
-                    getObjectById("PlayerCharacter").fifeagent
-                pc_agent = self.model.agents\
-                    [self.model.ALL_AGENTS_KEY]["PlayerCharacter"]
-                pc_agent["Map"] = self.model.target_map_name 
-                pc_agent["Position"] = (self.model.target_position or 
-                                        pc_agent["Position"])
-                player_agent = self.model.active_map.\
-                                    agent_layer.getInstance("PlayerCharacter")
-                self.model.game_state.deleteObject("PlayerCharacter").delete()
-                deleted = self.model.game_state.deleteObjectsFromMap(
-                    self.model.game_state.current_map_name
-                )
-                deleted.extend(
-                    self.model.game_state.deleteObjectsFromMap(None)
-                )
-                for obj in deleted:
-                    obj.delete()
-            self.model.loadMap(self.model.target_map_name)
-            self.setupScripts(self.model.target_map_name)
-            
-            self.model.setActiveMap(self.model.target_map_name, self)          
-            
-            self.model.placeAgents(self)
-            self.model.placePC(self)
+            self.map_transition = self.changeMap()
+
+    def stepMapTransition(self):
+        """Runs the map transition until the frame budget for loading maps 
+        is used up, at least one step per frame. A budget of 0 means no
+        limit."""
+        end_time = None
+        if self.map_load_budget > 0:
+            end_time = time.time() + self.map_load_budget / 1000.0
+        try:
+            while True:
+                self.map_transition.next()
+                if end_time is not None and time.time() >= end_time:
+                    break
+        except StopIteration:
+            self.map_transition = None
+
+    def changeMap(self):
+        """Changes to the map that the model registered, yielding whenever 
+        the work may be continued in the next frame"""
+        target_map_name = self.model.target_map_name
+        timings = []
+        phase_start = time.time()
+        if self.model.active_map:
             self.model.updateObjectDB(self)
-            self.model.map_change = False
-            # The PlayerCharacter has an inventory, and also some 
-            # filling of the ready slots in the HUD. 
-            # At this point we sync the contents of the ready slots 
-            # with the contents of the inventory.
-            self.view.hud.inventory = None
-            self.view.hud.initializeInventory()         
-            self.pause(False)
+            player_char = self.model.game_state.\
+                getObjectById("PlayerCharacter").fifeagent
+            pc_agent = self.model.agents\
+                [self.model.ALL_AGENTS_KEY]["PlayerCharacter"]
+            pc_agent["Map"] = target_map_name 
+            pc_agent["Position"] = (self.model.target_position or 
+                                    pc_agent["Position"])
+            player_agent = self.model.active_map.\
+                                agent_layer.getInstance("PlayerCharacter")
+            self.model.game_state.deleteObject("PlayerCharacter").delete()
+            deleted = self.model.game_state.deleteObjectsFromMap(
+                self.model.game_state.current_map_name
+            )
+            deleted.extend(
+                self.model.game_state.deleteObjectsFromMap(None)
+            )
+            for obj in deleted:
+                obj.delete()
+        timings.append(("unload", time.time() - phase_start))
+        yield
+        phase_start = time.time()
+        self.model.preloadMap(target_map_name)
+        preloaded_map = self.model.map_preloader.take(target_map_name)
+        if preloaded_map is not None:
+            self.model.addDialogues(preloaded_map.dialogues)
+        timings.append(("wait for data", time.time() - phase_start))
+        phase_start = time.time()
+        self.model.loadMap(target_map_name)
+        timings.append(("load map", time.time() - phase_start))
+        yield
+        phase_start = time.time()
+        self.systems.scripting.reset()
+        self.model.readScriptsOfMap(
+            target_map_name, self,
+            preloaded_map.scripts if preloaded_map else None
+        )
+        self.model.setActiveMap(
+            target_map_name, self,
+            preloaded_map.agents if preloaded_map else None
+        )
+        timings.append(("read agents and scripts", time.time() - phase_start))
+        yield
+        phase_start = time.time()
+        for agent in self.model.iterPlaceAgents(self):
+            yield
+        timings.append(("place agents", time.time() - phase_start))
+        phase_start = time.time()
+        self.model.placePC(self)
+        self.model.updateObjectDB(self)
+        self.model.evictMaps()
+        self.model.map_change = False
+        # The PlayerCharacter has an inventory, and also some 
+        # filling of the ready slots in the HUD. 
+        # At this point we sync the contents of the ready slots 
+        # with the contents of the inventory.
+        self.view.hud.inventory = None
+        self.view.hud.initializeInventory()         
+        self.pause(False)
+        timings.append(("place player", time.time() - phase_start))
+        logger.info("changed to map {0}: {1}".format(
+            target_map_name,
+            ", ".join("{0} {1:.1f} ms".format(phase, phase_time * 1000) 
+                      for phase, phase_time in timings)
+        ))
+        self.autoSave()
+
+    def autoSave(self):
+        """Takes a snapshot of the game and lets the auto saver write it in
+        the background, unless the last autosave is still being written"""
+        if self.auto_saver.isSaving():
+            return
+        start_time = time.time()
+        self.model.updateObjectDB(self)
+        self.auto_saver.save(self.model.createSnapshot())
+        logger.debug("autosave snapshot taken in {0:.1f} ms"
+                     .format((time.time() - start_time) * 1000))
+
+    def preloadNearbyMaps(self):
+        """Preloads the target maps of the change_map objects near the 
+        player"""
+        game_state = self.model.game_state
+        if game_state.scene_version == self.preload_version:
+            return
+        self.preload_version = game_state.scene_version
+        map_name = game_state.current_map_name
+        coords = game_state.object_store.getPosition("PlayerCharacter")
+        if coords is None:
+            return
+        for obj in game_state.getObjectsNear(map_name, coords, 
+                                             self.PRELOAD_DISTANCE):
+            if game_state.hasComponent(obj.general.identifier, "change_map"):
+                self.model.preloadMap(obj.change_map.target_map)
 
     def setupScripts(self, map_name):
         """Read scripts for the current map"""
@@ -465,22 +565,24 @@ class GameSceneController(PARPGWorld, ControllerBase):
            @rtype: list
            @return: List of text and callbacks"""
         actions = []
-        obj = self.model.game_state.\
-                        getObjectById(obj_id,
-                                      self.model.game_state.current_map_name)
+        game_state = self.model.game_state
+        obj = game_state.getObjectById(obj_id, game_state.current_map_name)
+        if obj is None:
+            return actions
         #obj_pos = obj.fifeagent.behaviour.getLocation().getLayerCoordinates()
         agent = obj.fifeagent.behaviour.agent
-        player = self.model.game_state.getObjectById("PlayerCharacter")
+        player = game_state.getObjectById("PlayerCharacter")
         is_player = obj.general.identifier == player.general.identifier
+        has_component = lambda name: game_state.hasComponent(obj_id, name)
         
         
         #TODO: Check all actions to be compatible with the grease components
         if obj is not None:
-            if obj.dialogue and not is_player:
+            if has_component("dialogue") and not is_player:
                 actions.append(["Talk", "Talk", self.initTalk, obj])
-            if obj.characterstats and not is_player:
+            if has_component("characterstats") and not is_player:
                 actions.append(["Attack", "Attack", self.nullFunc, obj])
-            if obj.description and obj.description.desc:
+            if has_component("description") and obj.description.desc:
                 actions.append(["Examine", "Examine",
                                 player.fifeagent.behaviour.approach, 
                                 agent,
@@ -488,14 +590,15 @@ class GameSceneController(PARPGWorld, ControllerBase):
                                               obj_id, obj.description.view_name, 
                                               obj.description.desc)])
 
-            if obj.change_map:
+            if has_component("change_map"):
+                self.model.preloadMap(obj.change_map.target_map)
                 actions.append(["Change Map", "Change Map",
                    player.fifeagent.behaviour.approach, 
                    agent,
                    ChangeMapAction(self, obj.change_map.target_map,
                                    obj.change_map.target_position)])
             
-            if obj.lockable:
+            if has_component("lockable"):
                 if obj.lockable.closed:
                     if not obj.lockable.locked:
                         actions.append(["Open", "Open", 
@@ -518,16 +621,16 @@ class GameSceneController(PARPGWorld, ControllerBase):
                                         player.fifeagent.behaviour.approach,
                                         agent,
                                         LockAction(self, obj)])
-            if obj.container:
-                if obj.characterstats:
+            if has_component("container"):
+                if has_component("characterstats"):
                     #TODO: This is reserved for a possible "Steal" action.
                     pass                
-                elif not obj.lockable or not obj.lockable.closed:
+                elif not has_component("lockable") or not obj.lockable.closed:
                     actions.append(["Examine contents", "Examine Contents",
                                     player.fifeagent.behaviour.approach,
                                     agent,
                                     ExamineContentsAction(self, obj)])
-            if obj.containable:
+            if has_component("containable"):
                 actions.append(["Pick Up", "Pick Up", 
                                 player.fifeagent.behaviour.approach,
                                 agent,
@@ -587,14 +690,23 @@ class GameSceneController(PARPGWorld, ControllerBase):
         """Routine called during each frame. Our main loop is in ./run.py"""
         # uncomment to instrument
         # t0 = time.time()
+        now = time.time()
+        if not self.paused and self.last_pump_time is not None:
+            self.model.game_state.play_time += now - self.last_pump_time
+        self.last_pump_time = now
+        if self.map_transition is not None:
+            self.stepMapTransition()
+            return
         if self.paused: 
             return
         ControllerBase.pump(self, dt)
         PARPGWorld.pump(self, dt)
         self.updateMouse()
         if self.model.active_map:
-            self.view.highlightFrontObject(self.last_mousecoords)
             self.view.refreshTopLayerTransparencies()
             self.handleScrolling()
+            self.preloadNearbyMaps()
+            if self.auto_saver.isDue():
+                self.autoSave()
         self.handleCommands()
         # print "%05f" % (time.time()-t0,)
@@ -121,10 +121,10 @@ class GameSceneView(ViewBase):
                                                     137, 255, 2)
                     # get the text
                     item = self.model.objectActive(self.highlight_obj)
-                    if item is not None:
+                    if item:
                         self.displayObjectText(self.highlight_obj, 
                                                     item.description.view_name)
-            else:
+            elif self.highlight_obj is not None:
                 self.model.active_map.outline_renderer.removeAllOutlines()
                 self.highlight_obj = None  
            
@@ -15,23 +15,85 @@
 import math
 
 from parpg.quest_engine import QuestEngine
+from parpg.objectstore import ObjectStore
+from parpg.components import base, components
 
 def script_help(object):
     """Python's help() function with the no-parameters path disabled"""
     help(object)
-    
+
+class ObservedDict(dict):
+    """Dictionary that calls a function with the key of every item that 
+    gets set or deleted"""
+
+    def __init__(self, on_change, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.on_change = on_change
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.on_change(key)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.on_change(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).iteritems():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if not key in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        value = dict.pop(self, key, *default)
+        self.on_change(key)
+        return value
+
+    def clear(self):
+        keys = self.keys()
+        dict.clear(self)
+        for key in keys:
+            self.on_change(key)
+
 class GameState(object):
     """This class holds the current state of the game."""
-    def __init__(self, quests_dir = None):
+    
+    # Functions in the game environment that always return the same value
+    # for the same arguments
+    CONSTANT_FUNCS = ("__builtins__", "help", "sqrt", "log", "str")
+    # Functions in the game environment whose results only change when 
+    # markChanged is called with their name
+    TRACKED_FUNCS = ("met", "quest")
+    
+    def __init__(self, quests_dir = None, read_quests = True):
         self.player_character = None
+        self.changed_names = set()
+        self.entities_changed = False
+        self.all_changed = False
+        # Increased whenever objects of the current scene are added, removed
+        # or moved, or the map changes
+        self.scene_version = 0
+        # Entities whose saved values have to be updated
+        self.unsaved_entities = set()
+        # The container entity of each entity in a container
+        self.entity_containers = {}
         self.quest_engine = QuestEngine(quests_dir)
-        self.quest_engine.readQuests()
-        self.objects = {}
-        self.object_ids = {}
-        self.current_map_name = None
+        self.quest_engine.on_change = lambda: self.markChanged("quest")
+        if read_quests:
+            self.quest_engine.readQuests()
+        self.object_store = ObjectStore(components)
+        self._current_map_name = None
         self.maps = {}
         self.npcs_met = set()
-        self.funcs = {
+        # Seconds the game was played, not counting pauses
+        self.play_time = 0.0
+        # The globals of the game environment: the funcs, overridden by the
+        # objects of the current map. Kept up to date as those change.
+        self.environment = {}
+        self.funcs = ObservedDict(self.onFuncChange, {
                 "__builtins__":None,
                 "help":script_help, 
                 "sqrt":math.sqrt,
@@ -39,13 +101,100 @@ class GameState(object):
                 "str":str, 
                 "meet":self.meet,
                 "met":self.met,
-                }                
-        self.locals = {}
+                "quest":self.quest_engine,
+                })
+        self.environment.update(self.funcs)
+        self.locals = ObservedDict(self.markChanged)
+        base.add_write_observer(self.onComponentWrite)
         
+    @property
+    def current_map_name(self):
+        """The name of the map the player is on"""
+        return self._current_map_name
+
+    @current_map_name.setter
+    def current_map_name(self, map_name):
+        old_names = self.getObjectDictOfMap(self._current_map_name).keys()
+        self._current_map_name = map_name
+        for name in old_names:
+            self.updateEnvironment(name)
+        for name in self.getObjectDictOfMap(map_name):
+            self.updateEnvironment(name)
+        self.scene_version += 1
+        self.markAllChanged()
+    
+    def updateEnvironment(self, name):
+        """Sets the value of a name in the game environment to the object
+        with that id on the current map, or the function with that name.
+        @param name: The name to update
+        @type name: str"""
+        objects = self.getObjectDictOfMap(self._current_map_name)
+        if name in objects:
+            self.environment[name] = objects[name]
+        elif name in self.funcs:
+            self.environment[name] = self.funcs[name]
+        else:
+            self.environment.pop(name, None)
+    
+    def onFuncChange(self, name):
+        """Called when a function of the game environment is changed"""
+        self.updateEnvironment(name)
+        self.markChanged(name)
+        
+    def markChanged(self, name):
+        """Records that the value of a name in the game environment 
+        changed.
+        @param name: The name that changed
+        @type name: str"""
+        self.changed_names.add(name)
+    
+    def markAllChanged(self):
+        """Records that the whole game environment has to be considered
+        as changed"""
+        self.all_changed = True
+    
+    def onComponentWrite(self, entity, component, field):
+        """Called when a component field of an entity is written"""
+        self.object_store.onComponentWrite(entity, component, field)
+        self.entities_changed = True
+        self.unsaved_entities.add(entity)
+        if field == "container":
+            # The inventories of the old and the new container change too
+            old_container = self.entity_containers.pop(entity, None)
+            if old_container is not None:
+                self.unsaved_entities.add(old_container)
+            data = component.get(entity)
+            if data is not None and data.container is not None:
+                self.entity_containers[entity] = data.container.entity
+                self.unsaved_entities.add(data.container.entity)
+    
+    def markSaved(self, entity):
+        """Marks the saved values of an entity as up to date
+        @param entity: The entity"""
+        self.unsaved_entities.discard(entity)
+    
+    def popUnsavedEntities(self):
+        """Returns the entities whose saved values have to be updated
+        and resets them
+        @return: A set of the entities"""
+        entities = self.unsaved_entities
+        self.unsaved_entities = set()
+        return entities
+    
+    def popChanges(self):
+        """Returns the changes recorded since the last call and resets them
+        @return: A tuple with the set of changed names, whether a component 
+        of any entity was written and whether everything has to be 
+        considered as changed"""
+        changes = (self.changed_names, self.entities_changed, 
+                   self.all_changed)
+        self.changed_names = set()
+        self.entities_changed = False
+        self.all_changed = False
+        return changes
         
     def addObject(self, object_id, map_id, game_object):
-        """Adds an object to the objects and object_ids
-        dictionaries.
+        """Adds an object to the object store.
         @param object_id: ID of the object
         @type object_id: str
         @param map_id: ID of the map the object is on. 
@@ -54,14 +203,16 @@ class GameState(object):
         @param object: object to be added
         @type object: GameObject
         """
-        if not self.object_ids.has_key(object_id):
-            if not self.objects.has_key(map_id):
-                self.objects[map_id] = {}
-            self.objects[map_id][object_id] = game_object
-            self.object_ids[object_id] = map_id
+        if not self.object_store.has(object_id):
+            self.object_store.add(object_id, map_id, game_object)
+            self.unsaved_entities.add(game_object)
+            if map_id == self._current_map_name:
+                self.updateEnvironment(object_id)
+                self.scene_version += 1
+            self.markChanged(object_id)
     
     def deleteObject(self, object_id):
-        """Removes an object from the dictionaries
+        """Removes an object from the object store
         @param object_id: ID of the object
         @type object_id: str
         @returns The deleted object
@@ -71,9 +222,11 @@ class GameState(object):
             if map_id:
                 inst = self.maps[map_id].agent_layer.getInstance(object_id)
                 self.maps[map_id].agent_layer.deleteInstance(inst)
-            obj = self.objects[map_id][object_id]
-            del self.objects[map_id][object_id]
-            del self.object_ids[object_id]
+            obj = self.object_store.remove(object_id)
+            if map_id == self._current_map_name:
+                self.updateEnvironment(object_id)
+                self.scene_version += 1
+            self.markChanged(object_id)
             return obj
         return None
             
@@ -83,14 +236,59 @@ class GameState(object):
            @type map: String
            @param map: The map name.
            @returns: The list of objects on this map. Or an empty list"""
-        return [i for i in self.getObjectDictOfMap(map_id).values()
-                                    if map_id in self.objects]
+        return self.getObjectDictOfMap(map_id).values()
     
     
     def getObjectDictOfMap(self, map_id):
-        if map_id in self.objects:
-            return self.objects[map_id]
-        return {}
+        """Gets the objects that are currently on the given map, without 
+        copying them.
+           @type map: String
+           @param map: The map name.
+           @returns: A dictionary of the objects by id, which must not be 
+           modified."""
+        return self.object_store.getObjectsOfMap(map_id)
+    
+    def getObjectsWithComponent(self, map_id, component_name):
+        """Gets the objects on the given map that have a component.
+           @type map_id: String
+           @param map_id: The map name, or None for objects in containers
+           @type component_name: String
+           @param component_name: The name of the component
+           @returns: A list of the objects"""
+        return [self.object_store.get(object_id) for object_id in
+                self.object_store.getIdsWithComponent(map_id, component_name)]
+    
+    def hasComponent(self, object_id, component_name):
+        """Check if an object has a component
+        @param object_id: ID of the object
+        @type object_id: str
+        @param component_name: The name of the component
+        @type component_name: str
+        @return: True if the object has the component, False if not"""
+        return self.object_store.hasComponent(object_id, component_name)
+    
+    def setObjectPosition(self, object_id, coords):
+        """Records the position of an object on its map
+        @param object_id: ID of the object
+        @type object_id: str
+        @param coords: The x and y layer coordinates of the object
+        @type coords: tuple"""
+        self.object_store.setPosition(object_id, coords)
+        if self.getMapOfObject(object_id) == self._current_map_name:
+            self.scene_version += 1
+    
+    def getObjectsNear(self, map_id, coords, radius):
+        """Gets the objects on the given map that are within a distance of a
+        position.
+           @type map_id: String
+           @param map_id: The map name
+           @type coords: tuple
+           @param coords: The x and y layer coordinates of the position
+           @type radius: float
+           @param radius: The maximum distance
+           @returns: A list of the objects"""
+        return [self.object_store.get(object_id) for object_id in
+                self.object_store.getIdsNear(map_id, coords, radius)]
     
     def deleteObjectsFromMap(self, map_id):
         """Deletes all objects of the given map.
@@ -98,9 +296,8 @@ class GameState(object):
            @param map: The map name.
            @returns: None"""
         deleted_objs = []
-        if map_id in self.objects:
-            for obj in self.objects[map_id].copy():
-                deleted_objs.append(self.deleteObject(obj))
+        for obj in self.getObjectDictOfMap(map_id).keys():
+            deleted_objs.append(self.deleteObject(obj))
         return deleted_objs
     
     def hasObject(self, object_id):
@@ -109,7 +306,7 @@ class GameState(object):
         @type object_id: str
         @return: True if there is an object False if not
         """
-        return self.object_ids.has_key(object_id)
+        return self.object_store.has(object_id)
     
     def getMapOfObject(self, object_id):
         """Returns the map the object is on.
@@ -118,9 +315,7 @@ class GameState(object):
         @return: Name of the map the object is on. 
         If there is no such object or the object is in a container None is returned
         """
-        if self.object_ids.has_key(object_id):
-            return self.object_ids[object_id]
-        return None
+        return self.object_store.getMap(object_id)
     
     def getObjectById(self, obj_id, map_id = None):
         """Gets an object by its object id and map id
@@ -129,38 +324,44 @@ class GameState(object):
            @type map_id: String
            @param map_id: It id of the map containing the object.
            @returns: The object or None."""
-        if not map_id:
-            map_id = self.getMapOfObject(obj_id)
-        if not map_id in self.objects:
-            self.objects[map_id] = {}
-        if obj_id in self.objects[map_id]:
-            return self.objects[map_id][obj_id]
+        if map_id and self.getMapOfObject(obj_id) != map_id:
+            return None
+        return self.object_store.get(obj_id)
     
     def clearObjects(self):
         """Delete all objects from the state
         """
-        self.objects = {}
-        self.object_ids = {}
+        self.object_store.clear()
+        self.scene_version += 1
+        self.environment.clear()
+        self.environment.update(self.funcs)
+        self.markAllChanged()
         
-    def getStateForSaving(self):
+    def getStateForSaving(self, only_changed=False):
         """Prepares state for saving
+        @type only_changed: bool
+        @param only_changed: Whether to leave out the quest variables that
+        weren't changed
         @type state: dictionary
         @param state: State of the object  
         """
         ret_dict = {}
         ret_dict["CurrentMap"] = self.current_map_name
-        ret_dict["Quests"] = self.quest_engine.getStateForSaving()
+        ret_dict["Quests"] = self.quest_engine.getStateForSaving(only_changed)
         ret_dict["NPCsMet"] = self.npcs_met
-        ret_dict["locals"] = self.locals
+        ret_dict["locals"] = dict(self.locals)
+        ret_dict["PlayTime"] = self.play_time
         return ret_dict
 
     def restoreFromState(self, state):
         """Restores the state"""
         self.current_map_name = state["CurrentMap"]
         self.npcs_met = state["NPCsMet"]
-        self.locals = state["locals"]
+        self.play_time = state.get("PlayTime", 0.0)
+        self.locals = ObservedDict(self.markChanged, state["locals"])
         self.quest_engine.readQuests()
         self.quest_engine.restoreFromState(state["Quests"])
+        self.markAllChanged()
 
     def meet(self, npc):
         """Record that the PC has met a certain NPC
@@ -171,6 +372,7 @@ class GameState(object):
             # raise RuntimeError("I already know %s" % npc)
             return
         self.npcs_met.add(npc)
+        self.markChanged("met")
 
     def met(self, npc):
         """Indicate whether the PC has met this npc before
@@ -181,9 +383,7 @@ class GameState(object):
     
     def getGameEnvironment(self):
         """Returns a 2 item list containing the entities and functions that 
-        can work with it. This can be used in functions like eval or exec"""
-        globals = {}
-        globals.update(self.funcs)
-        globals.update(self.getObjectDictOfMap(self.current_map_name))
-        
-        return globals,  self.locals
+        can work with it. This can be used in functions like eval or exec.
+        The globals are shared and kept up to date, so they must not be 
+        modified by the caller."""
+        return self.environment,  self.locals
@@ -27,13 +27,14 @@ class DialogueGUI(object):
     """Window that handles the dialogues."""
     _logger = logging.getLogger('dialoguegui.DialogueGUI')
     
-    def __init__(self, controller, npc, quest_engine, met_fnc, meet_fnc, 
-                 has_fnc, player_character):
+    def __init__(self, controller, npc, dialogue, quest_engine, met_fnc,
+                 meet_fnc, has_fnc, player_character):
         self.active = False
         self.controller = controller
         xml_file = vfs.VFS.open('gui/dialogue.xml')
         self.dialogue_gui = pychan.loadXML(xml_file)
         self.npc = npc
+        self.dialogue = dialogue
         # TODO Technomage 2010-11-10: the QuestEngine should probably be
         #     a singleton-like object, which would avoid all of this instance
         #     handling.
@@ -57,7 +58,7 @@ class DialogueGUI(object):
         self.dialogue_gui.mapEvents(events)
         self.dialogue_gui.show()
         self.setNpcName(self.npc.description.view_name)
-        self.setAvatarImage(self.npc.dialogue.dialogue.avatar_path)
+        self.setAvatarImage(self.dialogue.avatar_path)
         
         game_state = {'npc': self.npc, 'pc': self.player_character,
                       'quest': self.quest_engine, 
@@ -66,7 +67,7 @@ class DialogueGUI(object):
                       'model': self.controller.model,
                       }
         try:
-            self.dialogue_processor = DialogueProcessor(self.npc.dialogue.dialogue,
+            self.dialogue_processor = DialogueProcessor(self.dialogue,
                                                         game_state)
             self.dialogue_processor.initiateDialogue()
         except (TypeError) as error:
@@ -18,6 +18,7 @@ from fife.extensions import pychan
 from fife.extensions.pychan import widgets
 
 from parpg import vfs
+from parpg.saveindex import SaveIndex, formatMetadata
 
 logger = logging.getLogger('filebrowser')
 
@@ -32,10 +33,12 @@ class FileBrowser(object):
        select_dir is set, file_selected's filename parameter should be optional.
        The save_file option provides a box for supplying a new filename that
        doesn't exist yet. The select_dir option allows directories to be
-       selected as well as files."""
+       selected as well as files. The describe_saves option shows the
+       descriptions of the saves from the index of the directory next to
+       the file names."""
     def __init__(self, engine, settings, file_selected, gui_xml_path,
                  close_callback=None, save_file=False, select_dir=False, 
-                 extensions=('.dat',)):
+                 extensions=('.dat',), describe_saves=False):
         self.engine = engine
         self.settings = settings
         self.file_selected = file_selected
@@ -43,6 +46,7 @@ class FileBrowser(object):
         self._widget = None
         self.save_file = save_file
         self.select_dir = select_dir
+        self.describe_saves = describe_saves
         self.close_callback = close_callback
         self.gui_xml_path = gui_xml_path 
         
@@ -119,11 +123,28 @@ class FileBrowser(object):
                            self.engine.getVFS().listFiles(self.path))
         self.dir_list = decodeList(dir_list)
         self.file_list = decodeList(file_list)
+        file_labels = self.file_list
+        if self.describe_saves:
+            file_labels = self.describeFiles(file_list, self.file_list)
         self._widget.distributeInitialData({
             'dirList'  : self.dir_list,
-            'fileList' : self.file_list
+            'fileList' : file_labels
         })
 
+    def describeFiles(self, file_names, decoded_names):
+        """Returns the names of the saves in the current directory with
+        their descriptions from the save index"""
+        save_index = SaveIndex(self.path)
+        labels = []
+        for file_name, decoded_name in zip(file_names, decoded_names):
+            description = formatMetadata(save_index.getMetadata(file_name))
+            if description:
+                decoded_name = u"{0}  ({1})".format(decoded_name, 
+                                                     description)
+            labels.append(decoded_name)
+        save_index.write()
+        return labels
+
     def _selectFile(self):
         """ File selection callback. """
         self._widget.hide()
@@ -337,7 +337,8 @@ class Hud(object):
                                    xml_path,
                                    close_callback = self.loadsave_close,
                                    save_file=False,
-                                   extensions=('.dat'))
+                                   extensions=('.dat'),
+                                   describe_saves=True)
         load_browser.showBrowser()
         self.model.pause(True)
         self.controller.pause(True)
@@ -498,15 +499,18 @@ class Hud(object):
         self.examine_box = ExaminePopup(self.engine, title, desc)
         self.examine_box.showPopUp()
 
-    def showDialogue(self, npc):
+    def showDialogue(self, npc, dialogue):
         """Show the NPC dialogue window
            @type npc: actors.NonPlayerCharacter
            @param npc: the npc that we are having a dialogue with
+           @type dialogue: parpg.dialogue.Dialogue
+           @param dialogue: the dialogue of the npc
            @return: The dialogue"""
         self.stopActions()
         dialogue = DialogueGUI(
                     self.controller,
                     npc,
+                    dialogue,
                     self.model.game_state.quest_engine,
                     self.model.game_state.met, self.model.game_state.meet,
                     container.get_item,
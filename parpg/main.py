@@ -13,7 +13,7 @@
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import logging
 import sys
-from os.path import abspath
+from os.path import abspath, join
       
 def main(parser):
 
@@ -53,6 +53,13 @@ def main(parser):
    
     from parpg.application import PARPGApplication
     from parpg.common import utils
+    from parpg import contentcache
+    
+    cache_dir = join(settings.user_path,
+                     settings.get("parpg", "CachePath", "cache"))
+    contentcache.CACHE = contentcache.ContentCache(
+        data_dir, cache_dir, rebuild=getattr(opts, "rebuild_cache", False)
+    )
     
     # enable psyco if available and in settings file
     try:
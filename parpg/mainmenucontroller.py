@@ -50,6 +50,7 @@ class MainMenuController(ControllerBase):
     
     def newGame(self):
         """Start a new game and switch to the character creation controller."""
+        self.application.finishLoading()
         view = CharacterCreationView(self.engine, self.model,
                                      self.model.settings)
         controller = CharacterCreationController(self.engine, view, self.model,
@@ -73,6 +74,7 @@ class MainMenuController(ControllerBase):
     def loadGame(self, *args, **kwargs):
         """Loads the game state
            @return: None"""
+        self.application.finishLoading()
 
         view = GameSceneView(self.engine,
                              self.model)
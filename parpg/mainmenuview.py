@@ -89,7 +89,8 @@ class MainMenuView(ViewBase):
                                    self.load_game_callback,
                                    gui_xml_path='gui/loadbrowser.xml',
                                    save_file=False,
-                                   extensions=('.dat'))
+                                   extensions=('.dat'),
+                                   describe_saves=True)
         load_browser.showBrowser()
     
     def initializeQuitDialog(self):
@@ -0,0 +1,148 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Keeps the loaded maps resident within a budget, so that returning to a
+recently visited map doesn't load it again."""
+
+import logging
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python version 2.4-2.6 doesn't have the OrderedDict
+    from parpg.common.ordereddict import OrderedDict
+
+logger = logging.getLogger('mapcache')
+
+class MapCache(object):
+    """The loaded maps by name, ordered from the least to the most recently
+    visited. When there are more maps than the budget allows, the least
+    recently visited ones are evicted."""
+
+    def __init__(self, max_maps=0, max_size=0, size_of=None, on_evict=None):
+        """Constructor
+        @param max_maps: Number of maps to keep, 0 for no limit
+        @type max_maps: int
+        @param max_size: Total size of the maps to keep, 0 for no limit
+        @type max_size: int
+        @param size_of: Function that returns the size of a map, for
+        example its number of instances
+        @type size_of: callable
+        @param on_evict: Function that gets called with the name and the map
+        before a map is evicted
+        @type on_evict: callable"""
+        self.max_maps = max_maps
+        self.max_size = max_size
+        self.size_of = size_of or (lambda game_map: 0)
+        self.on_evict = on_evict
+        self.maps = OrderedDict()
+        self.sizes = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, map_name):
+        return map_name in self.maps
+
+    def __getitem__(self, map_name):
+        return self.maps[map_name]
+
+    def __setitem__(self, map_name, game_map):
+        self.maps.pop(map_name, None)
+        self.maps[map_name] = game_map
+        self.sizes.pop(map_name, None)
+
+    def __len__(self):
+        return len(self.maps)
+
+    def __iter__(self):
+        return iter(self.maps)
+
+    def keys(self):
+        """Returns the names of the maps, the least recently visited first"""
+        return self.maps.keys()
+
+    def get(self, map_name, default=None):
+        return self.maps.get(map_name, default)
+
+    def pop(self, map_name, *default):
+        self.sizes.pop(map_name, None)
+        return self.maps.pop(map_name, *default)
+
+    def clear(self):
+        """Forgets about all maps, without evicting them"""
+        self.maps.clear()
+        self.sizes.clear()
+
+    def fetch(self, map_name, load):
+        """Returns a map and marks it as the most recently visited one
+        @param map_name: Name of the map
+        @type map_name: str
+        @param load: Function that loads the map if it is not resident
+        @type load: callable
+        @return: The map"""
+        if map_name in self.maps:
+            self.hits += 1
+            game_map = self.maps.pop(map_name)
+        else:
+            self.misses += 1
+            game_map = load()
+        self.maps[map_name] = game_map
+        return game_map
+
+    def getSize(self, map_name):
+        """Returns the size of a map, which is measured once"""
+        if map_name not in self.sizes:
+            self.sizes[map_name] = self.size_of(self.maps[map_name])
+        return self.sizes[map_name]
+
+    def getTotalSize(self):
+        """Returns the size of all resident maps"""
+        return sum(self.getSize(map_name) for map_name in self.maps)
+
+    def isOverBudget(self):
+        """Returns whether there are more maps than the budget allows"""
+        if self.max_maps and len(self.maps) > self.max_maps:
+            return True
+        return bool(self.max_size) and self.getTotalSize() > self.max_size
+
+    def evict(self, keep=()):
+        """Evicts the least recently visited maps until the budget is met
+        @param keep: Names of maps that must not be evicted, like the
+        current one
+        @type keep: iterable
+        @return: The names of the evicted maps"""
+        evicted = []
+        for map_name in self.maps.keys():
+            if not self.isOverBudget():
+                break
+            if map_name in keep:
+                continue
+            game_map = self.maps[map_name]
+            if self.on_evict is not None:
+                self.on_evict(map_name, game_map)
+            self.pop(map_name)
+            self.evictions += 1
+            evicted.append(map_name)
+            logger.debug("evicted map {0}".format(map_name))
+        return evicted
+
+    def getStats(self):
+        """Returns a description of the resident maps and how often maps
+        were found resident"""
+        names = ", ".join("{0} ({1})".format(map_name, self.getSize(map_name))
+                          for map_name in reversed(self.maps.keys()))
+        return ("{0} resident maps, size {1}: {2}; {3} hits, {4} misses, "
+                "{5} evictions".format(len(self.maps), self.getTotalSize(),
+                                       names or "none", self.hits,
+                                       self.misses, self.evictions))
@@ -0,0 +1,147 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Parses the data files of maps in a worker thread, so that a map change
+only has to create the map and its instances."""
+
+import logging
+import threading
+import time
+from Queue import Queue
+
+from parpg import yamlio
+
+logger = logging.getLogger('mappreloader')
+
+class PreloadedMap(object):
+    """The parsed data files of a map"""
+
+    def __init__(self, map_name, agents_data, scripts_data,
+                 load_dialogues=None, agent_names=()):
+        """Constructor
+        @param map_name: Name of the map
+        @type map_name: str
+        @param agents_data: Contents of the agents file of the map, or None
+        if the agents were already read
+        @type agents_data: str or None
+        @param scripts_data: Contents of the scripts file of the map, or None
+        if the map has no scripts
+        @type scripts_data: str or None
+        @param load_dialogues: Function that returns the dialogues of the
+        agents with the given names by the names, or None to not load the
+        dialogues. It is called from the worker thread.
+        @type load_dialogues: callable
+        @param agent_names: Names of the agents of the map that are already
+        known, the agents in agents_data are added to them
+        @type agent_names: iterable"""
+        self.map_name = map_name
+        self.agents_data = agents_data
+        self.scripts_data = scripts_data
+        self.load_dialogues = load_dialogues
+        self.agent_names = list(agent_names)
+        self.agents = None
+        self.scripts = None
+        self.dialogues = {}
+        self.error = None
+        self.parse_time = 0.0
+        self.parsed = threading.Event()
+
+    def parse(self):
+        """Parses the data, to be called from the worker thread"""
+        start_time = time.time()
+        try:
+            if self.agents_data is not None:
+                self.agents = [agent for agent in 
+                               yamlio.load_all(self.agents_data)
+                               if agent is not None]
+            if self.scripts_data is not None:
+                self.scripts = yamlio.load(self.scripts_data)
+            if self.load_dialogues is not None:
+                if self.agents is not None:
+                    self.agent_names.extend(agent.keys()[0]
+                                            for agent in self.agents)
+                self.dialogues = self.load_dialogues(self.agent_names)
+        except Exception, error:
+            self.error = error
+        self.agents_data = self.scripts_data = None
+        self.load_dialogues = None
+        self.parse_time = time.time() - start_time
+        self.parsed.set()
+
+class MapPreloader(object):
+    """Parses the data files of maps in a worker thread"""
+
+    def __init__(self):
+        self.maps = {}
+        self.jobs = Queue()
+        self.thread = None
+
+    def preload(self, map_name, agents_data, scripts_data,
+                load_dialogues=None, agent_names=()):
+        """Starts parsing the data files of a map, unless that was already
+        done.
+        @param map_name: Name of the map
+        @type map_name: str
+        @param agents_data: Contents of the agents file of the map, or None
+        @type agents_data: str or None
+        @param scripts_data: Contents of the scripts file of the map, or None
+        @type scripts_data: str or None
+        @param load_dialogues: Function that loads the dialogues of agents
+        in the worker thread, or None, see L{PreloadedMap}
+        @type load_dialogues: callable
+        @param agent_names: Names of the already known agents of the map
+        @type agent_names: iterable"""
+        if map_name in self.maps:
+            return
+        logger.debug("preloading map {0}".format(map_name))
+        preloaded_map = PreloadedMap(map_name, agents_data, scripts_data,
+                                     load_dialogues, agent_names)
+        self.maps[map_name] = preloaded_map
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.work,
+                                           name="MapPreloader")
+            self.thread.daemon = True
+            self.thread.start()
+        self.jobs.put(preloaded_map)
+
+    def isPreloading(self, map_name):
+        """Returns whether the data of a map was requested"""
+        return map_name in self.maps
+
+    def work(self):
+        """Parses the queued maps, runs in the worker thread"""
+        while True:
+            self.jobs.get().parse()
+
+    def take(self, map_name):
+        """Returns the parsed data of a map, waiting for the worker thread if
+        necessary, and forgets about it.
+        @param map_name: Name of the map
+        @type map_name: str
+        @return: The PreloadedMap or None if the map wasn't preloaded"""
+        preloaded_map = self.maps.pop(map_name, None)
+        if preloaded_map is None:
+            return None
+        start_time = time.time()
+        preloaded_map.parsed.wait()
+        logger.info("map {0}: data parsed in {1:.1f} ms, waited {2:.1f} ms"
+                    .format(map_name, preloaded_map.parse_time * 1000,
+                            (time.time() - start_time) * 1000))
+        if preloaded_map.error is not None:
+            raise preloaded_map.error
+        return preloaded_map
+
+    def clear(self):
+        """Forgets about all preloaded maps"""
+        self.maps = {}
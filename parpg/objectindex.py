@@ -0,0 +1,205 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Index of the FIFE object files by the ids of their objects.
+
+Finding the object files means reading the root element of every XML file
+in the objects tree. The index stores the ids found in each directory,
+together with the modification time of the directory, in the cache
+directory. Only the directories whose modification time changed are listed
+and read again, so a start with an unchanged tree only checks the
+directories. A directory's modification time changes when files are added,
+removed or renamed in it, but not when a file is edited in place; the
+rebuild option of the content cache covers that."""
+
+import os
+import fnmatch
+import marshal
+import logging
+
+from parpg import vfs, contentcache
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+logger = logging.getLogger('objectindex')
+
+# Increase when the layout of the index changes
+INDEX_VERSION = 1
+
+INDEX_NAME = "objects.idx"
+
+# Bytes read at a time while looking for the root element
+CHUNK_SIZE = 512
+
+class ChunkReader(object):
+    """Reads a stream in small chunks, so that iterparse doesn't read more
+    of the file than needed"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size=-1):
+        if size < 0 or size > CHUNK_SIZE:
+            size = CHUNK_SIZE
+        return self.stream.read(size)
+
+def readObjectId(stream):
+    """Returns the id of the object that an XML file defines, reading only
+    up to its root element
+    @param stream: The XML file
+    @type stream: file
+    @return: The id, or None if the root element isn't an object"""
+    for event, element in ElementTree.iterparse(ChunkReader(stream),
+                                                ("start",)):
+        if element.tag == "object":
+            return element.attrib.get("id")
+        return None
+    return None
+
+class ObjectIndex(object):
+    """The ids of the objects in the XML files of a directory tree"""
+
+    def __init__(self, source_dir, index_path=None, rebuild=False):
+        """Constructor
+        @param source_dir: Directory that the VFS paths are relative to
+        @type source_dir: str
+        @param index_path: File that the index is stored in, or None to not
+        store it
+        @type index_path: str
+        @param rebuild: Whether to ignore the stored index
+        @type rebuild: bool"""
+        self.source_dir = source_dir
+        self.index_path = index_path
+        self.directories = {} if rebuild else self.readIndex()
+        self.changed = False
+        self.parsed_files = 0
+
+    def readIndex(self):
+        """Returns the stored directories, or an empty dictionary if there
+        is no usable index"""
+        if self.index_path is None:
+            return {}
+        try:
+            with open(self.index_path, "rb") as index_file:
+                version, directories = marshal.load(index_file)
+        except (IOError, EOFError, ValueError, TypeError):
+            return {}
+        if version != INDEX_VERSION or not isinstance(directories, dict):
+            return {}
+        return directories
+
+    def writeIndex(self):
+        """Stores the directories if they changed"""
+        if self.index_path is None or not self.changed:
+            return
+        temp_path = self.index_path + ".tmp"
+        try:
+            index_dir = os.path.dirname(self.index_path)
+            if index_dir and not os.path.isdir(index_dir):
+                os.makedirs(index_dir)
+            with open(temp_path, "wb") as index_file:
+                marshal.dump((INDEX_VERSION, self.directories), index_file)
+            if os.name == "nt" and os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            os.rename(temp_path, self.index_path)
+        except (IOError, OSError), error:
+            logger.warning("unable to write the object index: {0}"
+                           .format(error))
+            return
+        self.changed = False
+
+    def readDirectory(self, directory, pattern):
+        """Lists a directory and reads the ids of its object files
+        @return: A tuple of the ids by file name and the subdirectories"""
+        objects = {}
+        for filename in fnmatch.filter(vfs.VFS.listFiles(directory), pattern):
+            filepath = '/'.join([directory, filename])
+            self.parsed_files += 1
+            try:
+                object_id = readObjectId(vfs.VFS.open(filepath))
+            except SyntaxError as error:
+                logger.error("Error parsing file {0}: {1}".format(filepath,
+                                                                  error))
+                continue
+            if object_id is not None:
+                objects[filename] = object_id
+        return objects, list(vfs.VFS.listDirectories(directory))
+
+    def getDirectory(self, directory, pattern):
+        """Returns the ids by file name and the subdirectories of a
+        directory, from the index if the directory didn't change"""
+        try:
+            mtime = os.stat(os.path.join(self.source_dir, directory)).st_mtime
+        except OSError:
+            # The directory isn't on disk but in another source of the VFS
+            return self.readDirectory(directory, pattern)
+        entry = self.directories.get(directory)
+        if entry is not None and entry[0] == mtime and entry[1] == pattern:
+            return entry[2], entry[3]
+        objects, subdirs = self.readDirectory(directory, pattern)
+        self.directories[directory] = (mtime, pattern, objects, subdirs)
+        self.changed = True
+        return objects, subdirs
+
+    def locateObjects(self, root, pattern="*.xml"):
+        """Returns the files of the objects in and below a directory
+        @param root: VFS path of the directory
+        @type root: str
+        @param pattern: Pattern of the names of the object files
+        @type pattern: str
+        @return: A dictionary of the VFS paths of the files by the ids of
+        their objects"""
+        object_files = {}
+        visited = set()
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            visited.add(directory)
+            objects, subdirs = self.getDirectory(directory, pattern)
+            for filename, object_id in objects.iteritems():
+                object_files[object_id] = '/'.join([directory, filename])
+            directories.extend('/'.join([directory, subdir])
+                               for subdir in subdirs)
+        # Forget about directories that were removed
+        for directory in self.directories.keys():
+            if ((directory == root or directory.startswith(root + '/')) and
+                directory not in visited):
+                del self.directories[directory]
+                self.changed = True
+        self.writeIndex()
+        return object_files
+
+def locateObjects(root, pattern="*.xml"):
+    """Returns the files of the objects in and below a VFS directory, using
+    an index in the directory of the content cache if there is one
+    @param root: VFS path of the directory
+    @type root: str
+    @param pattern: Pattern of the names of the object files
+    @type pattern: str
+    @return: A dictionary of the VFS paths of the files by the ids of their
+    objects"""
+    cache = contentcache.CACHE
+    if cache is None:
+        object_index = ObjectIndex(os.curdir)
+    else:
+        object_index = ObjectIndex(cache.source_dir,
+                                   os.path.join(cache.cache_dir, INDEX_NAME),
+                                   cache.rebuild)
+    object_files = object_index.locateObjects(root, pattern)
+    logger.info("found {0} object files, read {1}"
+                .format(len(object_files), object_index.parsed_files))
+    return object_files
@@ -0,0 +1,189 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+import math
+
+class ObjectStore(object):
+    """Holds the game objects, indexed by id, by map, by component and by
+    their position on the map.
+
+    Objects in containers are stored with None as their map."""
+
+    def __init__(self, components, cell_size=8):
+        """Constructor
+        @param components: The components objects can have, by name
+        @type components: dict
+        @param cell_size: Size of the cells of the position grid, in layer
+        coordinates
+        @type cell_size: int"""
+        self.components = components
+        self.component_names = dict((id(component), name) for
+                                    name, component in components.iteritems())
+        self.cell_size = cell_size
+        self.clear()
+
+    def clear(self):
+        """Removes all objects"""
+        self.objects = {}
+        self.object_maps = {}
+        self.map_objects = {}
+        self.entity_ids = {}
+        self.component_index = {}
+        self.positions = {}
+        self.grid = {}
+
+    def add(self, object_id, map_id, game_object):
+        """Adds an object
+        @param object_id: ID of the object
+        @type object_id: str
+        @param map_id: ID of the map the object is on, or None
+        @type map_id: str or None
+        @param game_object: The object to add"""
+        self.objects[object_id] = game_object
+        self.object_maps[object_id] = map_id
+        self.map_objects.setdefault(map_id, {})[object_id] = game_object
+        self.entity_ids[game_object] = object_id
+        map_index = self.component_index.setdefault(map_id, {})
+        for name, component in self.components.iteritems():
+            if game_object in component:
+                map_index.setdefault(name, set()).add(object_id)
+
+    def remove(self, object_id):
+        """Removes an object
+        @param object_id: ID of the object
+        @type object_id: str
+        @return: The removed object"""
+        self.removePosition(object_id)
+        game_object = self.objects.pop(object_id)
+        map_id = self.object_maps.pop(object_id)
+        del self.map_objects[map_id][object_id]
+        del self.entity_ids[game_object]
+        for object_ids in self.component_index[map_id].itervalues():
+            object_ids.discard(object_id)
+        return game_object
+
+    def has(self, object_id):
+        """Returns whether an object with the id is stored"""
+        return object_id in self.objects
+
+    def get(self, object_id):
+        """Returns the object with the id, or None"""
+        return self.objects.get(object_id)
+
+    def getMap(self, object_id):
+        """Returns the map the object is on, or None"""
+        return self.object_maps.get(object_id)
+
+    def getObjectsOfMap(self, map_id):
+        """Returns the objects on a map.
+        @return: A dictionary of the objects by id. This is not a copy, so
+        it must not be modified."""
+        return self.map_objects.get(map_id, {})
+
+    def onComponentWrite(self, entity, component, field):
+        """Indexes components that are added to stored objects"""
+        object_id = self.entity_ids.get(entity)
+        name = self.component_names.get(id(component))
+        if object_id is None or name is None:
+            return
+        map_index = self.component_index[self.object_maps[object_id]]
+        map_index.setdefault(name, set()).add(object_id)
+
+    def getIdsWithComponent(self, map_id, name):
+        """Returns the ids of the objects on a map that have a component.
+        @param map_id: ID of the map, or None for objects in containers
+        @type map_id: str or None
+        @param name: Name of the component
+        @type name: str
+        @return: A set of the object ids"""
+        object_ids = self.component_index.get(map_id, {}).get(name)
+        if not object_ids:
+            return set()
+        component = self.components[name]
+        removed = [object_id for object_id in object_ids
+                   if not self.objects[object_id] in component]
+        object_ids.difference_update(removed)
+        return set(object_ids)
+
+    def hasComponent(self, object_id, name):
+        """Returns whether the object has a component.
+        @param object_id: ID of the object
+        @type object_id: str
+        @param name: Name of the component
+        @type name: str"""
+        map_id = self.object_maps.get(object_id)
+        object_ids = self.component_index.get(map_id, {}).get(name, ())
+        return (object_id in object_ids and
+                self.objects[object_id] in self.components[name])
+
+    def getCell(self, coords):
+        """Returns the grid cell that contains the layer coordinates"""
+        return (int(math.floor(coords[0] / float(self.cell_size))),
+                int(math.floor(coords[1] / float(self.cell_size))))
+
+    def setPosition(self, object_id, coords):
+        """Sets the position of an object on its map.
+        @param object_id: ID of the object
+        @type object_id: str
+        @param coords: The x and y layer coordinates of the object
+        @type coords: tuple"""
+        if not object_id in self.objects:
+            return
+        self.removePosition(object_id)
+        map_id = self.object_maps[object_id]
+        coords = (coords[0], coords[1])
+        self.positions[object_id] = coords
+        cells = self.grid.setdefault(map_id, {})
+        cells.setdefault(self.getCell(coords), set()).add(object_id)
+
+    def getPosition(self, object_id):
+        """Returns the last known layer coordinates of an object, or None"""
+        return self.positions.get(object_id)
+
+    def removePosition(self, object_id):
+        """Removes an object from the position grid"""
+        coords = self.positions.pop(object_id, None)
+        if coords is None:
+            return
+        cells = self.grid[self.object_maps.get(object_id)]
+        cell = self.getCell(coords)
+        cells[cell].discard(object_id)
+        if not cells[cell]:
+            del cells[cell]
+
+    def getIdsNear(self, map_id, coords, radius):
+        """Returns the ids of the objects on a map that are within a
+        distance of a position.
+        @param map_id: ID of the map
+        @type map_id: str
+        @param coords: The x and y layer coordinates of the position
+        @type coords: tuple
+        @param radius: The maximum distance
+        @type radius: float
+        @return: A list of the object ids"""
+        cells = self.grid.get(map_id)
+        if not cells:
+            return []
+        min_x, min_y = self.getCell((coords[0] - radius, coords[1] - radius))
+        max_x, max_y = self.getCell((coords[0] + radius, coords[1] + radius))
+        max_distance = radius * radius
+        object_ids = []
+        for cell_x in xrange(min_x, max_x + 1):
+            for cell_y in xrange(min_y, max_y + 1):
+                for object_id in cells.get((cell_x, cell_y), ()):
+                    x, y = self.positions[object_id]
+                    if ((x - coords[0]) ** 2 + (y - coords[1]) ** 2 <=
+                        max_distance):
+                        object_ids.append(object_id)
+        return object_ids
@@ -13,20 +13,26 @@
 #   You should have received a copy of the GNU General Public License
 #   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
 
-import yaml
-
 from parpg.common.utils import locateFiles
-from parpg import vfs
+from parpg import contentcache
 
 class Quest(object):
     """Class that holds the information for a quest"""
     def __init__(self, quest_id, quest_giver_id, quest_name, description,
-                 variables):
+                 variables, on_change=None):
         self.quest_id = quest_id
         self.quest_giver_id = quest_giver_id
         self.quest_name = quest_name
         self.description = description
         self.quest_variables = variables
+        self.default_values = dict((name, data["value"]) 
+                                   for name, data in variables.iteritems())
+        self.on_change = on_change
+
+    def notifyChange(self):
+        """Calls the on_change function, if there is one"""
+        if self.on_change:
+            self.on_change()
     
     def setValue(self, variable_name, value):
         """Set the value of a quest variable
@@ -37,6 +43,7 @@ class Quest(object):
 
         if self.quest_variables.has_key(variable_name):
             self.quest_variables[variable_name]["value"] = value
+            self.notifyChange()
             return True
         else:
             return False
@@ -67,6 +74,7 @@ class Quest(object):
            @return: False when it fails"""
         if self.quest_variables.has_key(variable_name):
             self.quest_variables[variable_name]["value"] += value
+            self.notifyChange()
             return True
         else:
             return False
@@ -79,6 +87,7 @@ class Quest(object):
            @return: False when it failes"""
         if self.quest_variables.has_key(variable_name):
             self.quest_variables[variable_name]["value"] -= value
+            self.notifyChange()
             return True
         else:
             return False
@@ -111,6 +120,7 @@ class Quest(object):
         for variable in self.quest_variables.itervalues():
             if variable.has_key("reset_value"):
                 variable["value"] = variable["reset_value"]
+        self.notifyChange()
 
 class QuestEngine(dict):
     def __init__(self, quest_dir):
@@ -122,6 +132,7 @@ class QuestEngine(dict):
         self.finished_quests = []
         self.failed_quests = []
         self.quest_dir = quest_dir
+        self.on_change = None
 
     def __str__(self):
         return self.quests.__str__()
@@ -140,17 +151,31 @@ class QuestEngine(dict):
 
     def keys(self):
         return self.quests.keys()
+
+    def notifyChange(self):
+        """Calls the on_change function, if there is one"""
+        if self.on_change:
+            self.on_change()
     
-    def readQuests(self):
-        """Reads in the quests in the quest directory"""
-        filepaths = locateFiles("*.yaml", self.quest_dir)
+    def locateQuestFiles(self):
+        """Returns the paths of the quest files in the quest directory"""
+        return locateFiles("*.yaml", self.quest_dir)
+
+    def loadQuestFiles(self, filepaths):
+        """Returns the parsed contents of quest files"""
+        return [contentcache.load_yaml(filepath) for filepath in filepaths]
+
+    def readQuests(self, trees=None):
+        """Reads in the quests in the quest directory
+           @param trees: The already parsed quest files, or None to read
+           the files of the quest directory"""
+        if trees is None:
+            trees = self.loadQuestFiles(self.locateQuestFiles())
         self.quests = {}
         self.active_quests = []
         self.finished_quests = []
         self.failed_quests = []
-        for filepath in filepaths:
-            quest_file = vfs.VFS.open(filepath)
-            tree = yaml.load(quest_file)
+        for tree in trees:
             quest_properties = tree["QUEST_PROPERTIES"]
             variable_defines = tree["DEFINES"]
     
@@ -159,7 +184,9 @@ class QuestEngine(dict):
                                         quest_properties["quest_giver_id"],
                                         quest_properties["quest_name"],
                                         quest_properties["description"],
-                                        variable_defines)
+                                        variable_defines,
+                                        self.notifyChange)
+        self.notifyChange()
 
     def activateQuest(self, quest_id):
         """Add a quest to the quest log
@@ -171,6 +198,7 @@ class QuestEngine(dict):
             and not (quest_id in self.active_quests \
                         or quest_id in self.finished_quests):
             self.active_quests.append(quest_id)
+            self.notifyChange()
             return True
         return False
 
@@ -182,6 +210,7 @@ class QuestEngine(dict):
         if quest_id in self.active_quests:
             self.finished_quests.append(quest_id)
             self.active_quests.remove(quest_id)
+            self.notifyChange()
             return True
         return False
     
@@ -201,6 +230,7 @@ class QuestEngine(dict):
         if quest_id in self.active_quests:
             self.failed_quests.append(quest_id)
             self.active_quests.remove(quest_id)
+            self.notifyChange()
             return True
         return False
             
@@ -234,23 +264,35 @@ class QuestEngine(dict):
         @return: False when it's not in the failed quests log"""
         return quest_id in self.failed_quests
     
-    def getStateForSaving(self):
+    def getStateForSaving(self, only_changed=False):
         """Prepares state for saving
+        @type only_changed: bool
+        @param only_changed: Whether to leave out the quest variables that
+        still have the value of the quest file
         @type state: dictionary
         @param state: State of the object"""
         ret_dict = {}
         variables_dict = ret_dict["Variables"] = {}
         for quest in self.quests.itervalues():
-            quest_dict = variables_dict[quest.quest_id] = {}
+            quest_dict = {}
             for variable, data in quest.quest_variables.iteritems():
+                if (only_changed and 
+                    data["value"] == quest.default_values.get(variable)):
+                    continue
                 quest_dict[variable] = data["value"]
+            if quest_dict or not only_changed:
+                variables_dict[quest.quest_id] = quest_dict
         ret_dict["ActiveQuests"] = self.active_quests
         ret_dict["FinishedQuests"] = self.finished_quests
         ret_dict["FailedQuests"] = self.failed_quests
         return ret_dict
 
     def restoreFromState(self, state):
-        """Restores the state"""
+        """Restores the state. Variables that are not in the state get the
+        value of the quest file."""
+        for quest in self.quests.itervalues():
+            for variable, value in quest.default_values.iteritems():
+                quest.quest_variables[variable]["value"] = value
         variables_dict = state["Variables"]
         for quest_id, variables in variables_dict.iteritems():
             for variable, value in variables.iteritems():
@@ -258,3 +300,4 @@ class QuestEngine(dict):
         self.active_quests = state["ActiveQuests"]
         self.finished_quests = state["FinishedQuests"]
         self.failed_quests = state["FailedQuests"]
+        self.notifyChange()
@@ -0,0 +1,644 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Binary format of the saved games.
+
+A save file starts with a header and consists of length-prefixed records,
+each holding one encoded value. The records are grouped in sections: a
+short description of the save for the load dialog, the game state with one
+record per quest, one section per map with one record per agent, and the
+items. An index of the sections at the end of the file
+allows reading the sections separately, so the current map can be restored
+without the others. The index also lists the names of the agents of each
+map, so that the names in use are known without reading the maps.
+
+The records are written one at a time, so saving doesn't need more memory
+than the largest agent. Each section can be compressed with zlib, which the
+header records.
+
+Delta saves only contain the maps whose agents differ from the original
+content, and only the changes of those agents, as returned by delta.diff.
+The header records this too. Like the YAML saves, the values may only contain
+the basic types: None, bool, int, long, float, str, unicode, tuple, list,
+dict, set and frozenset. Each value is encoded as a tag byte followed by its
+data, and decoding only creates those types, so unlike marshal a damaged or
+hostile save can't do more than fail to load."""
+
+import struct
+import zlib
+from copy import deepcopy
+from cStringIO import StringIO
+
+from parpg import delta
+
+MAGIC = "PARPGSAV"
+INDEX_MAGIC = "PARPGIDX"
+# Increase when the layout of the save files changes
+FORMAT_VERSION = 4
+COMPRESSION_LEVEL = 6
+
+# Flags of the header
+COMPRESSED = 1
+DELTA = 2
+
+HEADER = struct.Struct("<8sHH")
+RECORD_HEADER = struct.Struct("<cI")
+TRAILER = struct.Struct("<Q8s")
+INT = struct.Struct("<q")
+FLOAT = struct.Struct("<d")
+LENGTH = struct.Struct("<I")
+
+# Tags of the encoded values
+NONE_TAG = "N"
+TRUE_TAG = "T"
+FALSE_TAG = "F"
+INT_TAG = "i"
+LONG_TAG = "l"
+FLOAT_TAG = "f"
+STR_TAG = "s"
+UNICODE_TAG = "u"
+TUPLE_TAG = "("
+LIST_TAG = "["
+DICT_TAG = "{"
+SET_TAG = "<"
+FROZENSET_TAG = ">"
+
+# The types of the containers other than dict by their tags
+CONTAINERS = {TUPLE_TAG: tuple, LIST_TAG: list, SET_TAG: set,
+              FROZENSET_TAG: frozenset}
+
+# Deepest nesting of containers in a value
+MAX_DEPTH = 64
+# Range of the integers that are not encoded as long
+MIN_INT = -2 ** 63
+MAX_INT = 2 ** 63 - 1
+
+pack_length = LENGTH.pack
+pack_int = INT.pack
+pack_float = FLOAT.pack
+unpack_length = LENGTH.unpack_from
+unpack_int = INT.unpack_from
+unpack_float = FLOAT.unpack_from
+
+META_RECORD = "D"
+STATE_RECORD = "S"
+QUEST_RECORD = "Q"
+MAP_RECORD = "M"
+AGENT_RECORD = "A"
+ITEM_RECORD = "I"
+INDEX_RECORD = "X"
+
+META_SECTION = "meta"
+STATE_SECTION = "state"
+ITEMS_SECTION = "items"
+MAP_SECTION = "map"
+
+class SaveFormatError(Exception):
+    """Error that gets raised when a save file is damaged or in an
+    unsupported format"""
+
+def encodeValue(value, write, depth=0):
+    """Encodes a value made of the basic types of the saves
+    @param value: The value to encode
+    @param write: Function that is called with the chunks of the encoding
+    @type write: callable
+    @param depth: Number of containers that contain the value
+    @type depth: int
+    @raise SaveFormatError: The value contains another type or is nested
+    too deeply"""
+    value_type = type(value)
+    if value_type is str:
+        write(STR_TAG + pack_length(len(value)) + value)
+    elif value_type is dict or isinstance(value, dict):
+        if depth >= MAX_DEPTH:
+            raise SaveFormatError("the value is nested too deeply")
+        write(DICT_TAG + pack_length(len(value)))
+        depth += 1
+        for key, item in value.iteritems():
+            encodeValue(key, write, depth)
+            encodeValue(item, write, depth)
+    elif value is None:
+        write(NONE_TAG)
+    elif value is True:
+        write(TRUE_TAG)
+    elif value is False:
+        write(FALSE_TAG)
+    elif value_type is int or isinstance(value, (int, long)):
+        if MIN_INT <= value <= MAX_INT:
+            write(INT_TAG + pack_int(value))
+        else:
+            data = str(value)
+            write(LONG_TAG + pack_length(len(data)) + data)
+    elif isinstance(value, float):
+        write(FLOAT_TAG + pack_float(value))
+    elif isinstance(value, unicode):
+        data = value.encode("utf-8")
+        write(UNICODE_TAG + pack_length(len(data)) + data)
+    else:
+        if isinstance(value, tuple):
+            tag = TUPLE_TAG
+        elif isinstance(value, list):
+            tag = LIST_TAG
+        elif isinstance(value, frozenset):
+            tag = FROZENSET_TAG
+        elif isinstance(value, set):
+            tag = SET_TAG
+        else:
+            raise SaveFormatError("values of type {0} can't be saved"
+                                  .format(type(value).__name__))
+        if depth >= MAX_DEPTH:
+            raise SaveFormatError("the value is nested too deeply")
+        write(tag + pack_length(len(value)))
+        depth += 1
+        for item in value:
+            encodeValue(item, write, depth)
+
+def dumpValue(value):
+    """Returns the encoding of a value made of the basic types of the saves
+    @raise SaveFormatError: The value can't be encoded"""
+    chunks = []
+    encodeValue(value, chunks.append)
+    return "".join(chunks)
+
+def decodeValue(data, offset, depth=0):
+    """Decodes a value written by encodeValue. Only the basic types of the
+    saves are created.
+    @param data: The encoded data
+    @type data: str
+    @param offset: Where the value starts in the data
+    @type offset: int
+    @param depth: Number of containers that contain the value
+    @type depth: int
+    @return: The value and the offset after it
+    @raise SaveFormatError: The data is not a valid encoding"""
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == STR_TAG or tag == UNICODE_TAG or tag == LONG_TAG:
+        try:
+            length = unpack_length(data, offset)[0]
+        except struct.error:
+            raise SaveFormatError("truncated value")
+        offset += LENGTH.size
+        end = offset + length
+        if end > len(data):
+            raise SaveFormatError("truncated value")
+        value = data[offset:end]
+        if tag == UNICODE_TAG:
+            try:
+                value = value.decode("utf-8")
+            except UnicodeDecodeError:
+                raise SaveFormatError("invalid unicode string")
+        elif tag == LONG_TAG:
+            try:
+                value = long(value)
+            except ValueError:
+                raise SaveFormatError("invalid long integer")
+        return value, end
+    if tag == DICT_TAG:
+        if depth >= MAX_DEPTH:
+            raise SaveFormatError("the value is nested too deeply")
+        try:
+            length = unpack_length(data, offset)[0]
+        except struct.error:
+            raise SaveFormatError("truncated value")
+        offset += LENGTH.size
+        depth += 1
+        value = {}
+        for index in xrange(length):
+            key, offset = decodeValue(data, offset, depth)
+            item, offset = decodeValue(data, offset, depth)
+            try:
+                value[key] = item
+            except TypeError:
+                raise SaveFormatError("invalid dictionary key")
+        return value, offset
+    if tag == INT_TAG:
+        try:
+            return unpack_int(data, offset)[0], offset + INT.size
+        except struct.error:
+            raise SaveFormatError("truncated value")
+    if tag == FLOAT_TAG:
+        try:
+            return unpack_float(data, offset)[0], offset + FLOAT.size
+        except struct.error:
+            raise SaveFormatError("truncated value")
+    if tag == NONE_TAG:
+        return None, offset
+    if tag == TRUE_TAG:
+        return True, offset
+    if tag == FALSE_TAG:
+        return False, offset
+    container = CONTAINERS.get(tag)
+    if container is None:
+        if not tag:
+            raise SaveFormatError("truncated value")
+        raise SaveFormatError("unknown value tag {0!r}".format(tag))
+    if depth >= MAX_DEPTH:
+        raise SaveFormatError("the value is nested too deeply")
+    try:
+        length = unpack_length(data, offset)[0]
+    except struct.error:
+        raise SaveFormatError("truncated value")
+    offset += LENGTH.size
+    depth += 1
+    items = []
+    for index in xrange(length):
+        item, offset = decodeValue(data, offset, depth)
+        items.append(item)
+    try:
+        return container(items), offset
+    except TypeError:
+        raise SaveFormatError("invalid set item")
+
+def loadValue(data):
+    """Returns the value encoded in a string by dumpValue
+    @raise SaveFormatError: The data is not a valid encoding"""
+    value, offset = decodeValue(data, 0)
+    if offset != len(data):
+        raise SaveFormatError("data after the value")
+    return value
+
+def isSaveFile(stream):
+    """Checks whether a stream contains a binary save, and not for example
+    a YAML save
+    @param stream: The stream to check, at its start
+    @type stream: file
+    @return: True if the stream starts with the header of the binary
+    format"""
+    start = stream.tell()
+    magic = stream.read(len(MAGIC))
+    stream.seek(start)
+    return magic == MAGIC
+
+def iterMapChanges(maps, pristine_maps):
+    """Yields the names, the changes and the agent names of the maps whose
+    agents differ from the original ones
+    @param maps: The names and the saved values of the agents of each map
+    @type maps: iterable of tuples
+    @param pristine_maps: The original agents of the maps by map name
+    @type pristine_maps: dict"""
+    for map_name, agents in maps:
+        changes = delta.diff(pristine_maps.get(map_name, {}), agents)
+        if changes:
+            yield map_name, changes, agents.keys()
+
+def writeSave(stream, game_state, maps, items, compress=False, delta=False,
+              metadata=None):
+    """Writes a whole saved game
+    @param stream: The binary stream to write to
+    @type stream: file
+    @param game_state: The state returned by GameState.getStateForSaving
+    @type game_state: dict
+    @param maps: The names and the saved values of the agents of each map,
+    or the names, changes and agent names returned by iterMapChanges
+    @type maps: iterable of tuples
+    @param items: The saved values of the items by their ids
+    @type items: dict
+    @param compress: Whether to compress the sections
+    @type compress: bool
+    @param delta: Whether maps contains the changes of the agents
+    @type delta: bool
+    @param metadata: The description of the save, or None
+    @type metadata: dict"""
+    writer = SaveWriter(stream, compress, delta)
+    if metadata is not None:
+        writer.writeMetadata(metadata)
+    writer.writeGameState(game_state)
+    for saved_map in maps:
+        writer.writeMap(*saved_map)
+    writer.writeItems(items)
+    writer.close()
+
+class SaveWriter(object):
+    """Writes a saved game to a stream, record by record"""
+
+    def __init__(self, stream, compress=False, delta=False):
+        """Constructor
+        @param stream: The binary stream to write to
+        @type stream: file
+        @param compress: Whether to compress the sections
+        @type compress: bool
+        @param delta: Whether the maps are written as changes
+        @type delta: bool"""
+        self.stream = stream
+        self.compress = compress
+        self.compressor = None
+        self.index = {}
+        self.section = None
+        flags = (COMPRESSED if compress else 0) | (DELTA if delta else 0)
+        self.stream.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags))
+        self.offset = HEADER.size
+
+    def write(self, data):
+        """Writes data to the current section"""
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self.stream.write(data)
+        self.offset += len(data)
+
+    def writeRecord(self, record_type, value):
+        """Writes a record to the current section"""
+        try:
+            payload = dumpValue(value)
+        except SaveFormatError, error:
+            raise SaveFormatError("can't save {0}: {1}".format(record_type,
+                                                               error))
+        self.write(RECORD_HEADER.pack(record_type, len(payload)))
+        self.write(payload)
+        if self.section is not None:
+            self.index[self.section][1] += 1
+
+    def beginSection(self, section):
+        """Starts a section, which the following records belong to"""
+        self.endSection()
+        self.section = section
+        self.index[section] = [self.offset, 0, 0, ()]
+        if self.compress:
+            self.compressor = zlib.compressobj(COMPRESSION_LEVEL)
+
+    def endSection(self):
+        """Ends the current section"""
+        if self.compressor is not None:
+            data = self.compressor.flush()
+            self.compressor = None
+            self.stream.write(data)
+            self.offset += len(data)
+        if self.section is not None:
+            location = self.index[self.section]
+            location[2] = self.offset - location[0]
+            self.section = None
+
+    def writeMetadata(self, metadata):
+        """Writes the description of the save that the load dialog shows"""
+        self.beginSection(META_SECTION)
+        self.writeRecord(META_RECORD, metadata)
+
+    def writeGameState(self, state):
+        """Writes the state returned by GameState.getStateForSaving"""
+        state = dict(state)
+        quests = dict(state.pop("Quests"))
+        variables = quests.pop("Variables", {})
+        self.beginSection(STATE_SECTION)
+        self.writeRecord(STATE_RECORD, (state, quests))
+        for quest_id, quest_variables in variables.iteritems():
+            self.writeRecord(QUEST_RECORD, (quest_id, quest_variables))
+
+    def writeMap(self, map_name, agents, agent_names=None):
+        """Writes the agents of a map
+        @param map_name: Name of the map
+        @type map_name: str
+        @param agents: The saved values of the agents by their names, or
+        their changes in delta saves
+        @type agents: dict
+        @param agent_names: Names of the agents of the map, by default the
+        keys of agents
+        @type agent_names: iterable"""
+        if agent_names is None:
+            agent_names = agents.keys()
+        self.beginSection((MAP_SECTION, map_name))
+        self.index[self.section][3] = tuple(agent_names)
+        self.writeRecord(MAP_RECORD, map_name)
+        for agent_name, agent_values in agents.iteritems():
+            self.writeRecord(AGENT_RECORD, (agent_name, agent_values))
+
+    def writeItems(self, items):
+        """Writes the items that are in containers
+        @param items: The saved values of the items by their ids
+        @type items: dict"""
+        self.beginSection(ITEMS_SECTION)
+        for identifier, item_values in items.iteritems():
+            self.writeRecord(ITEM_RECORD, (identifier, item_values))
+
+    def close(self):
+        """Writes the index of the sections. The stream is not closed."""
+        self.endSection()
+        index_offset = self.offset
+        index = dict((section, tuple(location))
+                     for section, location in self.index.iteritems())
+        self.writeRecord(INDEX_RECORD, index)
+        self.stream.write(TRAILER.pack(index_offset, INDEX_MAGIC))
+
+class SaveReader(object):
+    """Reads the sections of a saved game from a seekable stream"""
+
+    def __init__(self, stream):
+        """Constructor
+        @param stream: The binary stream to read from
+        @type stream: file"""
+        self.stream = stream
+        try:
+            magic, version, flags = HEADER.unpack(stream.read(HEADER.size))
+            stream.seek(-TRAILER.size, 2)
+            index_offset, index_magic = TRAILER.unpack(
+                stream.read(TRAILER.size))
+        except (struct.error, IOError):
+            raise SaveFormatError("the save file is incomplete")
+        if magic != MAGIC:
+            raise SaveFormatError("not a save file")
+        if version != FORMAT_VERSION:
+            raise SaveFormatError("unsupported save format version {0}"
+                                  .format(version))
+        if index_magic != INDEX_MAGIC:
+            raise SaveFormatError("the save file is incomplete")
+        self.compressed = bool(flags & COMPRESSED)
+        self.delta = bool(flags & DELTA)
+        stream.seek(index_offset)
+        self.index = self.readRecord(stream, INDEX_RECORD)
+        if not isinstance(self.index, dict):
+            raise SaveFormatError("damaged index")
+        for location in self.index.itervalues():
+            if not (isinstance(location, tuple) and len(location) == 4):
+                raise SaveFormatError("damaged index")
+
+    def readRecord(self, stream, *record_types):
+        """Reads the value of the next record in a stream, which has to be of
+        one of the given types
+        @return: The value if one record type was given, otherwise a tuple
+        of the record type and the value"""
+        try:
+            record_type, length = RECORD_HEADER.unpack(
+                stream.read(RECORD_HEADER.size))
+        except struct.error:
+            raise SaveFormatError("damaged record")
+        payload = stream.read(length)
+        if len(payload) != length:
+            raise SaveFormatError("truncated record")
+        value = loadValue(payload)
+        if record_type not in record_types:
+            raise SaveFormatError("unexpected {0} record"
+                                  .format(record_type))
+        if len(record_types) == 1:
+            return value
+        return record_type, value
+
+    def iterSection(self, section, *record_types):
+        """Yields the values of the records of a section"""
+        if section not in self.index:
+            return
+        offset, count, length, names = self.index[section]
+        self.stream.seek(offset)
+        stream = self.stream
+        if self.compressed:
+            try:
+                stream = StringIO(zlib.decompress(self.stream.read(length)))
+            except zlib.error:
+                raise SaveFormatError("damaged section")
+        for record in xrange(count):
+            yield self.readRecord(stream, *record_types)
+
+    def readMetadata(self):
+        """Returns the description of the save, or None if it has none"""
+        for metadata in self.iterSection(META_SECTION, META_RECORD):
+            return metadata
+        return None
+
+    def readGameState(self):
+        """Returns the state for GameState.restoreFromState"""
+        if STATE_SECTION not in self.index:
+            raise SaveFormatError("the game state is missing")
+        records = self.iterSection(STATE_SECTION, STATE_RECORD,
+                                   QUEST_RECORD)
+        record_type, (state, quests) = records.next()
+        variables = quests["Variables"] = {}
+        for record_type, (quest_id, quest_variables) in records:
+            variables[quest_id] = quest_variables
+        state["Quests"] = quests
+        return state
+
+    def getMapNames(self):
+        """Returns the names of the maps whose agents were saved"""
+        return [section[1] for section in self.index
+                if isinstance(section, tuple) and section[0] == MAP_SECTION]
+
+    def getAgentNames(self, map_name):
+        """Returns the names of the agents of a map, without reading it"""
+        location = self.index.get((MAP_SECTION, map_name))
+        if location is None:
+            return ()
+        return location[3]
+
+    def readMap(self, map_name):
+        """Returns the saved values of the agents of a map by their names,
+        or the changes of the agents in delta saves"""
+        agents = {}
+        records = self.iterSection((MAP_SECTION, map_name), MAP_RECORD,
+                                   AGENT_RECORD)
+        for record_type, value in records:
+            if record_type == AGENT_RECORD:
+                agents[value[0]] = value[1]
+        return agents
+
+    def readItems(self):
+        """Returns the saved values of the items by their ids"""
+        return dict(self.iterSection(ITEMS_SECTION, ITEM_RECORD))
+
+    def readAll(self):
+        """Returns the whole saved game, as it is stored in a YAML save"""
+        agents = dict((map_name, self.readMap(map_name))
+                      for map_name in self.getMapNames())
+        save_state = {"Agents": agents,
+                      "Items": self.readItems(),
+                      "GameState": self.readGameState()}
+        if self.delta:
+            save_state["Delta"] = True
+        return save_state
+
+class SavedMaps(object):
+    """The agents of the maps of a loaded game that weren't added to the
+    game yet. The maps of a binary save are decoded when they are first
+    needed. In a delta save the changes are applied to the original agents
+    of the maps, and the maps without changes are not saved."""
+
+    def __init__(self, get_pristine_agents, maps=None, reader=None,
+                 is_delta=False):
+        """Constructor
+        @param get_pristine_agents: Function that returns the original
+        agents of the map with the given name, which must not be modified
+        @type get_pristine_agents: callable
+        @param maps: The saved values of the agents of each map by the map
+        names, or their changes in delta saves
+        @type maps: dict
+        @param reader: The reader of a binary save to decode the maps from
+        @type reader: L{SaveReader}
+        @param is_delta: Whether the maps contain the changes of the agents
+        @type is_delta: bool"""
+        self.get_pristine_agents = get_pristine_agents
+        self.delta = is_delta
+        self.reader = reader
+        # The decoded agents by map name
+        self.agents = {}
+        # The saved values or changes by map name that weren't decoded yet,
+        # None for the maps that are still in the reader
+        self.pending = dict(maps or {})
+        if reader is not None:
+            self.pending.update((map_name, None)
+                                for map_name in reader.getMapNames())
+
+    def isSaved(self, map_name):
+        """Returns whether the agents of a map were saved and not added to
+        the game yet"""
+        return map_name in self.agents or map_name in self.pending
+
+    def read(self, map_name):
+        """Decodes the agents of a map, unless that was done already"""
+        if map_name not in self.pending:
+            return
+        agents = self.pending.pop(map_name)
+        if agents is None:
+            agents = self.reader.readMap(map_name)
+        if self.delta:
+            agents = delta.apply(deepcopy(self.get_pristine_agents(map_name)),
+                                 agents)
+        self.agents[map_name] = agents
+        if not self.pending:
+            self.reader = None
+
+    def readAll(self):
+        """Decodes the agents of all maps that weren't decoded yet"""
+        for map_name in self.pending.keys():
+            self.read(map_name)
+
+    def isNameUsed(self, agent_name):
+        """Returns whether an agent of a saved map has the given name. The
+        maps in the reader are not decoded for that."""
+        for agents in self.agents.itervalues():
+            if agent_name in agents:
+                return True
+        for map_name, agents in self.pending.items():
+            if agents is None:
+                if agent_name in self.reader.getAgentNames(map_name):
+                    return True
+                continue
+            self.read(map_name)
+            if agent_name in self.agents[map_name]:
+                return True
+        return False
+
+    def pop(self, map_name):
+        """Returns the saved agents of a map by their names and removes
+        them, or returns None if the map wasn't saved"""
+        self.read(map_name)
+        return self.agents.pop(map_name, None)
+
+    def restore(self, map_name):
+        """Returns the agents of a map that has to be added when the game is
+        loaded and removes them. The maps of a delta save without changes
+        get their original agents.
+        @return: The agents by their names, or None if the map wasn't
+        saved"""
+        agents = self.pop(map_name)
+        if agents is None and self.delta:
+            agents = deepcopy(self.get_pristine_agents(map_name))
+        return agents
+
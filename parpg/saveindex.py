@@ -0,0 +1,142 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Index of the descriptions of the saved games in a directory.
+
+The load dialog shows the map, the character, the play time and the date of
+each save. These are stored in a small file next to the saves, so the dialog
+doesn't have to open the saves. Saves that were written or changed without
+updating the index, like the autosaves, are detected by their size and
+modification time, and only the description section of those is read."""
+
+import os
+import marshal
+import logging
+import time
+
+from parpg import savegame
+
+logger = logging.getLogger('saveindex')
+
+# Increase when the layout of the index changes
+INDEX_VERSION = 1
+
+class SaveIndex(object):
+    """The descriptions of the saves in a directory"""
+
+    INDEX_NAME = "saves.idx"
+
+    def __init__(self, save_dir):
+        """Constructor
+        @param save_dir: The directory of the saves
+        @type save_dir: str"""
+        self.save_dir = save_dir
+        self.index_path = os.path.join(save_dir, self.INDEX_NAME)
+        self.entries = self.readIndex()
+        self.changed = False
+
+    def readIndex(self):
+        """Returns the entries of the index file, or an empty dictionary
+        if it doesn't exist or can't be read"""
+        try:
+            with open(self.index_path, "rb") as index_file:
+                version, entries = marshal.load(index_file)
+        except (IOError, EOFError, ValueError, TypeError):
+            return {}
+        if version != INDEX_VERSION or not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def getFileStamp(self, filename):
+        """Returns the size and the modification time of a save, or None if
+        it doesn't exist"""
+        try:
+            stat = os.stat(os.path.join(self.save_dir, filename))
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def getMetadata(self, filename):
+        """Returns the description of a save, from the index if it is up to
+        date, otherwise from the save
+        @param filename: Name of the save in the directory
+        @type filename: str
+        @return: The description, or None if the save has none"""
+        stamp = self.getFileStamp(filename)
+        if stamp is None:
+            return None
+        entry = self.entries.get(filename)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        metadata = self.readMetadata(filename)
+        self.entries[filename] = (stamp, metadata)
+        self.changed = True
+        return metadata
+
+    def readMetadata(self, filename):
+        """Reads the description section of a save"""
+        try:
+            with open(os.path.join(self.save_dir, filename), "rb") as stream:
+                if not savegame.isSaveFile(stream):
+                    return None
+                return savegame.SaveReader(stream).readMetadata()
+        except (IOError, savegame.SaveFormatError), error:
+            logger.warning("can't read {0}: {1}".format(filename, error))
+            return None
+
+    def update(self, filename, metadata):
+        """Records the description of a save that was just written
+        @param filename: Name of the save in the directory
+        @type filename: str
+        @param metadata: The description that was written to the save
+        @type metadata: dict"""
+        stamp = self.getFileStamp(filename)
+        if stamp is not None:
+            self.entries[filename] = (stamp, metadata)
+            self.changed = True
+
+    def write(self):
+        """Writes the index file if it changed, leaving out saves that
+        don't exist anymore"""
+        if not self.changed:
+            return
+        entries = dict((filename, entry)
+                       for filename, entry in self.entries.iteritems()
+                       if self.getFileStamp(filename) is not None)
+        temp_path = self.index_path + ".tmp"
+        try:
+            with open(temp_path, "wb") as index_file:
+                marshal.dump((INDEX_VERSION, entries), index_file)
+            if os.name == "nt" and os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            os.rename(temp_path, self.index_path)
+        except (IOError, OSError), error:
+            logger.warning("can't write the save index: {0}".format(error))
+            return
+        self.changed = False
+
+def formatMetadata(metadata):
+    """Returns the description of a save as it is shown in the load dialog
+    @param metadata: The description, or None
+    @type metadata: dict
+    @return: A unicode string, empty if there is no description"""
+    if not metadata:
+        return u""
+    minutes = int(metadata.get("PlayTime", 0.0)) // 60
+    parts = [metadata.get("Map"), metadata.get("Character"),
+             u"{0}:{1:02d}".format(minutes // 60, minutes % 60)]
+    if metadata.has_key("SavedAt"):
+        parts.append(time.strftime("%Y-%m-%d %H:%M",
+                                   time.localtime(metadata["SavedAt"])))
+    return u", ".join(unicode(part) for part in parts if part)
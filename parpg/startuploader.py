@@ -0,0 +1,264 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Loads the game data at startup in stages, running the independent ones
+in a pool of worker threads.
+
+Each stage has a load function, which reads and parses data, and a merge
+function, which stores the result in the game. The load functions run in
+the workers, the merge functions always on the main thread. A stage is only
+loaded after the stages it requires were merged, and its load function gets
+their results. Stages that use the FIFE VFS must not be threaded, since the
+VFS may only be used from the main thread.
+
+Essential stages have to be merged before the main menu is shown, the
+others may be merged while the main menu is already running. Non-essential
+stages that aren't threaded are deferred until the essential stages are
+merged and then loaded one per call of pump, so that they don't delay the
+main menu."""
+
+import logging
+import time
+from Queue import Queue, Empty
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+logger = logging.getLogger('startuploader')
+
+class Stage(object):
+    """A stage of the startup"""
+
+    def __init__(self, name, load, merge, requires, essential, threaded):
+        self.name = name
+        self.load = load
+        self.merge = merge
+        self.requires = tuple(requires)
+        self.essential = essential
+        self.threaded = threaded
+        self.result = None
+        self.error = None
+        self.submitted = False
+        self.merged = False
+        self.ready_time = None
+        self.load_start = None
+        self.load_time = 0.0
+        self.merge_time = 0.0
+
+    def run(self, *required_results):
+        """Runs the load function, catching its errors"""
+        self.load_start = time.time()
+        try:
+            self.result = self.load(*required_results)
+        except Exception, error:
+            self.error = error
+            logger.exception("startup stage {0} failed".format(self.name))
+        self.load_time = time.time() - self.load_start
+
+class StartupLoader(object):
+    """Runs the stages of the startup in the order of their dependencies"""
+
+    def __init__(self, worker_count=2):
+        """Constructor
+        @param worker_count: Number of worker threads, 0 to run all stages
+        on the main thread
+        @type worker_count: int"""
+        self.worker_count = worker_count
+        self.stages = []
+        self.stages_by_name = {}
+        self.pool = None
+        self.loaded = Queue()
+        self.deferred = deque()
+        self.start_time = None
+        self.end_time = None
+
+    def addStage(self, name, load, merge=None, requires=(), essential=True,
+                 threaded=True):
+        """Adds a stage
+        @param name: Unique name of the stage
+        @type name: str
+        @param load: Function that loads the data of the stage. It gets the
+        results of the required stages as arguments.
+        @type load: callable
+        @param merge: Function that gets called on the main thread with the
+        result of load, or None
+        @type merge: callable
+        @param requires: Names of the stages that have to be merged before
+        this one is loaded
+        @type requires: iterable
+        @param essential: Whether the stage has to be merged before the
+        main menu is shown
+        @type essential: bool
+        @param threaded: Whether load may run in a worker thread
+        @type threaded: bool"""
+        if name in self.stages_by_name:
+            raise ValueError("duplicate startup stage {0}".format(name))
+        stage = Stage(name, load, merge, requires, essential, threaded)
+        self.stages.append(stage)
+        self.stages_by_name[name] = stage
+
+    def checkGraph(self):
+        """Raises a ValueError if a stage requires an unknown stage or if
+        the stages require each other"""
+        for stage in self.stages:
+            for name in stage.requires:
+                if name not in self.stages_by_name:
+                    raise ValueError("startup stage {0} requires unknown "
+                                     "stage {1}".format(stage.name, name))
+        done = set()
+        remaining = list(self.stages)
+        while remaining:
+            ready = [stage for stage in remaining
+                     if all(name in done for name in stage.requires)]
+            if not ready:
+                raise ValueError("startup stages require each other: {0}"
+                                 .format(", ".join(stage.name
+                                                   for stage in remaining)))
+            for stage in ready:
+                done.add(stage.name)
+                remaining.remove(stage)
+        for stage in self.stages:
+            if stage.essential:
+                for name in stage.requires:
+                    if not self.stages_by_name[name].essential:
+                        raise ValueError("essential startup stage {0} "
+                                         "requires {1}".format(stage.name,
+                                                               name))
+
+    def start(self):
+        """Starts loading the stages that don't require others"""
+        self.checkGraph()
+        self.start_time = time.time()
+        if self.worker_count > 0:
+            self.pool = ThreadPool(self.worker_count)
+        self.submitReadyStages()
+
+    def submitReadyStages(self):
+        """Starts loading the stages whose required stages were merged.
+        Essential stages that aren't threaded are loaded right away, other
+        stages that aren't threaded are deferred."""
+        for stage in self.stages:
+            if stage.submitted:
+                continue
+            if not all(self.stages_by_name[name].merged
+                       for name in stage.requires):
+                continue
+            stage.submitted = True
+            stage.ready_time = time.time()
+            required_results = [self.stages_by_name[name].result
+                                for name in stage.requires]
+            if stage.threaded and self.pool is not None:
+                self.pool.apply_async(self.runStage,
+                                      [stage] + required_results)
+            elif not stage.essential:
+                self.deferred.append((stage, required_results))
+            else:
+                self.runStage(stage, *required_results)
+
+    def runStage(self, stage, *required_results):
+        """Loads a stage and queues it for merging"""
+        stage.run(*required_results)
+        self.loaded.put(stage)
+
+    def runDeferredStage(self):
+        """Loads the next deferred stage if the essential stages were
+        merged
+        @return: Whether a stage was loaded"""
+        if not self.deferred or not self.isFinished(essential_only=True):
+            return False
+        stage, required_results = self.deferred.popleft()
+        self.runStage(stage, *required_results)
+        return True
+
+    def mergeStage(self, stage):
+        """Merges a loaded stage on the main thread"""
+        start_time = time.time()
+        if stage.error is None and stage.merge is not None:
+            stage.merge(stage.result)
+        stage.merge_time = time.time() - start_time
+        stage.merged = True
+        if self.isFinished():
+            self.end_time = time.time()
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
+            self.logTimings()
+
+    def isFinished(self, essential_only=False):
+        """Returns whether all stages, or all essential stages, were
+        merged"""
+        return all(stage.merged for stage in self.stages
+                   if stage.essential or not essential_only)
+
+    def pump(self):
+        """Merges the stages that were loaded since the last call, without
+        waiting, and loads one deferred stage, to be called every frame
+        until all stages are finished
+        @return: Whether all stages are finished"""
+        self.mergeLoadedStages()
+        if self.runDeferredStage():
+            self.mergeLoadedStages()
+        return self.isFinished()
+
+    def mergeLoadedStages(self):
+        """Merges the stages that were loaded, without waiting"""
+        while True:
+            try:
+                stage = self.loaded.get_nowait()
+            except Empty:
+                break
+            self.mergeStage(stage)
+            self.submitReadyStages()
+
+    def finish(self, essential_only=False):
+        """Waits until all stages, or all essential stages, are merged
+        @param essential_only: Whether to only wait for the essential
+        stages
+        @type essential_only: bool"""
+        while not self.isFinished(essential_only):
+            if not essential_only:
+                self.runDeferredStage()
+            self.mergeStage(self.loaded.get())
+            self.submitReadyStages()
+        failed = [stage.name for stage in self.stages
+                  if stage.merged and stage.error is not None and
+                  (stage.essential or not essential_only)]
+        if failed:
+            raise RuntimeError("startup stages failed: {0}"
+                               .format(", ".join(failed)))
+
+    def getTimings(self):
+        """Returns a row for each stage with its name, when it started to
+        load and how long it waited for a worker, loaded and merged, all in
+        milliseconds"""
+        rows = []
+        for stage in self.stages:
+            if stage.load_start is None:
+                continue
+            rows.append((stage.name,
+                         (stage.ready_time - self.start_time) * 1000,
+                         (stage.load_start - stage.ready_time) * 1000,
+                         stage.load_time * 1000,
+                         stage.merge_time * 1000))
+        return rows
+
+    def logTimings(self):
+        """Logs the timings of the stages as a table"""
+        lines = ["{0:<16}{1:>10}{2:>10}{3:>10}{4:>10}".format(
+            "stage", "start ms", "queue ms", "load ms", "merge ms")]
+        for row in self.getTimings():
+            lines.append("{0:<16}{1:>10.1f}{2:>10.1f}{3:>10.1f}{4:>10.1f}"
+                         .format(*row))
+        lines.append("total {0:.1f} ms with {1} workers".format(
+            (self.end_time - self.start_time) * 1000, self.worker_count))
+        logger.info("startup stages:\n" + "\n".join(lines))
@@ -11,88 +11,127 @@
 #   You should have received a copy of the GNU General Public License
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from collections import deque
-from copy import deepcopy
+from types import CodeType
+from heapq import heappush, heappop
+import time
 
 from bGrease import System
 
 class Script(object):
     """Script object"""
 
-    def __init__(self, actions, system):
-        """Constructor"""
-        assert(isinstance(actions, deque))
-        self.actions = actions
+    def __init__(self, program, system, name=None):
+        """Constructor
+        @param program: The steps of the script, as tuples of the action 
+        class, the compiled action arguments, the time to wait after the 
+        action, and optionally the command name and compiled command 
+        arguments.
+        @type program: tuple
+        """
+        assert(isinstance(program, tuple))
+        self.program = program
         assert(isinstance(system, ScriptingSystem))
         self.system = system
+        self.name = name
+        self.run_count = 0
+        self.run_time = 0.0
+        self.max_run_time = 0.0
         self.reset()
 
     def reset(self):
         """Resets the state of the script"""
-        self.running_actions = deepcopy(self.actions)
+        self.pc = 0
         self.running = False
         self.finished = False
-        self.time = 0
         self.wait = 0
         self.cur_action = None
     
-    def update(self, time):
-        """Advance the script"""
-        if not self.running:
+    @property
+    def blocked(self):
+        """Whether the script waits for its current action to be executed"""
+        return bool(self.cur_action and not self.cur_action.executed)
+    
+    def update(self):
+        """Advance the script by running its next action"""
+        if not self.running or self.blocked:
             return
-        if self.cur_action and not self.cur_action.executed:
+        if self.pc >= len(self.program):
+            self.finished = True
+            self.running = False
             return
-        self.time += time
-        if self.wait <= self.time:
-            self.time = 0		    
-            try:
-                globals, locals = self.system.game_state.getGameEnvironment()
-                action_data = self.running_actions.popleft()
-                action = self.system.actions[action_data[0]]
-                action_params = eval(
-                                     action_data[1], 
-                                     globals, locals
-                                     ) 
-                if not (isinstance(action_params, list) 
-                        or isinstance(action_params, tuple)):
-                    action_params = [action_params]
-                self.cur_action = action(self.system.world, *action_params)
-                self.wait = action_data[2]
-                if len(action_data) >= 4:
-                    vals = (
-                        eval(action_data[4], globals, locals) 
-                        if len(action_data) > 4
-                        else ()
-                    )
-                    command = action_data[3]
-                    self.system.commands[command](
-                        *vals, 
-                        action=self.cur_action
-                    )
-                else:
-                    self.cur_action.execute()
-            except IndexError:
-                self.finished = True
-                self.running = False
+        start_time = time.time()
+        globals, locals = self.system.game_state.getGameEnvironment()
+        action_data = self.program[self.pc]
+        self.pc += 1
+        action = action_data[0]
+        action_params = eval(action_data[1], globals, locals)
+        if not (isinstance(action_params, list) 
+                or isinstance(action_params, tuple)):
+            action_params = [action_params]
+        self.cur_action = action(self.system.world, *action_params)
+        self.wait = action_data[2]
+        if len(action_data) >= 4:
+            vals = (
+                eval(action_data[4], globals, locals) 
+                if len(action_data) > 4
+                else ()
+            )
+            command = action_data[3]
+            self.system.commands[command](
+                *vals, 
+                action=self.cur_action
+            )
+        else:
+            self.cur_action.execute()
+        run_time = time.time() - start_time
+        self.run_count += 1
+        self.run_time += run_time
+        self.max_run_time = max(self.max_run_time, run_time)
 
 
 class ScriptingSystem(System):
     """
     System responsible for managing scripts attached to entities to define 
     their behavior.
+    
+    When track_conditions is set, conditions are only evaluated again after 
+    one of the names they read from the game environment was changed, or
+    after their script finished, so that a condition that stays true starts
+    its script again like an untracked one. Conditions that call functions
+    whose results can't be tracked are evaluated on every step.
+    
+    Running scripts are kept in a heap ordered by the time their next action
+    is due, so scripts that wait cost nothing. If frame_budget is set, no
+    more actions are started in a step once that many milliseconds were 
+    spent on script actions, the remaining due scripts run in the next step.
     """
 
-    def __init__(self, commands, actions):
+    def __init__(self, commands, actions, track_conditions=True, 
+                 frame_budget=None):
         """Constructor"""
         self.commands = commands
         self.actions = actions
         self.game_state = None
+        self.track_conditions = track_conditions
+        self.frame_budget = frame_budget
+        self.compiled_expressions = {}
+        self.compile_hits = 0
+        self.compile_misses = 0
         self.reset()
 
     def reset(self):
         """Resets the script and condition collections"""
         self.scripts = {}
         self.conditions = []
+        self.condition_watchers = {}
+        # The indices of the conditions that start each script
+        self.script_conditions = {}
+        self.polled_conditions = []
+        self.dirty_conditions = set()
+        self.time = 0
+        self.wake_heap = []
+        self.wake_counter = 0
+        self.blocked_scripts = []
 
     def step(self, dt):
         """Execute a time step for the system. Must be defined
@@ -101,32 +140,165 @@ class ScriptingSystem(System):
         :param dt: Time since last step invocation
         :type dt: float
         """
-        for condition_data in self.conditions:
-            condition = condition_data[0]
-            script_name = condition_data[1]
+        if self.track_conditions:
+            condition_indices = self.getConditionsToEvaluate()
+        else:
+            condition_indices = xrange(len(self.conditions))
+        for index in condition_indices:
+            condition, script_name = self.conditions[index]
             if not self.scripts.has_key(script_name):
-                return
+                continue
             script = self.scripts[script_name]
-            if (eval(condition, *self.game_state.getGameEnvironment()) 
-                and not script.running):
-                script.running = True
-        for script in self.scripts.itervalues():
+            if eval(condition, *self.game_state.getGameEnvironment()):
+                if script.running:
+                    # The script can't be started now, so check the 
+                    # condition again on the next step.
+                    self.dirty_conditions.add(index)
+                else:
+                    self.startScript(script)
+        self.time += dt
+        self.updateScripts()
+
+    def updateScripts(self):
+        """Runs the next action of all scripts that are due, until the frame
+        budget is used up"""
+        blocked_scripts = self.blocked_scripts
+        self.blocked_scripts = []
+        for script in blocked_scripts:
+            self.scheduleScript(script)
+        if self.frame_budget:
+            end_time = time.time() + self.frame_budget / 1000.0
+        else:
+            end_time = None
+        wake_heap = self.wake_heap
+        while wake_heap and wake_heap[0][0] <= self.time:
+            script = heappop(wake_heap)[2]
+            if (not script.running or 
+                self.scripts.get(script.name) is not script):
+                # The script was stopped or replaced
+                continue
             assert(isinstance(script, Script))
+            script.update()
             if script.finished:
                 script.reset()
-            elif script.running:
-                script.update(dt)
+                self.dirty_conditions.update(
+                    self.script_conditions.get(script.name, ()))
+            else:
+                self.scheduleScript(script)
+            if end_time is not None and time.time() >= end_time:
+                # At least one action runs per step, so scripts always 
+                # progress even if single actions exceed the budget.
+                break
+
+    def scheduleScript(self, script):
+        """Puts a running script into the wake heap or, if it is waiting for
+        its current action to be executed, into the blocked scripts"""
+        if script.blocked:
+            self.blocked_scripts.append(script)
+        else:
+            self.wake_counter += 1
+            heappush(self.wake_heap, 
+                     (self.time + script.wait, self.wake_counter, script))
+
+    def startScript(self, script):
+        """Starts running a script, if it isn't running already"""
+        if not script.running:
+            script.running = True
+            self.scheduleScript(script)
+
+    def getScriptTimings(self):
+        """Returns the time spent in the actions of each script, the scripts 
+        that took the most time first.
+        @return: A list of tuples of the script name, the number of actions 
+        run, the total and the longest time in milliseconds"""
+        timings = [(script.name, script.run_count, script.run_time * 1000, 
+                    script.max_run_time * 1000)
+                   for script in self.scripts.itervalues()]
+        timings.sort(key=lambda timing: timing[2], reverse=True)
+        return timings
                 
+    def getConditionsToEvaluate(self):
+        """Returns the indices of the conditions whose values may have changed
+        since they were last evaluated"""
+        changed_names, entities_changed, all_changed = \
+                self.game_state.popChanges()
+        if all_changed:
+            self.dirty_conditions = set()
+            return xrange(len(self.conditions))
+        condition_indices = self.dirty_conditions
+        self.dirty_conditions = set()
+        for name in changed_names:
+            condition_indices.update(self.condition_watchers.get(name, ()))
+        if entities_changed:
+            # Component values can be reached through any entity, so every
+            # condition that reads an entity has to be checked.
+            for name, watchers in self.condition_watchers.iteritems():
+                if self.game_state.hasObject(name):
+                    condition_indices.update(watchers)
+        condition_indices.update(self.polled_conditions)
+        return sorted(condition_indices)
+
+    def getReadNames(self, code):
+        """Returns the names that the code reads from the game environment.
+        @param code: The compiled expression
+        @type code: code
+        @return: A set of the names or None if the values that the code reads
+        can't be tracked"""
+        names = set()
+        code_objects = [code]
+        while code_objects:
+            code = code_objects.pop()
+            names.update(code.co_names)
+            code_objects.extend(const for const in code.co_consts
+                                if isinstance(const, CodeType))
+        if self.game_state is None:
+            return None
+        for name in names:
+            if (name in self.game_state.funcs and 
+                not name in self.game_state.CONSTANT_FUNCS and
+                not name in self.game_state.TRACKED_FUNCS):
+                return None
+        return names.difference(self.game_state.CONSTANT_FUNCS)
+
+    def compileExpression(self, expression):
+        """Returns the code object of an expression. Expressions are only
+        compiled the first time they are encountered, after that the cached
+        code object is returned.
+        @param expression: The expression to compile
+        @type expression: str or code
+        @return: The compiled expression
+        """
+        if isinstance(expression, CodeType):
+            return expression
+        try:
+            code = self.compiled_expressions[expression]
+        except KeyError:
+            code = compile(expression, "<script>", "eval")
+            self.compiled_expressions[expression] = code
+            self.compile_misses += 1
+        else:
+            self.compile_hits += 1
+        return code
+
     def setScript(self, name, actions):
         """Sets a script.
         @param name: The name of the script
-        @param actions: What the script does
-        @type actions: deque or iterable
+        @param actions: What the script does, a list of the action name, 
+        the action arguments, the time to wait after the action, and 
+        optionally a command and the command arguments for each action.
+        @type actions: iterable
         """
-        if not(isinstance(actions, deque)):
-            actions = deque(actions)
-        self.scripts[name] = Script(actions, 
-                                    self
+        program = []
+        for action_data in actions:
+            action_data = list(action_data)
+            action_data[0] = self.actions[action_data[0]]
+            action_data[1] = self.compileExpression(action_data[1])
+            if len(action_data) > 4:
+                action_data[4] = self.compileExpression(action_data[4])
+            program.append(tuple(action_data))
+        self.scripts[name] = Script(tuple(program), 
+                                    self,
+                                    name
                                     )
         
     def addCondition(self, condition, script_name):
@@ -135,13 +307,23 @@ class ScriptingSystem(System):
         @param script_name: Name of the script that will be executed if the
         condition evaluates to True.
         """
-        self.conditions.append((condition, script_name))
+        code = self.compileExpression(condition)
+        index = len(self.conditions)
+        self.conditions.append((code, script_name))
+        self.script_conditions.setdefault(script_name, set()).add(index)
+        read_names = self.getReadNames(code)
+        if read_names is None:
+            self.polled_conditions.append(index)
+        else:
+            for name in read_names:
+                self.condition_watchers.setdefault(name, set()).add(index)
+        self.dirty_conditions.add(index)
     
     
     def runScript(self, name):
         """Runs a script with the given name
         @param name: The name of the script"""
         if self.scripts.has_key(name):
-            self.scripts[name].running = True
+            self.startScript(self.scripts[name])
         
     
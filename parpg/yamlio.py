@@ -0,0 +1,69 @@
+#   This file is part of PARPG.
+
+#   PARPG is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   PARPG is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+"""Reading and writing of YAML.
+
+All YAML that PARPG reads or writes goes through this module. It uses the
+libyaml based loader and dumper if PyYAML was built with them and falls
+back to the pure Python implementations otherwise. Only the standard YAML
+types are constructed, plus tuples, which the saves contain."""
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as BaseLoader, CSafeDumper as BaseDumper
+    LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader as BaseLoader, SafeDumper as BaseDumper
+    LIBYAML = False
+
+TUPLE_TAG = u'tag:yaml.org,2002:python/tuple'
+
+class Loader(BaseLoader):
+    """Loader that constructs only safe types"""
+
+def construct_tuple(loader, node):
+    return tuple(loader.construct_sequence(node))
+
+Loader.add_constructor(TUPLE_TAG, construct_tuple)
+
+class Dumper(BaseDumper):
+    """Dumper for the types that L{Loader} can construct"""
+
+def represent_tuple(dumper, data):
+    return dumper.represent_sequence(TUPLE_TAG, data)
+
+Dumper.add_representer(tuple, represent_tuple)
+
+def load(stream):
+    """Parses the first YAML document in a stream
+    @param stream: The YAML data
+    @type stream: str or file
+    @return: The parsed document"""
+    return yaml.load(stream, Loader=Loader)
+
+def load_all(stream):
+    """Parses all YAML documents in a stream
+    @param stream: The YAML data
+    @type stream: str or file
+    @return: A generator of the parsed documents"""
+    return yaml.load_all(stream, Loader=Loader)
+
+def dump(data, stream=None, **kwargs):
+    """Serializes an object as YAML
+    @param data: The object to serialize
+    @param stream: The stream to write to, if None the YAML is returned
+    @type stream: file
+    @return: The YAML if no stream was given"""
+    return yaml.dump(data, stream, Dumper=Dumper, **kwargs)
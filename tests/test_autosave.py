@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from parpg import savegame
+from parpg.autosave import AutoSaver, SnapshotCopies
+
+class TestAutoSaver(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.temp_dir = tempfile.mkdtemp()
+        self.save_dir = os.path.join(self.temp_dir, "saves")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def createSnapshot(self, map_name):
+        game_state = {"CurrentMap": map_name, "NPCsMet": set(),
+                      "locals": {}, "Quests": {"Variables": {}}}
+        return (game_state, [(map_name, {"barrel": {"Rotation": 90}})], {},
+                None, {"Map": map_name})
+
+    def readCurrentMap(self, slot, auto_saver):
+        with open(auto_saver.getSlotPath(slot), "rb") as save_file:
+            return (savegame.SaveReader(save_file)
+                    .readGameState()["CurrentMap"])
+
+    def testSlots(self):
+        auto_saver = AutoSaver(self.save_dir, slot_count=2)
+        for map_name in ("Mall", "Farm", "Beach"):
+            self.assertTrue(auto_saver.save(self.createSnapshot(map_name)))
+            auto_saver.wait()
+        self.assertEqual(sorted(os.listdir(self.save_dir)),
+                         ["autosave_1.dat", "autosave_2.dat"])
+        self.assertEqual(self.readCurrentMap(1, auto_saver), "Beach")
+        self.assertEqual(self.readCurrentMap(2, auto_saver), "Farm")
+
+    def testInterval(self):
+        auto_saver = AutoSaver(self.save_dir, interval=60.0)
+        self.assertFalse(auto_saver.isDue(auto_saver.last_time + 30.0))
+        self.assertTrue(auto_saver.isDue(auto_saver.last_time + 60.0))
+        self.assertFalse(AutoSaver(self.save_dir).isDue())
+
+class TestSnapshotCopies(unittest.TestCase):
+    def testSharedCopies(self):
+        copies = SnapshotCopies()
+        barrel = {"Entity": {"container": {"children": [None]}}}
+        crate = {"Rotation": 90}
+        barrel_copy = copies.copy("barrel", barrel)
+        crate_copy = copies.copy("crate", crate)
+        copies.finish()
+        self.assertEqual(barrel_copy, barrel)
+        self.assertFalse(barrel_copy["Entity"] is barrel["Entity"])
+        barrel["Entity"]["container"]["children"].append("coin")
+        copies.markChanged("barrel")
+        self.assertFalse(copies.copy("barrel", barrel) is barrel_copy)
+        self.assertTrue(copies.copy("crate", crate) is crate_copy)
+        self.assertEqual(copies.copy_count, 3)
+        copies.finish()
+        replaced = {"Rotation": 180}
+        self.assertEqual(copies.copy("crate", replaced), replaced)
+        copies.finish()
+        # The barrel wasn't part of the last snapshot
+        self.assertFalse(copies.copy("barrel", barrel) is barrel_copy)
+        self.assertEqual(copies.copy_count, 5)
+
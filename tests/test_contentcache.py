@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import yaml
+
+from parpg.contentcache import ContentCache
+
+class TestContentCache(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+        self.parsed = []
+        self.writeFile("value: 1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def writeFile(self, contents, mtime=None):
+        file_path = os.path.join(self.temp_dir, "data.yaml")
+        with open(file_path, "w") as data_file:
+            data_file.write(contents)
+        if mtime is not None:
+            os.utime(file_path, (mtime, mtime))
+
+    def parse(self, stream):
+        self.parsed.append(stream)
+        return yaml.safe_load(stream)
+
+    def load(self, rebuild=False):
+        cache = ContentCache(self.temp_dir, self.cache_dir, rebuild)
+        return cache.load("data.yaml", self.parse, "yaml"), cache
+
+    def testCachedUntilChanged(self):
+        self.writeFile("value: 1\n", mtime=1000)
+        contents, cache = self.load()
+        self.assertEqual(contents, {"value": 1})
+        self.assertEqual(cache.misses, 1)
+        contents, cache = self.load()
+        self.assertEqual(contents, {"value": 1})
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(len(self.parsed), 1)
+        self.writeFile("value: 1\n", mtime=2000)
+        contents, cache = self.load()
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(len(self.parsed), 1)
+        self.writeFile("value: 2\n", mtime=3000)
+        contents, cache = self.load()
+        self.assertEqual(contents, {"value": 2})
+        self.assertEqual(cache.misses, 1)
+
+    def testIsOnDisk(self):
+        cache = ContentCache(self.temp_dir, self.cache_dir)
+        self.assertTrue(cache.isOnDisk("data.yaml"))
+        self.assertFalse(cache.isOnDisk("missing.yaml"))
+
+    def testRebuild(self):
+        self.load()
+        contents, cache = self.load(rebuild=True)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(len(self.parsed), 2)
+
+    def testCorruptEntry(self):
+        contents, cache = self.load()
+        with open(cache.getEntryPath("data.yaml", "yaml"), "wb") as entry:
+            entry.write("corrupt")
+        contents, cache = self.load()
+        self.assertEqual(contents, {"value": 1})
+        self.assertEqual(cache.misses, 1)
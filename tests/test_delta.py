@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from copy import deepcopy
+
+from parpg import delta
+
+class TestDelta(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.old = {"barrel": {"Entity": {"lockable": {"locked": True},
+                                          "graphics": {"gfx": "barrel"}},
+                               "Position": (1, 2)},
+                    "crate": {"Rotation": 0}}
+
+    def testDiffAndApply(self):
+        new = deepcopy(self.old)
+        new["barrel"]["Entity"]["lockable"]["locked"] = False
+        new["barrel"]["Position"] = (3.0, 2.0, 0.0)
+        del new["crate"]
+        new["cow"] = {"Rotation": 90}
+        changes = delta.diff(self.old, new)
+        self.assertEqual(changes,
+            {"barrel": (delta.CHANGED, {
+                "Entity": (delta.CHANGED, {
+                    "lockable": (delta.CHANGED, {
+                        "locked": (delta.SET, False)})}),
+                "Position": (delta.SET, (3.0, 2.0, 0.0))}),
+             "crate": (delta.REMOVED,),
+             "cow": (delta.SET, {"Rotation": 90})})
+        self.assertEqual(delta.apply(deepcopy(self.old), changes), new)
+
+    def testNoChanges(self):
+        self.assertEqual(delta.diff(self.old, deepcopy(self.old)), {})
+
+    def testCopy(self):
+        value = {"barrel": {"Entity": {"container": {"children": [None]}},
+                            "Position": (1, [2]),
+                            "Tags": set(["wood"])}}
+        copy = delta.copy(value)
+        self.assertEqual(copy, value)
+        value["barrel"]["Entity"]["container"]["children"].append("coin")
+        value["barrel"]["Position"][1].append(3)
+        value["barrel"]["Tags"].add("heavy")
+        self.assertEqual(copy, {"barrel": {
+            "Entity": {"container": {"children": [None]}},
+            "Position": (1, [2]),
+            "Tags": set(["wood"])}})
+
+    def testChangedOriginal(self):
+        changes = {"barrel": (delta.CHANGED, {"Rotation": (delta.SET, 90)}),
+                   "crate": (delta.REMOVED,)}
+        self.assertEqual(delta.apply({"barrel": None}, changes),
+                         {"barrel": {"Rotation": 90}})
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+import cPickle as pickle
+import unittest
+from StringIO import StringIO
+
+from parpg.dialogue import (Dialogue, DialogueSection, DialogueGreeting,
+                            DialogueResponse)
+from parpg.dialogueactions import MeetAction, SetQuestVariableAction
+from parpg import COPYRIGHT_HEADER
+from parpg.dialogueparsers import YamlDialogueParser, DialogueFormatError
+from parpg.dialogueprocessor import DialogueProcessor
+
+DIALOGUE = """\
+NPC_NAME: Guard
+AVATAR_PATH: gui/portraits/guard.png
+DEFAULT_GREETING:
+    ID: default
+    SAY: "Move along."
+    RESPONSES:
+    -   REPLY: "Bye."
+        GOTO: end
+GREETINGS:
+-   ID: friend
+    CONDITION: "met > 0"
+    SAY: "Hello again."
+    RESPONSES:
+    -   REPLY: "Bye."
+        GOTO: end
+-   ID: old_friend
+    CONDITION: "met > 2"
+    SAY: "You again!"
+    RESPONSES:
+    -   REPLY: "Bye."
+        GOTO: end
+SECTIONS:
+-   ID: main
+    SAY: "What do you want?"
+    RESPONSES:
+    -   REPLY: "Nothing."
+        GOTO: end
+    -   REPLY: "A beer."
+        CONDITION: "{condition}"
+        GOTO: end
+"""
+
+class TestDialogueConditions(unittest.TestCase):
+    def load(self, condition="money >= 5"):
+        stream = StringIO(DIALOGUE.format(condition=condition))
+        return YamlDialogueParser().load(stream)
+
+    def testCompiledOnLoad(self):
+        dialogue = self.load()
+        response = dialogue.sections["main"].responses[1]
+        self.assertEqual(response.condition, "money >= 5")
+        self.assertTrue(eval(response.compiled_condition, {"money": 5}))
+        self.assertEqual(dialogue.sections["main"].responses[0]
+                         .compiled_condition, None)
+        self.assertEqual(dialogue.greetings[0].condition, "met > 0")
+
+    def testSyntaxError(self):
+        self.assertRaises(DialogueFormatError, self.load, "money >=")
+
+    def testSetCondition(self):
+        response = DialogueResponse("A beer.", "end")
+        response.condition = "money > 1"
+        self.assertFalse(eval(response.compiled_condition, {"money": 1}))
+        self.assertRaises(SyntaxError, setattr, response, "condition", "(")
+
+    def testPickle(self):
+        dialogue = pickle.loads(pickle.dumps(self.load(),
+                                             pickle.HIGHEST_PROTOCOL))
+        response = dialogue.sections["main"].responses[1]
+        self.assertEqual(response.condition, "money >= 5")
+        self.assertEqual(response.next_section_id, "end")
+        self.assertFalse(eval(response.compiled_condition, {"money": 4}))
+        self.assertEqual(dialogue.greetings[1].id, "old_friend")
+        self.assertTrue(eval(dialogue.greetings[1].compiled_condition,
+                             {"met": 3}))
+
+    def testGreeting(self):
+        dialogue = self.load()
+        game_state = {"met": 0}
+        processor = DialogueProcessor(dialogue, game_state)
+        self.assertEqual(processor.getDialogueGreeting().id, "default")
+        game_state["met"] = 1
+        self.assertEqual(processor.getDialogueGreeting().id, "friend")
+        # The last greeting whose condition is met is chosen
+        game_state["met"] = 3
+        self.assertEqual(processor.getDialogueGreeting().id, "old_friend")
+
+    def testValidResponses(self):
+        dialogue = self.load()
+        game_state = {"money": 3}
+        processor = DialogueProcessor(dialogue, game_state)
+        section = dialogue.sections["main"]
+        self.assertEqual(len(processor.getValidResponses(section)), 1)
+        game_state["money"] = 5
+        self.assertEqual(len(processor.getValidResponses(section)), 2)
+
+DUMPED_DIALOGUE = """\
+---
+NPC_NAME: Guard
+AVATAR_PATH: gui/portraits/guard.png
+DEFAULT_GREETING:
+    ID: default
+    SAY: "Move along."
+    ACTIONS:
+    -   meet:
+        - guard
+    RESPONSES:
+    -   REPLY: "Bye."
+        GOTO: end
+        
+GREETINGS:
+-   ID: friend
+    CONDITION: "met > 0"
+    SAY: "Hello again."
+    RESPONSES:
+    -   REPLY: "What is going on in the town today, and why are there so\\
+           \\ many guards at the gate?"
+        CONDITION: "money > 0"
+        GOTO: main
+        
+SECTIONS:
+-   ID: main
+    SAY: "What do you want?"
+    RESPONSES:
+    -   REPLY: "Nothing."
+        GOTO: end
+        
+..."""
+
+def generateDialogue(section_count, response_count):
+    """Returns a dialogue with long texts, conditions and actions"""
+    text = "Section {0} says a lot of words to make the line long enough " \
+           "to be wrapped more than once, with \"quotes\" and a\\backslash."
+    sections = []
+    for section in xrange(section_count):
+        responses = []
+        for response in xrange(response_count):
+            next_section = section + response + 1
+            responses.append(DialogueResponse(
+                text="Response {0} of section {1}.".format(response, section),
+                next_section_id="section_{0}".format(next_section)
+                if next_section < section_count else "end",
+                actions=[SetQuestVariableAction(quest="quest",
+                                                variable="var_{0}"
+                                                .format(response),
+                                                value=section)],
+                condition="money >= {0} and 'flag_{1}' not in flags or " \
+                          "met > {2} and met < {3}".format(response * 10,
+                                                         response, section,
+                                                         section + 10)
+            ))
+        sections.append(DialogueSection(id_="section_{0}".format(section),
+                                        text=text.format(section),
+                                        responses=responses))
+    default_greeting = DialogueSection(
+        id_="default", text="Hello.", actions=[MeetAction("npc")],
+        responses=[DialogueResponse("Go on.", "section_0")]
+    )
+    greeting = DialogueGreeting(
+        id_="greeting", condition="met > 0", text="Hello again.",
+        responses=[DialogueResponse("Go on.", "section_0")]
+    )
+    return Dialogue("npc", "gui/portraits/npc.png", default_greeting,
+                    [greeting], sections)
+
+class WriteCountingStream(StringIO):
+    """StringIO that records the size of the largest write"""
+    def __init__(self):
+        StringIO.__init__(self)
+        self.largest_write = 0
+
+    def write(self, data):
+        self.largest_write = max(self.largest_write, len(data))
+        StringIO.write(self, data)
+
+class TestDialogueDump(unittest.TestCase):
+    def dump(self, dialogue):
+        stream = StringIO()
+        YamlDialogueParser().dump(dialogue, stream)
+        return stream.getvalue()
+
+    def testFormat(self):
+        dialogue = YamlDialogueParser().load(StringIO(DIALOGUE.format(
+            condition="money > 0")))
+        dialogue.default_greeting.actions.append(MeetAction("guard"))
+        del dialogue.greetings[1:]
+        greeting = dialogue.greetings[0]
+        greeting.responses[0] = dialogue.sections["main"].responses.pop()
+        greeting.responses[0].text = "What is going on in the town today, " \
+            "and why are there so many guards at the gate?"
+        greeting.responses[0].next_section_id = "main"
+        del dialogue.sections["old_friend"]
+        self.assertEqual(self.dump(dialogue),
+                         COPYRIGHT_HEADER + DUMPED_DIALOGUE)
+
+    def testRoundTrip(self):
+        dialogue = generateDialogue(1000, 3)
+        stream = WriteCountingStream()
+        YamlDialogueParser().dump(dialogue, stream)
+        dumped = stream.getvalue()
+        # The serialization is written while it is emitted, not at once
+        self.assertTrue(stream.largest_write < len(dumped) / 50)
+
+        loaded = YamlDialogueParser().load(StringIO(dumped))
+        self.assertEqual(loaded.sections.keys(), dialogue.sections.keys())
+        self.assertEqual(loaded.greetings[0].condition, "met > 0")
+        self.assertEqual(loaded.default_greeting.actions[0].arguments,
+                         (("npc",), {}))
+        self.assertTrue(isinstance(dumped, str))
+        for section_id, section in dialogue.sections.iteritems():
+            loaded_section = loaded.sections[section_id]
+            self.assertEqual(loaded_section.text, section.text)
+            for response, loaded_response in zip(section.responses,
+                                                 loaded_section.responses):
+                self.assertEqual(loaded_response.text, response.text)
+                self.assertEqual(loaded_response.condition,
+                                 response.condition)
+                self.assertEqual(loaded_response.next_section_id,
+                                 response.next_section_id)
+                self.assertEqual([action.arguments
+                                  for action in loaded_response.actions],
+                                 [action.arguments
+                                  for action in response.actions])
+        self.assertEqual(self.dump(loaded), dumped)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from parpg.dialogueparsers import YamlDialogueParser
+from parpg.dialogueactions import MeetAction, StartQuestAction
+from parpg.dialoguebundle import (DialogueBundle, BundleFormatError,
+                                  writeBundle)
+from parpg.dialogueprocessor import DialogueProcessor
+
+DIALOGUE = """\
+NPC_NAME: {0}
+AVATAR_PATH: gui/portraits/{0}.png
+DEFAULT_GREETING:
+    ID: default
+    SAY: "Move along."
+    ACTIONS:
+    -   meet: {0}
+    RESPONSES:
+    -   REPLY: "What's up?"
+        GOTO: main
+GREETINGS:
+-   ID: friend
+    CONDITION: "met > 0"
+    SAY: "Hello again."
+    RESPONSES:
+    -   REPLY: "Bye."
+        GOTO: end
+SECTIONS:
+-   ID: main
+    SAY: "What do you want?"
+    RESPONSES:
+    -   REPLY: "A job."
+        CONDITION: "money < 5"
+        ACTIONS:
+        -   start_quest: beer
+        GOTO: back
+    -   REPLY: "Nothing."
+        GOTO: end
+"""
+
+class TestDialogueBundle(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.temp_dir = tempfile.mkdtemp()
+        self.bundle_path = os.path.join(self.temp_dir, "dialogues.bundle")
+        parser = YamlDialogueParser()
+        self.dialogues = [
+            (parser.load(StringIO(DIALOGUE.format(npc_name))),
+             "dialogue/{0}.yaml".format(npc_name.lower()))
+            for npc_name in ("Bart", "Janie")
+        ]
+        with open(self.bundle_path, "wb") as bundle_file:
+            writeBundle(bundle_file, self.dialogues)
+        self.bundle = DialogueBundle(self.bundle_path)
+
+    def tearDown(self):
+        self.bundle.close()
+        shutil.rmtree(self.temp_dir)
+
+    def testFiles(self):
+        self.assertEqual(self.bundle.getFiles(),
+                         {"Bart": "dialogue/bart.yaml",
+                          "Janie": "dialogue/janie.yaml"})
+        self.assertTrue("dialogue/bart.yaml" in self.bundle)
+        self.assertFalse("dialogue/kimmy.yaml" in self.bundle)
+
+    def testDecode(self):
+        dialogue = self.bundle.loadDialogue("dialogue/janie.yaml")
+        self.assertEqual(dialogue.npc_name, "Janie")
+        self.assertEqual(dialogue.avatar_path, "gui/portraits/Janie.png")
+        self.assertEqual(list(dialogue.sections),
+                         ["default", "friend", "main"])
+        self.assertEqual(dialogue.sections.getDecodedCount(), 2)
+        self.assertTrue(dialogue.default_greeting is
+                        dialogue.sections["default"])
+        action = dialogue.default_greeting.actions[0]
+        self.assertTrue(isinstance(action, MeetAction))
+        self.assertEqual(action.arguments, (("Janie",), {}))
+        greeting = dialogue.greetings[0]
+        self.assertEqual(greeting.condition, "met > 0")
+        self.assertTrue(eval(greeting.compiled_condition, {"met": 1}))
+
+        main = dialogue.sections["main"]
+        self.assertEqual(dialogue.sections.getDecodedCount(), 3)
+        self.assertEqual(main.text, "What do you want?")
+        self.assertEqual([response.next_section_id
+                          for response in main.responses], ["back", "end"])
+        self.assertEqual(main.responses[0].condition, "money < 5")
+        self.assertFalse(eval(main.responses[0].compiled_condition,
+                              {"money": 5}))
+        self.assertTrue(isinstance(main.responses[0].actions[0],
+                                   StartQuestAction))
+        self.assertEqual(main.responses[1].compiled_condition, None)
+
+    def testProcessor(self):
+        dialogue = self.bundle.loadDialogue("dialogue/bart.yaml")
+        processor = DialogueProcessor(dialogue, {"met": 0, "money": 3})
+        self.assertEqual(processor.getDialogueGreeting().id, "default")
+        self.assertEqual(len(processor.getValidResponses(
+            dialogue.sections["main"])), 2)
+
+    def testChangedFiles(self):
+        os.mkdir(os.path.join(self.temp_dir, "dialogue"))
+        for npc_name in ("Bart", "Janie"):
+            path = os.path.join(self.temp_dir, "dialogue",
+                                npc_name.lower() + ".yaml")
+            with open(path, "w") as dialogue_file:
+                dialogue_file.write(DIALOGUE.format(npc_name))
+        path = os.path.join(self.temp_dir, "compiled.bundle")
+        with open(path, "wb") as bundle_file:
+            writeBundle(bundle_file, self.dialogues + [
+                (self.dialogues[0][0], "dialogue/kimmy.yaml")
+            ], self.temp_dir)
+        bundle = DialogueBundle(path)
+        try:
+            self.assertEqual(bundle.discardChangedFiles(self.temp_dir), [])
+            with open(os.path.join(self.temp_dir, "dialogue", "bart.yaml"),
+                      "a") as dialogue_file:
+                dialogue_file.write("\n")
+            self.assertEqual(bundle.discardChangedFiles(self.temp_dir),
+                             ["dialogue/bart.yaml"])
+            self.assertFalse("dialogue/bart.yaml" in bundle)
+            self.assertTrue("dialogue/janie.yaml" in bundle)
+            # Files that aren't on disk can't be compared
+            self.assertTrue("dialogue/kimmy.yaml" in bundle)
+            self.assertEqual(bundle.getFiles()["Janie"],
+                             "dialogue/janie.yaml")
+        finally:
+            bundle.close()
+        # Without the source directory nothing is compared
+        self.assertEqual(self.bundle.discardChangedFiles(self.temp_dir), [])
+        self.assertTrue("dialogue/bart.yaml" in self.bundle)
+
+    def testInvalidFiles(self):
+        path = os.path.join(self.temp_dir, "invalid.bundle")
+        with open(path, "wb") as bundle_file:
+            bundle_file.write("NPC_NAME: Bart\n")
+        self.assertRaises(BundleFormatError, DialogueBundle, path)
+        with open(path, "wb") as bundle_file:
+            pass
+        self.assertRaises(BundleFormatError, DialogueBundle, path)
+        with open(self.bundle_path, "rb") as bundle_file:
+            data = bundle_file.read()
+        with open(path, "wb") as bundle_file:
+            # Written by another Python version
+            bundle_file.write(data[:12] + "\0\0\0\0" + data[16:])
+        self.assertRaises(BundleFormatError, DialogueBundle, path)
+
+if __name__ == "__main__":
+    unittest.main()
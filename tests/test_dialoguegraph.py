@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+
+from parpg.dialogue import (Dialogue, DialogueSection, DialogueGreeting,
+                            DialogueResponse)
+from parpg.dialoguegraph import DialogueGraph
+
+def section(id_, *next_section_ids):
+    """Returns a section with a response for each of the next sections"""
+    responses = [DialogueResponse(next_section_id, next_section_id)
+                 for next_section_id in next_section_ids]
+    return DialogueSection(id_, id_, responses)
+
+class TestDialogueGraph(unittest.TestCase):
+    def setUp(self):
+        greeting = DialogueGreeting("friend", "met > 0", "Hello again.",
+                                    [DialogueResponse("Back", "back"),
+                                     DialogueResponse("Shop", "shop")])
+        self.dialogue = Dialogue(
+            "Trader", None, section("default", "shop", "end"), [greeting],
+            [section("shop", "buy", "sell", "back"),
+             section("buy", "shop", "end"),
+             section("sell", "haggle"),
+             section("haggle", "haggle"),
+             section("secret", "end"),
+             section("closed")]
+        )
+        self.graph = DialogueGraph(self.dialogue)
+
+    def testReachability(self):
+        self.assertEqual(self.graph.getUnreachableSections(),
+                         ["secret", "closed"])
+        self.assertEqual(self.graph.getDeadEnds(), [])
+        self.assertEqual(self.graph.getTraps(), ["sell", "haggle"])
+        self.assertEqual(self.graph.getBackMisuses(), ["friend"])
+
+    def testCycles(self):
+        self.assertEqual(sorted(map(sorted, self.graph.getCycles())),
+                         [["buy", "shop"], ["haggle"]])
+        self.assertEqual(self.graph.getMaxDepth(), None)
+
+    def testMaxDepth(self):
+        dialogue = Dialogue("Guard", None, section("default", "a", "b"),
+                            sections=[section("a", "b", "end"),
+                                      section("b", "c"), section("c", "back"),
+                                      section("d")])
+        graph = DialogueGraph(dialogue)
+        self.assertEqual(graph.getMaxDepth(), 4)
+        self.assertEqual(graph.getCycles(), [])
+        self.assertEqual(graph.getDeadEnds(), [])
+        self.assertEqual(graph.getProblems(), ["section d is unreachable"])
+
+    def testLongChain(self):
+        # Long chains mustn't exceed the recursion limit
+        sections = [section("s%d" % index, "s%d" % (index + 1))
+                    for index in xrange(5000)]
+        sections.append(section("s5000", "end", "back"))
+        dialogue = Dialogue("Storyteller", None, section("default", "s0"),
+                            sections=sections)
+        graph = DialogueGraph(dialogue)
+        self.assertEqual(graph.getMaxDepth(), 5002)
+        self.assertEqual(graph.getProblems(), [])
+
+    @unittest.skipIf(not __debug__, "the dialogue is only checked in debug")
+    def testUnknownSection(self):
+        self.assertRaises(AssertionError, Dialogue, "Guard", None,
+                          section("default", "nowhere"))
+
+    def testReport(self):
+        report = self.graph.getReport().splitlines()
+        self.assertEqual(report[0], "Trader: 8 sections, 6 reachable, "
+                                    "12 responses, stack depth unbounded")
+        self.assertTrue("    greeting friend goes back, but there is no "
+                        "section to go back to" in report)
+        self.assertTrue("    the dialogue can't end after section haggle"
+                        in report)
+
+if __name__ == "__main__":
+    unittest.main()
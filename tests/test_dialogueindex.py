@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from parpg import vfs
+from parpg.common import utils
+from parpg.dialogueindex import DialogueIndex, DialogueCache, readNpcName
+
+class DirectoryVFS(object):
+    def __init__(self, root):
+        self.root = root
+
+    def open(self, path):
+        return open(os.path.join(self.root, path), "rb")
+
+    def listFiles(self, path):
+        path = os.path.join(self.root, path)
+        return [name for name in os.listdir(path)
+                if os.path.isfile(os.path.join(path, name))]
+
+    def listDirectories(self, path):
+        path = os.path.join(self.root, path)
+        return [name for name in os.listdir(path)
+                if os.path.isdir(os.path.join(path, name))]
+
+class TestDialogueIndex(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.temp_dir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.temp_dir, "cache",
+                                       "dialogues.idx")
+        self.old_vfs = vfs.VFS
+        vfs.VFS = DirectoryVFS(self.temp_dir)
+        self.writeDialogue("dialogue/bart.yaml", "Bart")
+        self.writeDialogue("dialogue/farm/janie.yaml", "Janie")
+        self.writeFile("dialogue/notes.yaml", "SECTIONS: []\n")
+
+    def tearDown(self):
+        vfs.VFS = self.old_vfs
+        utils.invalidateFiles()
+        shutil.rmtree(self.temp_dir)
+
+    def writeFile(self, path, contents, mtime=1000):
+        file_path = os.path.join(self.temp_dir, path)
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        with open(file_path, "w") as dialogue_file:
+            dialogue_file.write(contents)
+        os.utime(file_path, (mtime, mtime))
+        utils.invalidateFiles()
+
+    def writeDialogue(self, path, npc_name, mtime=1000):
+        self.writeFile(path, "# Dialogue of {0}\nNPC_NAME: {0}\n"
+                             "AVATAR_PATH: gui/{0}.png\nSECTIONS: []\n"
+                             .format(npc_name), mtime)
+
+    def locateDialogues(self):
+        dialogue_index = DialogueIndex(self.temp_dir, self.index_path)
+        return dialogue_index.locateDialogues("dialogue"), dialogue_index
+
+    def testReadNpcName(self):
+        self.assertEqual(readNpcName(StringIO('NPC_NAME: "Bart"\n')), "Bart")
+        self.assertEqual(readNpcName(StringIO("AVATAR_PATH: a.png\n" * 100 +
+                                              "NPC_NAME: Bart")), "Bart")
+        self.assertEqual(readNpcName(StringIO("SECTIONS:\n"
+                                              "    NPC_NAME: Bart\n")),
+                         None)
+
+    def testIndex(self):
+        expected = {"Bart": "dialogue/bart.yaml",
+                    "Janie": "dialogue/farm/janie.yaml"}
+        dialogue_files, dialogue_index = self.locateDialogues()
+        self.assertEqual(dialogue_files, expected)
+        self.assertEqual(dialogue_index.scanned_files, 3)
+        dialogue_files, dialogue_index = self.locateDialogues()
+        self.assertEqual(dialogue_files, expected)
+        self.assertEqual(dialogue_index.scanned_files, 0)
+
+    def testChangedFiles(self):
+        self.locateDialogues()
+        self.writeDialogue("dialogue/bart.yaml", "Bartholomew", mtime=2000)
+        os.remove(os.path.join(self.temp_dir, "dialogue", "farm",
+                               "janie.yaml"))
+        utils.invalidateFiles()
+        dialogue_files, dialogue_index = self.locateDialogues()
+        self.assertEqual(dialogue_files,
+                         {"Bartholomew": "dialogue/bart.yaml"})
+        self.assertEqual(dialogue_index.scanned_files, 1)
+        self.assertEqual(sorted(dialogue_index.entries),
+                         ["dialogue/bart.yaml", "dialogue/notes.yaml"])
+
+class TestDialogueCache(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.parsed = []
+        self.cache = DialogueCache(self.parse, max_dialogues=2)
+        self.cache.setFiles({"Bart": "bart.yaml", "Janie": "janie.yaml",
+                             "Kimmy": "kimmy.yaml", "Broken": "broken.yaml"})
+
+    def parse(self, filepath):
+        self.parsed.append(filepath)
+        if filepath == "broken.yaml":
+            return None
+        return "dialogue of " + filepath
+
+    def testParseOnDemand(self):
+        self.assertTrue("Bart" in self.cache)
+        self.assertFalse("Farmer" in self.cache)
+        self.assertEqual(self.cache.getDialogue("Bart"),
+                         "dialogue of bart.yaml")
+        self.assertEqual(self.cache.getDialogue("Bart"),
+                         "dialogue of bart.yaml")
+        self.assertEqual(self.parsed, ["bart.yaml"])
+        self.assertEqual(self.cache.getDialogue("Farmer"), None)
+        self.assertEqual(self.cache.getDialogue("Broken"), None)
+        self.assertFalse(self.cache.isResident("Broken"))
+
+    def testLeastRecentlyUsed(self):
+        self.cache.getDialogue("Bart")
+        self.cache.getDialogue("Janie")
+        self.cache.getDialogue("Bart")
+        self.cache.getDialogue("Kimmy")
+        self.assertTrue(self.cache.isResident("Bart"))
+        self.assertFalse(self.cache.isResident("Janie"))
+        self.assertTrue(self.cache.isResident("Kimmy"))
+        self.cache.getDialogue("Janie")
+        self.assertEqual(self.parsed, ["bart.yaml", "janie.yaml",
+                                       "kimmy.yaml", "janie.yaml"])
+
+    def testParseDialogues(self):
+        self.cache.getDialogue("Bart")
+        dialogues = self.cache.parseDialogues(["Bart", "Janie", "Farmer",
+                                               "Broken"])
+        self.assertEqual(dialogues, {"Janie": "dialogue of janie.yaml"})
+        self.assertFalse(self.cache.isResident("Janie"))
+        self.cache.add("Janie", dialogues["Janie"])
+        self.cache.getDialogue("Janie")
+        self.assertEqual(self.parsed, ["bart.yaml", "janie.yaml",
+                                       "broken.yaml"])
+
+    def testParseDialoguesWith(self):
+        skip = lambda filepath: None
+        self.assertEqual(self.cache.parseDialogues(["Bart", "Janie"], skip),
+                         {})
+        self.assertEqual(self.parsed, [])
+        self.assertEqual(self.cache.getDialogue("Bart"),
+                         "dialogue of bart.yaml")
+
+if __name__ == "__main__":
+    unittest.main()
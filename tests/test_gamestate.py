@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+
+import gc
+import unittest
+import weakref
+
+from bGrease.world import BaseWorld
+from bGrease.entity import Entity
+
+from parpg import vfs
+from parpg.components import containable, container
+from parpg.gamestate import GameState
+
+class TestGameState(unittest.TestCase):
+    class EmptyVFS(object):
+        """VFS without any files"""
+
+        def listFiles(self, path):
+            return []
+
+        def listDirectories(self, path):
+            return []
+
+    class GameWorld(BaseWorld):
+        """GameWorld"""
+
+        def configure(self):
+            """Set up the world"""
+            self.components.containable = containable.Containable()
+            self.components.container = container.Container()
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.old_vfs = vfs.VFS
+        vfs.VFS = self.EmptyVFS()
+        self.game_state = GameState(quests_dir="quests")
+
+    def tearDown(self):
+        vfs.VFS = self.old_vfs
+        self.game_state = None
+
+    def getExpectedGlobals(self):
+        expected = dict(self.game_state.funcs)
+        expected.update(self.game_state.getObjectDictOfMap(
+            self.game_state.current_map_name))
+        return expected
+
+    def testEnvironment(self):
+        game_state = self.game_state
+        game_state.addObject("barrel", "map", "barrel_object")
+        game_state.addObject("crate", "other_map", "crate_object")
+        game_state.addObject("str", "map", "str_object")
+        self.assertEqual(game_state.getGameEnvironment()[0],
+                         self.getExpectedGlobals())
+        game_state.current_map_name = "map"
+        globals = game_state.getGameEnvironment()[0]
+        self.assertEqual(globals, self.getExpectedGlobals())
+        self.assertEqual(globals["str"], "str_object")
+        game_state.current_map_name = "other_map"
+        self.assertEqual(globals, self.getExpectedGlobals())
+        self.assertEqual(globals["str"], str)
+        game_state.funcs["crate"] = "crate_func"
+        game_state.funcs["sqrt"] = None
+        self.assertEqual(globals, self.getExpectedGlobals())
+        game_state.addObject("box", None, "box_object")
+        game_state.deleteObject("box")
+        self.assertEqual(globals, self.getExpectedGlobals())
+        game_state.clearObjects()
+        self.assertEqual(globals, self.getExpectedGlobals())
+        self.assertTrue(globals is game_state.getGameEnvironment()[0])
+
+    def testSceneVersion(self):
+        game_state = self.game_state
+        game_state.current_map_name = "map"
+        version = game_state.scene_version
+        game_state.addObject("crate", "other_map", "crate_object")
+        game_state.setObjectPosition("crate", (1, 2))
+        self.assertEqual(game_state.scene_version, version)
+        game_state.addObject("barrel", "map", "barrel_object")
+        self.assertTrue(game_state.scene_version > version)
+        version = game_state.scene_version
+        game_state.setObjectPosition("barrel", (1, 2))
+        self.assertTrue(game_state.scene_version > version)
+
+    def testUnsavedEntities(self):
+        game_state = self.game_state
+        world = self.GameWorld()
+        chest = Entity(world)
+        chest.container.children = [None]
+        chest.container.max_bulk = 10
+        box = Entity(world)
+        box.container.children = [None]
+        box.container.max_bulk = 10
+        coin = Entity(world)
+        coin.containable.bulk = 1
+        self.assertEqual(game_state.popUnsavedEntities(),
+                         set([chest, box, coin]))
+        game_state.addObject("barrel", "map", "barrel_object")
+        self.assertEqual(game_state.popUnsavedEntities(),
+                         set(["barrel_object"]))
+        container.put_item(chest.container, coin.containable)
+        self.assertEqual(game_state.popUnsavedEntities(), set([chest, coin]))
+        container.put_item(box.container, coin.containable)
+        self.assertEqual(game_state.popUnsavedEntities(),
+                         set([chest, box, coin]))
+        container.remove_item(box.container, 0)
+        self.assertEqual(game_state.popUnsavedEntities(), set([box, coin]))
+        self.assertEqual(game_state.popUnsavedEntities(), set())
+
+    def testDiscardedStateIsNotNotified(self):
+        writes = []
+        class RecordingGameState(GameState):
+            def onComponentWrite(self, entity, component, field):
+                writes.append(field)
+        world = self.GameWorld()
+        chest = Entity(world)
+        game_state = RecordingGameState(quests_dir="quests")
+        chest.container.max_bulk = 10
+        self.assertTrue("max_bulk" in writes)
+        del writes[:]
+        reference = weakref.ref(game_state)
+        del game_state
+        gc.collect()
+        self.assertTrue(reference() is None)
+        chest.container.max_bulk = 20
+        self.assertEqual(writes, [])
+        self.assertEqual(self.game_state.popUnsavedEntities(), set([chest]))
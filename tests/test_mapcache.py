@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+
+from parpg.mapcache import MapCache
+
+class TestMapCache(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.evicted = []
+        self.loaded = []
+
+    def onEvict(self, map_name, game_map):
+        self.assertTrue(map_name in self.map_cache)
+        self.evicted.append(map_name)
+
+    def visit(self, map_name):
+        def load():
+            self.loaded.append(map_name)
+            return {"name": map_name, "size": len(map_name)}
+        self.map_cache.fetch(map_name, load)
+
+    def testCountBudget(self):
+        self.map_cache = MapCache(max_maps=2, on_evict=self.onEvict)
+        for map_name in ("Mall", "Farm", "Mall", "Beach"):
+            self.visit(map_name)
+            self.map_cache.evict(keep=(map_name,))
+        self.assertEqual(self.loaded, ["Mall", "Farm", "Beach"])
+        self.assertEqual(self.evicted, ["Farm"])
+        self.assertEqual(self.map_cache.keys(), ["Mall", "Beach"])
+        self.assertEqual((self.map_cache.hits, self.map_cache.misses), (1, 3))
+
+    def testSizeBudget(self):
+        self.map_cache = MapCache(max_size=9, on_evict=self.onEvict,
+                                  size_of=lambda game_map: game_map["size"])
+        for map_name in ("Mall", "Farm", "Beach"):
+            self.visit(map_name)
+        self.map_cache.evict(keep=("Mall",))
+        self.assertEqual(self.evicted, ["Farm"])
+        self.assertEqual(self.map_cache.getTotalSize(), 9)
+        self.assertFalse(self.map_cache.isOverBudget())
+
+    def testKeepCurrentMap(self):
+        self.map_cache = MapCache(max_maps=1, on_evict=self.onEvict)
+        self.visit("Mall")
+        self.visit("Farm")
+        self.assertEqual(self.map_cache.evict(keep=("Mall", "Farm")), [])
+        self.assertTrue(self.map_cache.isOverBudget())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from parpg.mappreloader import MapPreloader
+
+class TestMapPreloader(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.preloader = MapPreloader()
+
+    def testPreload(self):
+        agents_data = "Barrel: {Position: [1, 2]}\n---\n---\nCrate: {}\n"
+        scripts_data = "Scripts: {}\nConditions: []\n"
+        self.preloader.preload("map", agents_data, scripts_data)
+        self.assertTrue(self.preloader.isPreloading("map"))
+        preloaded_map = self.preloader.take("map")
+        self.assertEqual(preloaded_map.agents,
+                         [{"Barrel": {"Position": [1, 2]}}, {"Crate": {}}])
+        self.assertEqual(preloaded_map.scripts,
+                         {"Scripts": {}, "Conditions": []})
+        self.assertFalse(self.preloader.isPreloading("map"))
+        self.assertEqual(self.preloader.take("map"), None)
+
+    def testNoAgentsOrScripts(self):
+        self.preloader.preload("map", None, None)
+        preloaded_map = self.preloader.take("map")
+        self.assertEqual(preloaded_map.agents, None)
+        self.assertEqual(preloaded_map.scripts, None)
+
+    def testDialogues(self):
+        agents_data = "Bart: {}\n---\nBarrel: {}\n"
+        load_dialogues = lambda names: dict((name, "dialogue of " + name)
+                                            for name in names
+                                            if name in ("Bart", "Janie"))
+        self.preloader.preload("map", agents_data, None, load_dialogues,
+                               ["Janie"])
+        preloaded_map = self.preloader.take("map")
+        self.assertEqual(preloaded_map.dialogues,
+                         {"Bart": "dialogue of Bart",
+                          "Janie": "dialogue of Janie"})
+
+    def testParseError(self):
+        self.preloader.preload("map", "[unclosed", None)
+        self.assertRaises(Exception, self.preloader.take, "map")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+import unittest
+
+from parpg import vfs
+from parpg.objectindex import ObjectIndex
+
+class DirectoryVFS(object):
+    def __init__(self, root):
+        self.root = root
+
+    def open(self, path):
+        return open(os.path.join(self.root, path), "rb")
+
+    def listFiles(self, path):
+        path = os.path.join(self.root, path)
+        return [name for name in os.listdir(path)
+                if os.path.isfile(os.path.join(path, name))]
+
+    def listDirectories(self, path):
+        path = os.path.join(self.root, path)
+        return [name for name in os.listdir(path)
+                if os.path.isdir(os.path.join(path, name))]
+
+class TestObjectIndex(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.temp_dir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.temp_dir, "cache", "objects.idx")
+        self.old_vfs = vfs.VFS
+        vfs.VFS = DirectoryVFS(self.temp_dir)
+        self.writeObject("objects/barrel.xml", "barrel")
+        self.writeObject("objects/items/beer.xml", "beer")
+        self.writeFile("objects/items/atlas.xml", "<atlas name='items' />")
+
+    def tearDown(self):
+        vfs.VFS = self.old_vfs
+        shutil.rmtree(self.temp_dir)
+
+    def writeFile(self, path, contents, mtime=1000):
+        file_path = os.path.join(self.temp_dir, path)
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        with open(file_path, "w") as xml_file:
+            xml_file.write(contents)
+        os.utime(os.path.dirname(file_path), (mtime, mtime))
+
+    def writeObject(self, path, object_id, mtime=1000):
+        self.writeFile(path, "<?xml version='1.0'?><object id='{0}'>"
+                             "<image source='{0}.png' /></object>"
+                             .format(object_id), mtime)
+
+    def locateObjects(self):
+        object_index = ObjectIndex(self.temp_dir, self.index_path)
+        return object_index.locateObjects("objects"), object_index
+
+    def testIndex(self):
+        expected = {"barrel": "objects/barrel.xml",
+                    "beer": "objects/items/beer.xml"}
+        object_files, object_index = self.locateObjects()
+        self.assertEqual(object_files, expected)
+        self.assertEqual(object_index.parsed_files, 3)
+        object_files, object_index = self.locateObjects()
+        self.assertEqual(object_files, expected)
+        self.assertEqual(object_index.parsed_files, 0)
+
+    def testChangedDirectory(self):
+        self.locateObjects()
+        self.writeObject("objects/items/knife.xml", "knife", mtime=2000)
+        object_files, object_index = self.locateObjects()
+        self.assertEqual(object_files["knife"], "objects/items/knife.xml")
+        self.assertEqual(object_index.parsed_files, 3)
+        shutil.rmtree(os.path.join(self.temp_dir, "objects", "items"))
+        os.utime(os.path.join(self.temp_dir, "objects"), (3000, 3000))
+        object_files, object_index = self.locateObjects()
+        self.assertEqual(object_files, {"barrel": "objects/barrel.xml"})
+        self.assertEqual(sorted(object_index.directories), ["objects"])
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from parpg.objectstore import ObjectStore
+
+class TestObjectStore(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.dialogue = {}
+        self.lockable = {}
+        self.store = ObjectStore({"dialogue": self.dialogue,
+                                  "lockable": self.lockable},
+                                 cell_size=4)
+        self.npc = object()
+        self.door = object()
+        self.dialogue[self.npc] = None
+        self.lockable[self.door] = None
+        self.store.add("npc", "map", self.npc)
+        self.store.add("door", "map", self.door)
+
+    def testLookup(self):
+        self.assertTrue(self.store.get("npc") is self.npc)
+        self.assertEqual(self.store.getMap("door"), "map")
+        self.assertEqual(self.store.getObjectsOfMap("map"),
+                         {"npc": self.npc, "door": self.door})
+        self.assertEqual(self.store.getObjectsOfMap("other_map"), {})
+        self.assertTrue(self.store.remove("npc") is self.npc)
+        self.assertFalse(self.store.has("npc"))
+        self.assertEqual(self.store.getObjectsOfMap("map"),
+                         {"door": self.door})
+
+    def testComponentIndex(self):
+        self.assertEqual(self.store.getIdsWithComponent("map", "dialogue"),
+                         set(["npc"]))
+        self.assertTrue(self.store.hasComponent("door", "lockable"))
+        self.assertFalse(self.store.hasComponent("npc", "lockable"))
+        self.lockable[self.npc] = None
+        self.store.onComponentWrite(self.npc, self.lockable, "locked")
+        self.assertEqual(self.store.getIdsWithComponent("map", "lockable"),
+                         set(["npc", "door"]))
+        del self.lockable[self.door]
+        self.assertEqual(self.store.getIdsWithComponent("map", "lockable"),
+                         set(["npc"]))
+
+    def testPositionGrid(self):
+        self.store.setPosition("npc", (1, 1))
+        self.store.setPosition("door", (-3, 9))
+        self.assertEqual(self.store.getIdsNear("map", (0, 0), 2), ["npc"])
+        self.assertEqual(sorted(self.store.getIdsNear("map", (0, 5), 5)),
+                         ["door", "npc"])
+        self.assertEqual(self.store.getIdsNear("other_map", (0, 0), 10), [])
+        self.store.setPosition("npc", (20, 20))
+        self.assertEqual(self.store.getIdsNear("map", (0, 0), 2), [])
+        self.store.remove("door")
+        self.assertEqual(self.store.getIdsNear("map", (0, 5), 5), [])
+        self.assertEqual(self.store.grid["map"].keys(), [(5, 5)])
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from cStringIO import StringIO
+
+from parpg import savegame, delta
+
+class TestSaveGame(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.game_state = {"CurrentMap": "Mall",
+                           "NPCsMet": set(["Bob"]),
+                           "locals": {"door_open": True},
+                           "Quests": {"Variables": {"beer": {"found": 2}},
+                                      "ActiveQuests": ["beer"],
+                                      "FinishedQuests": [],
+                                      "FailedQuests": []}}
+        self.agents = {
+            "All": {"PlayerCharacter": {"Map": "Mall",
+                                        "Position": (1.0, 2.0, 0.0)}},
+            "Mall": {"barrel": {"Entity": {"lockable": {"locked": False}},
+                                "Rotation": 90}},
+            "Farm": {u"cow": {"Position": (5.0, 6.0, 0.0)}},
+        }
+        self.items = {"beer": {"Entity": {"containable": {"bulk": 1}}}}
+        self.data = self.writeSave(compress=False)
+
+    def writeSave(self, compress):
+        stream = StringIO()
+        savegame.writeSave(stream, self.game_state, self.agents.iteritems(),
+                           self.items, compress)
+        return stream.getvalue()
+
+    def testRoundTrip(self):
+        for data in (self.data, self.writeSave(compress=True)):
+            stream = StringIO(data)
+            self.assertTrue(savegame.isSaveFile(stream))
+            reader = savegame.SaveReader(stream)
+            self.assertEqual(reader.readAll(),
+                             {"Agents": self.agents, "Items": self.items,
+                              "GameState": self.game_state})
+
+    def testReadSingleMap(self):
+        for data in (self.data, self.writeSave(compress=True)):
+            reader = savegame.SaveReader(StringIO(data))
+            self.assertEqual(sorted(reader.getMapNames()),
+                             ["All", "Farm", "Mall"])
+            self.assertEqual(reader.readMap("Farm"), self.agents["Farm"])
+            self.assertEqual(reader.readMap("Mall"), self.agents["Mall"])
+            self.assertEqual(reader.readMap("Beach"), {})
+
+    def testDeltaSave(self):
+        pristine_maps = {"Mall": {"barrel": {"Entity": {"lockable": {
+                                                 "locked": True}},
+                                             "Rotation": 90}},
+                         "Farm": dict(self.agents["Farm"])}
+        stream = StringIO()
+        maps = savegame.iterMapChanges(self.agents.iteritems(),
+                                       pristine_maps)
+        savegame.writeSave(stream, self.game_state, maps, self.items,
+                           delta=True)
+        reader = savegame.SaveReader(StringIO(stream.getvalue()))
+        self.assertTrue(reader.delta)
+        self.assertEqual(sorted(reader.getMapNames()), ["All", "Mall"])
+        mall = delta.apply(pristine_maps["Mall"], reader.readMap("Mall"))
+        self.assertEqual(mall, self.agents["Mall"])
+        self.assertTrue(reader.readAll()["Delta"])
+
+    def testInvalidFiles(self):
+        self.assertFalse(savegame.isSaveFile(StringIO("Agents: {}\n")))
+        self.assertRaises(savegame.SaveFormatError, savegame.SaveReader,
+                          StringIO(self.data[:-10]))
+        self.assertRaises(savegame.SaveFormatError, savegame.SaveReader,
+                          StringIO(self.data[:8] + "\xff" + self.data[9:]))
+        self.assertRaises(savegame.SaveFormatError,
+                          savegame.SaveWriter(StringIO()).writeItems,
+                          {"beer": object()})
+
+    def testValueEncoding(self):
+        value = {"none": None, "bools": [True, False], "int": -3,
+                 "big": 2 ** 70, "float": 0.5, u"unicode": u"\u00e9",
+                 "tuple": (1, (2,)), "sets": (set([1]), frozenset(["a"]))}
+        data = savegame.dumpValue(value)
+        self.assertEqual(savegame.loadValue(data), value)
+        self.assertEqual(type(savegame.loadValue(data)["bools"][0]), bool)
+        for damaged in (data[:-1], data + "N", "?", "[\xff\xff\xff\xff",
+                        "{\x01\x00\x00\x00[\x00\x00\x00\x00N"):
+            self.assertRaises(savegame.SaveFormatError, savegame.loadValue,
+                              damaged)
+        nested = []
+        for depth in xrange(savegame.MAX_DEPTH + 1):
+            nested = [nested]
+        self.assertRaises(savegame.SaveFormatError, savegame.dumpValue,
+                          nested)
+        self.assertRaises(savegame.SaveFormatError, savegame.loadValue,
+                          "[\x01\x00\x00\x00" * 100 + "N")
+
+class TestSavedMaps(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.pristine_maps = {
+            "All": {"PlayerCharacter": {"Map": "Mall"}},
+            "Mall": {"barrel": {"Rotation": 90}},
+            "Farm": {"cow": {"Position": (5.0, 6.0, 0.0)}},
+        }
+        self.agents = {
+            "All": {"PlayerCharacter": {"Map": "Mall"}},
+            "Mall": {"barrel": {"Rotation": 90}},
+            "Farm": {"cow": {"Position": (7.0, 6.0, 0.0)}},
+        }
+        self.game_state = {"CurrentMap": "Mall", "NPCsMet": set(),
+                           "locals": {}, "Quests": {"Variables": {}}}
+        self.pristine_reads = []
+
+    def getPristineAgents(self, map_name):
+        self.pristine_reads.append(map_name)
+        return self.pristine_maps.get(map_name, {})
+
+    def writeDeltaSave(self):
+        stream = StringIO()
+        maps = savegame.iterMapChanges(self.agents.iteritems(),
+                                       self.pristine_maps)
+        savegame.writeSave(stream, self.game_state, maps, {}, delta=True)
+        return savegame.SaveReader(StringIO(stream.getvalue()))
+
+    def testUnchangedCurrentMap(self):
+        reader = self.writeDeltaSave()
+        self.assertEqual(reader.getMapNames(), ["Farm"])
+        saved_maps = savegame.SavedMaps(self.getPristineAgents,
+                                        reader=reader, is_delta=True)
+        self.assertEqual(saved_maps.restore("All"), self.agents["All"])
+        self.assertEqual(saved_maps.restore("Mall"), self.agents["Mall"])
+        self.assertFalse(saved_maps.isSaved("Mall"))
+        self.assertTrue(saved_maps.isSaved("Farm"))
+        self.assertEqual(saved_maps.pop("Beach"), None)
+        self.assertEqual(saved_maps.pop("Farm"), self.agents["Farm"])
+        # The original agents are copied, not changed
+        self.assertEqual(self.pristine_maps["Farm"]["cow"]["Position"],
+                         (5.0, 6.0, 0.0))
+
+    def testDecodedSections(self):
+        stream = StringIO()
+        savegame.writeSave(stream, self.game_state, self.agents.iteritems(),
+                           {})
+        reader = savegame.SaveReader(StringIO(stream.getvalue()))
+        decoded = []
+        read_map = reader.readMap
+        def readMap(map_name):
+            decoded.append(map_name)
+            return read_map(map_name)
+        reader.readMap = readMap
+        saved_maps = savegame.SavedMaps(self.getPristineAgents,
+                                        reader=reader)
+        for map_name in ("All", "Mall"):
+            saved_maps.restore(map_name)
+        self.assertTrue(saved_maps.isNameUsed("cow"))
+        self.assertFalse(saved_maps.isNameUsed("barrel"))
+        self.assertEqual(decoded, ["All", "Mall"])
+        self.assertEqual(sorted(saved_maps.pop("Farm")), ["cow"])
+        self.assertEqual(decoded, ["All", "Mall", "Farm"])
+
+    def testDeltaAgentNames(self):
+        reader = self.writeDeltaSave()
+        self.assertEqual(reader.getAgentNames("Farm"), ("cow",))
+        self.assertEqual(reader.getAgentNames("Mall"), ())
+
+    def testFullSave(self):
+        saved_maps = savegame.SavedMaps(self.getPristineAgents, self.agents)
+        self.assertEqual(saved_maps.restore("Mall"), self.agents["Mall"])
+        self.assertEqual(saved_maps.restore("Beach"), None)
+        saved_maps.readAll()
+        self.assertEqual(sorted(saved_maps.agents), ["All", "Farm"])
+        self.assertEqual(self.pristine_reads, [])
+
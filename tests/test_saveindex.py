@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+import unittest
+
+from parpg import savegame
+from parpg.saveindex import SaveIndex, formatMetadata
+
+class TestSaveIndex(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.save_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.save_dir)
+
+    def writeSave(self, filename, metadata):
+        game_state = {"CurrentMap": metadata["Map"], "NPCsMet": set(),
+                      "locals": {}, "Quests": {"Variables": {}}}
+        with open(os.path.join(self.save_dir, filename), "wb") as stream:
+            savegame.writeSave(stream, game_state, [], {}, compress=True,
+                               metadata=metadata)
+
+    def testIndex(self):
+        metadata = {"Map": "Mall", "Character": "Bob", "PlayTime": 3720.0}
+        self.writeSave("first.dat", metadata)
+        save_index = SaveIndex(self.save_dir)
+        save_index.update("first.dat", metadata)
+        save_index.write()
+        # The index is used without reading the save
+        save_index = SaveIndex(self.save_dir)
+        save_index.readMetadata = None
+        self.assertEqual(save_index.getMetadata("first.dat"), metadata)
+        self.assertEqual(save_index.getMetadata("missing.dat"), None)
+
+    def testSavesNotInIndex(self):
+        self.writeSave("autosave_1.dat", {"Map": "Farm"})
+        with open(os.path.join(self.save_dir, "old.yaml"), "w") as stream:
+            stream.write("Agents: {}\n")
+        save_index = SaveIndex(self.save_dir)
+        self.assertEqual(save_index.getMetadata("autosave_1.dat"),
+                         {"Map": "Farm"})
+        self.assertEqual(save_index.getMetadata("old.yaml"), None)
+        save_index.write()
+        self.assertEqual(SaveIndex(self.save_dir).entries,
+                         save_index.entries)
+
+    def testFormat(self):
+        self.assertEqual(formatMetadata(None), u"")
+        self.assertEqual(formatMetadata({"Map": "Mall", "Character": "Bob",
+                                         "PlayTime": 3720.0}),
+                         u"Mall, Bob, 1:02")
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from types import CodeType
+
+from parpg.systems import ScriptingSystem
+from parpg.gamestate import ObservedDict
+
+class TestScriptingSystem(unittest.TestCase):
+    class GameState(object):
+        """Minimal game state providing the scripting environment"""
+        
+        CONSTANT_FUNCS = ("__builtins__", "str")
+        TRACKED_FUNCS = ()
+
+        def __init__(self):
+            self.funcs = {"__builtins__": None, "str": str, 
+                          "counter": self.counter}
+            self.changed_names = set()
+            self.locals = ObservedDict(self.changed_names.add)
+            self.calls = 0
+
+        def counter(self):
+            self.calls += 1
+            return self.calls
+
+        def getGameEnvironment(self):
+            return self.funcs, self.locals
+
+        def hasObject(self, object_id):
+            return False
+
+        def popChanges(self):
+            changes = (set(self.changed_names), False, False)
+            self.changed_names.clear()
+            return changes
+
+    class Action(object):
+        """Action that records its arguments"""
+
+        performed = []
+
+        def __init__(self, world, *args):
+            self.args = args
+            self.executed = False
+
+        def execute(self):
+            self.performed.append(self.args)
+            self.executed = True
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.Action.performed = []
+        self.scripting = ScriptingSystem({}, {"Record": self.Action})
+        self.scripting.world = None
+        self.scripting.game_state = self.GameState()
+
+    def tearDown(self):
+        self.scripting = None
+
+    def testCompileCache(self):
+        self.scripting.addCondition("value > 1", "script")
+        self.scripting.addCondition("value > 1", "other_script")
+        self.assertEqual(self.scripting.compile_misses, 1)
+        self.assertEqual(self.scripting.compile_hits, 1)
+        self.scripting.setScript("script", [["Record", "value, 2", 0]])
+        self.assertEqual(self.scripting.compile_misses, 2)
+        code, script_name = self.scripting.conditions[0]
+        self.assertTrue(isinstance(code, CodeType))
+        self.assertTrue(code is self.scripting.conditions[1][0])
+
+    def testConditionStartsScript(self):
+        self.scripting.setScript("script", [["Record", "value, 2", 0]])
+        self.scripting.addCondition("value > 1", "script")
+        self.scripting.game_state.locals["value"] = 1
+        self.scripting.step(1)
+        self.assertEqual(self.Action.performed, [])
+        self.scripting.game_state.locals["value"] = 5
+        self.scripting.step(1)
+        self.assertEqual(self.Action.performed, [(5, 2)])
+
+    def testConditionOnlyEvaluatedOnChange(self):
+        self.scripting.setScript("script", [["Record", "value", 0]])
+        self.scripting.addCondition("str(value) == '3'", "script")
+        self.scripting.game_state.locals["value"] = 1
+        self.scripting.step(1)
+        self.assertEqual(self.scripting.dirty_conditions, set())
+        self.assertEqual(self.scripting.getConditionsToEvaluate(), [])
+        self.scripting.game_state.locals["other"] = 3
+        self.assertEqual(self.scripting.getConditionsToEvaluate(), [])
+        self.scripting.game_state.locals["value"] = 3
+        self.assertEqual(self.scripting.getConditionsToEvaluate(), [0])
+
+    def testConditionStaysTrue(self):
+        performed = []
+        for track_conditions in (True, False):
+            self.setUp()
+            self.scripting.track_conditions = track_conditions
+            self.scripting.setScript("script", [["Record", "value", 0]])
+            self.scripting.addCondition("value > 1", "script")
+            self.scripting.game_state.locals["value"] = 5
+            for i in xrange(6):
+                self.scripting.step(1)
+            performed.append(list(self.Action.performed))
+        self.assertEqual(performed[0], [(5,)] * 6)
+        self.assertEqual(performed[0], performed[1])
+
+    def testUntrackedConditionIsPolled(self):
+        self.scripting.setScript("script", [["Record", "1", 0]])
+        self.scripting.addCondition("counter() > 2", "script")
+        self.assertEqual(self.scripting.polled_conditions, [0])
+        for i in xrange(3):
+            self.scripting.step(1)
+        self.assertEqual(self.scripting.game_state.calls, 3)
+        self.assertEqual(self.Action.performed, [(1,)])
+
+    def testWaitDelaysNextAction(self):
+        self.scripting.setScript("script", [["Record", "1", 3], 
+                                            ["Record", "2", 0]])
+        self.scripting.runScript("script")
+        self.scripting.step(1)
+        self.assertEqual(self.Action.performed, [(1,)])
+        self.scripting.step(1)
+        self.scripting.step(1)
+        self.assertEqual(self.Action.performed, [(1,)])
+        self.scripting.step(1)
+        self.assertEqual(self.Action.performed, [(1,), (2,)])
+        self.assertEqual(self.scripting.getScriptTimings()[0][:2], 
+                         ("script", 2))
+
+    def testScriptRunsAgainAfterReset(self):
+        self.scripting.setScript("script", [["Record", "1", 0]])
+        script = self.scripting.scripts["script"]
+        program = script.program
+        for i in xrange(2):
+            self.scripting.runScript("script")
+            self.scripting.step(1)
+            self.scripting.step(1)
+            self.assertFalse(script.running)
+        self.assertEqual(self.Action.performed, [(1,), (1,)])
+        self.assertTrue(script.program is program)
+        self.assertEqual(script.pc, 0)
+
+    def testFrameBudgetCarriesOver(self):
+        self.scripting.frame_budget = 1e-9
+        self.scripting.setScript("first", [["Record", "1", 0]])
+        self.scripting.setScript("second", [["Record", "2", 0]])
+        self.scripting.runScript("first")
+        self.scripting.runScript("second")
+        self.scripting.step(1)
+        self.assertEqual(self.Action.performed, [(1,)])
+        self.scripting.step(1)
+        self.assertEqual(self.Action.performed, [(1,), (2,)])
+
+    def testInvalidExpression(self):
+        self.assertRaises(SyntaxError, self.scripting.addCondition,
+                          "value >", "script")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+import threading
+import unittest
+
+from parpg.startuploader import StartupLoader
+
+class TestStartupLoader(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.merged = []
+        self.main_thread = threading.current_thread()
+
+    def merge(self, name):
+        def mergeResult(result):
+            self.assertTrue(threading.current_thread() is self.main_thread)
+            self.merged.append((name, result))
+        return mergeResult
+
+    def createLoader(self, worker_count=2):
+        loader = StartupLoader(worker_count)
+        loader.addStage("maps", lambda: ["Mall"], self.merge("maps"))
+        loader.addStage("files", lambda: ["a.yaml", "b.yaml"],
+                        essential=False, threaded=False)
+        loader.addStage("dialogues", 
+                        lambda files: [name[0] for name in files],
+                        self.merge("dialogues"), requires=("files",),
+                        essential=False)
+        return loader
+
+    def testStages(self):
+        for worker_count in (0, 2):
+            self.merged = []
+            loader = self.createLoader(worker_count)
+            loader.start()
+            loader.finish(essential_only=True)
+            self.assertTrue(loader.isFinished(essential_only=True))
+            self.assertTrue(("maps", ["Mall"]) in self.merged)
+            loader.finish()
+            self.assertEqual(sorted(self.merged),
+                             [("dialogues", ["a", "b"]), ("maps", ["Mall"])])
+            self.assertEqual([row[0] for row in loader.getTimings()],
+                             ["maps", "files", "dialogues"])
+
+    def testDeferredStages(self):
+        for worker_count in (0, 2):
+            loaded = []
+            def load(name):
+                def loadStage():
+                    loaded.append(name)
+                return loadStage
+            loader = StartupLoader(worker_count)
+            loader.addStage("maps", load("maps"))
+            loader.addStage("quests", load("quests"), essential=False,
+                            threaded=False)
+            loader.addStage("files", load("files"), essential=False,
+                            threaded=False)
+            loader.start()
+            loader.finish(essential_only=True)
+            self.assertEqual(loaded, ["maps"])
+            # One deferred stage is loaded per pump
+            self.assertFalse(loader.pump())
+            self.assertEqual(loaded, ["maps", "quests"])
+            self.assertTrue(loader.pump())
+            self.assertEqual(loaded, ["maps", "quests", "files"])
+
+    def testFailedStage(self):
+        loader = StartupLoader()
+        loader.addStage("maps", lambda: 1 / 0, self.merge("maps"))
+        loader.start()
+        self.assertRaises(RuntimeError, loader.finish)
+        self.assertEqual(self.merged, [])
+
+    def testInvalidGraph(self):
+        loader = self.createLoader()
+        loader.addStage("quests", lambda files: None, requires=("quests",))
+        self.assertRaises(ValueError, loader.start)
+        loader = self.createLoader()
+        loader.addStage("agents", lambda files: None, requires=("files",))
+        self.assertRaises(ValueError, loader.start)
+        self.assertRaises(ValueError, loader.addStage, "maps", None)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+
+from parpg import vfs
+from parpg.common import utils
+
+class CountingVFS(object):
+    def __init__(self, tree):
+        self.tree = tree
+        self.calls = 0
+
+    def getDirectory(self, path):
+        self.calls += 1
+        directory = self.tree
+        for name in path.split("/")[1:]:
+            directory = directory[name]
+        return directory
+
+    def listFiles(self, path):
+        return [name for name, value in self.getDirectory(path).iteritems()
+                if value is None]
+
+    def listDirectories(self, path):
+        return [name for name, value in self.getDirectory(path).iteritems()
+                if value is not None]
+
+class TestLocateFiles(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.old_vfs = vfs.VFS
+        vfs.VFS = CountingVFS({"intro.yaml": None, "notes.txt": None,
+                               "npcs": {"bob.yaml": None, "bob.yml": None,
+                                        "old": {}}})
+        utils.invalidateFiles()
+
+    def tearDown(self):
+        vfs.VFS = self.old_vfs
+        utils.invalidateFiles()
+
+    def testCachedListings(self):
+        self.assertEqual(sorted(utils.locateFiles("*.yaml", "data")),
+                         ["data/intro.yaml", "data/npcs/bob.yaml"])
+        self.assertEqual(vfs.VFS.calls, 6)
+        self.assertEqual(utils.locateFiles("*.yml", "data/npcs"),
+                         ["data/npcs/bob.yml"])
+        self.assertEqual(sorted(utils.locateFiles(["*.yaml", "*.txt"],
+                                                  "data")),
+                         ["data/intro.yaml", "data/notes.txt",
+                          "data/npcs/bob.yaml"])
+        self.assertEqual(vfs.VFS.calls, 6)
+
+    def testInvalidate(self):
+        utils.locateFiles("*.yaml", "data")
+        vfs.VFS.tree["npcs"]["alice.yaml"] = None
+        self.assertEqual(len(utils.locateFiles("*.yaml", "data")), 2)
+        utils.invalidateFiles("data/npcs")
+        self.assertEqual(len(utils.locateFiles("*.yaml", "data")), 3)
+        self.assertEqual(vfs.VFS.calls, 10)
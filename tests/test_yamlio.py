@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+# This file is part of PARPG.
+#
+# PARPG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PARPG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with PARPG.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import yaml
+
+from parpg import yamlio
+
+class TestYamlIO(unittest.TestCase):
+    def testRoundTrip(self):
+        data = {"Position": (1.0, 2.5, 0.0), "NPCsMet": set(["bob"]),
+                "Agents": [{"name": "barrel", "locked": True}]}
+        self.assertEqual(yamlio.load(yamlio.dump(data)), data)
+
+    def testOldSaves(self):
+        saved = yaml.dump({"Position": (1, 2)}, Dumper=yaml.Dumper)
+        self.assertEqual(yamlio.load(saved), {"Position": (1, 2)})
+
+    def testLoadAll(self):
+        self.assertEqual(list(yamlio.load_all("a: 1\n---\nb: 2\n")),
+                         [{"a": 1}, {"b": 2}])
+
+    def testUnsafeTags(self):
+        self.assertRaises(yaml.YAMLError, yamlio.load,
+                          "!!python/object/apply:os.system ['true']")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Analyze the graph of every dialogue in the dialogue bundle of a data
+directory in one run: the size of each dialogue, the depth of its section
+stack and its cycles, and its unreachable sections, sections without
+responses, sections after which it can't end and greetings that go back.
+Without a bundle, the YAML dialogue files are parsed instead."""
+import os.path
+import sys
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                                 os.path.pardir,
+                                                 os.path.pardir)))
+import time
+from optparse import OptionParser
+
+from parpg.dialoguebundle import DialogueBundle, BundleFormatError
+from parpg.dialoguegraph import DialogueGraph
+from compile_dialogues import compileDialogues
+
+def analyzeBundle(bundle):
+    """Analyzes every dialogue of a bundle
+    @param bundle: The bundle
+    @type bundle: L{DialogueBundle}
+    @return: A list of the graphs of the dialogues and the VFS paths of
+    their YAML files"""
+    return [(DialogueGraph(bundle.loadDialogue(source_path)), source_path)
+            for source_path in sorted(bundle.getFiles().itervalues())]
+
+def main():
+    parser = OptionParser(usage='%prog [options] data_dir',
+                          description=__doc__)
+    parser.add_option('-d', '--dialogues', default='dialogue',
+                      help='Directory of the dialogues in the data directory '
+                           '(DialoguesPath), used without a bundle')
+    parser.add_option('-b', '--bundle',
+                      help='Bundle to analyze, by default dialogues.bundle '
+                           'in the data directory (DialogueBundle)')
+    parser.add_option('-q', '--quiet', action='store_true', default=False,
+                      help='Only report the dialogues with problems')
+    opts, args = parser.parse_args()
+    if len(args) != 1:
+        parser.print_help()
+        sys.exit(1)
+
+    data_dir = args[0]
+    bundle_path = opts.bundle or os.path.join(data_dir, 'dialogues.bundle')
+    start_time = time.time()
+    try:
+        bundle = DialogueBundle(bundle_path)
+    except (IOError, BundleFormatError), error:
+        print 'no usable bundle ({0}), parsing the YAML files'.format(error)
+        dialogues, error_count = compileDialogues(data_dir, opts.dialogues)
+        graphs = [(DialogueGraph(dialogue), source_path)
+                  for dialogue, source_path in dialogues]
+    else:
+        graphs = analyzeBundle(bundle)
+        bundle.close()
+        error_count = 0
+    analysis_time = time.time() - start_time
+
+    for graph, source_path in graphs:
+        if graph.getProblems():
+            error_count += 1
+        elif opts.quiet:
+            continue
+        print '{0} ({1})'.format(graph.getReport(), source_path)
+    print 'analyzed {0} dialogues in {1:.1f} ms, {2} with problems'.format(
+        len(graphs), analysis_time * 1000, error_count)
+    if error_count:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare loading the YAML data files of a game data directory without the
+content cache, with an empty cache (cold start) and with a filled cache (warm
+start). Without a data directory, synthetic agent files are generated."""
+import os
+import tempfile
+import shutil
+from optparse import OptionParser
+
+from benchmarking import LocalVFS, measure, printTable
+
+from parpg import vfs, contentcache
+from parpg.common.utils import locateFiles
+
+AGENT_TEMPLATE = """\
+Agent_{0}:
+  Entity:
+    general: {{identifier: Agent_{0}}}
+    description:
+      view_name: Agent {0}
+      real_name: Agent number {0}
+      desc: An agent generated by the benchmark.
+    graphics: {{gfx: barrel}}
+    lockable: {{closed: true, locked: false}}
+  Position: [{0}, {1}, 0]
+  Rotation: 90
+  Map: Mall
+"""
+
+def generateData(data_dir, file_count, agent_count):
+    """Writes file_count agent files with agent_count agents each"""
+    for file_index in xrange(file_count):
+        with open(os.path.join(data_dir, 'agents_%d.yaml' % file_index),
+                  'w') as agents_file:
+            agents_file.write('---\n'.join(
+                AGENT_TEMPLATE.format(agent_index, file_index)
+                for agent_index in xrange(agent_count)))
+
+def loadFiles(filepaths):
+    for filepath in filepaths:
+        contentcache.load_yaml_all(filepath)
+
+def main():
+    parser = OptionParser(usage='%prog [options] [data_dir]',
+                          description=__doc__)
+    parser.add_option('-n', '--files', type='int', default=20,
+                      help='Number of files to generate')
+    parser.add_option('-a', '--agents', type='int', default=50,
+                      help='Number of agents per generated file')
+    opts, args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        if args:
+            data_dir = os.path.abspath(args[0])
+        else:
+            data_dir = os.path.join(temp_dir, 'data')
+            os.mkdir(data_dir)
+            generateData(data_dir, opts.files, opts.agents)
+        cache_dir = os.path.join(temp_dir, 'cache')
+        vfs.VFS = LocalVFS(data_dir)
+        filepaths = [os.path.relpath(path, data_dir) for path in
+                     locateFiles('*.yaml', data_dir)]
+
+        contentcache.CACHE = None
+        uncached = measure(lambda: loadFiles(filepaths))
+        contentcache.CACHE = contentcache.ContentCache(data_dir, cache_dir,
+                                                       rebuild=True)
+        cold = measure(lambda: loadFiles(filepaths))
+        contentcache.CACHE = contentcache.ContentCache(data_dir, cache_dir)
+        warm = measure(lambda: loadFiles(filepaths))
+        cache = contentcache.CACHE
+        print '%d files, %d loaded from the warm cache' % (len(filepaths),
+                                                          cache.hits)
+        printTable(['startup', 'ms', 'speedup'],
+                   [['no cache', '%.1f' % (uncached * 1000), '1.0x'],
+                    ['cold', '%.1f' % (cold * 1000),
+                     '%.1fx' % (uncached / cold)],
+                    ['warm', '%.1f' % (warm * 1000),
+                     '%.1fx' % (uncached / warm)]])
+    finally:
+        contentcache.CACHE = None
+        shutil.rmtree(temp_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare a scripted traversal of every dialogue, which picks the greeting
+and the valid responses of every reachable section, when the conditions are
+evaluated from their strings and from the code compiled at load time.
+Without a dialogue directory, synthetic dialogues are generated."""
+import os
+import fnmatch
+import __builtin__
+from optparse import OptionParser
+from StringIO import StringIO
+
+from benchmarking import measure, printTable
+
+from parpg.dialogueparsers import YamlDialogueParser
+from parpg.dialogueprocessor import DialogueProcessor
+
+SECTION_TEMPLATE = """\
+-   ID: section_{0}
+    SAY: "Section {0}."
+    RESPONSES:
+{1}"""
+
+RESPONSE_TEMPLATE = """\
+    -   REPLY: "Response {0}."
+        CONDITION: "money >= {1} and 'flag_{0}' not in flags or met > {2}"
+        GOTO: {3}
+"""
+
+GREETING_TEMPLATE = """\
+-   ID: greeting_{0}
+    CONDITION: "met == {0} and money > {0}"
+    SAY: "Greeting {0}."
+    RESPONSES:
+    -   REPLY: "Go on."
+        GOTO: section_0
+"""
+
+DIALOGUE_TEMPLATE = """\
+NPC_NAME: npc_{0}
+AVATAR_PATH: gui/portraits/npc_{0}.png
+DEFAULT_GREETING:
+    ID: default
+    SAY: "Hello."
+    RESPONSES:
+    -   REPLY: "Go on."
+        GOTO: section_0
+GREETINGS:
+{1}SECTIONS:
+{2}"""
+
+def generateDialogue(index, section_count, response_count, greeting_count):
+    """Returns the YAML of a synthetic dialogue"""
+    sections = []
+    for section in xrange(section_count):
+        responses = []
+        for response in xrange(response_count):
+            next_section = section + response + 1
+            responses.append(RESPONSE_TEMPLATE.format(
+                response, response * 10, section,
+                'section_%d' % next_section if next_section < section_count
+                else 'end'))
+        sections.append(SECTION_TEMPLATE.format(section, ''.join(responses)))
+    greetings = ''.join(GREETING_TEMPLATE.format(greeting)
+                        for greeting in xrange(greeting_count))
+    return DIALOGUE_TEMPLATE.format(index, greetings, ''.join(sections))
+
+class Anything(object):
+    """Stands in for the game state objects that the conditions of real
+    dialogues use; every attribute, call and comparison succeeds"""
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __contains__(self, item):
+        return True
+
+    def __cmp__(self, other):
+        return 0
+
+def createGameState(dialogues):
+    """Returns a game state that defines every name the conditions use"""
+    game_state = {'money': 25, 'met': 1, 'flags': set(['flag_1'])}
+    for dialogue in dialogues:
+        for section in dialogue.sections.itervalues():
+            nodes = list(section.responses)
+            if hasattr(section, 'compiled_condition'):
+                nodes.append(section)
+            for node in nodes:
+                if node.compiled_condition is None:
+                    continue
+                for name in node.compiled_condition.co_names:
+                    if (name not in game_state and
+                        not hasattr(__builtin__, name)):
+                        game_state[name] = Anything()
+    return game_state
+
+class StringEvalProcessor(DialogueProcessor):
+    """Evaluates the conditions the way DialogueProcessor did before they
+    were compiled at load time"""
+
+    def getDialogueGreeting(self):
+        dialogue_greeting = None
+        for greeting in self.dialogue.greetings:
+            if eval(greeting.condition, self.game_state):
+                dialogue_greeting = greeting
+        return dialogue_greeting or self.dialogue.default_greeting
+
+    def getValidResponses(self, dialogue_section):
+        return [response for response in dialogue_section.responses
+                if response.condition is None or
+                eval(response.condition, self.game_state)]
+
+def traverse(processor_class, dialogues, game_state):
+    """Picks the greeting of every dialogue and the valid responses of every
+    section reachable from it, without running the actions
+    @return: The number of visited sections"""
+    visited_count = 0
+    for dialogue in dialogues:
+        processor = processor_class(dialogue, game_state)
+        start = processor.getDialogueGreeting()
+        visited = set([start.id])
+        sections = [start]
+        while sections:
+            section = sections.pop()
+            for response in processor.getValidResponses(section):
+                next_id = response.next_section_id
+                if next_id in ('end', 'back') or next_id in visited:
+                    continue
+                visited.add(next_id)
+                sections.append(dialogue.sections[next_id])
+        visited_count += len(visited)
+    return visited_count
+
+def readDialogues(dialogue_dir):
+    """Parses the YAML files in and below a directory"""
+    parser = YamlDialogueParser()
+    dialogues = []
+    for root, dirs, files in os.walk(dialogue_dir):
+        for filename in sorted(fnmatch.filter(files, '*.yaml')):
+            with open(os.path.join(root, filename)) as stream:
+                dialogues.append(parser.load(stream))
+    return dialogues
+
+def main():
+    parser = OptionParser(usage='%prog [options] [dialogue_dir]',
+                          description=__doc__)
+    parser.add_option('-d', '--dialogues', type='int', default=20,
+                      help='Number of dialogues to generate')
+    parser.add_option('-s', '--sections', type='int', default=30,
+                      help='Number of sections per generated dialogue')
+    parser.add_option('-r', '--responses', type='int', default=4,
+                      help='Number of responses per generated section')
+    parser.add_option('-g', '--greetings', type='int', default=5,
+                      help='Number of greetings per generated dialogue')
+    parser.add_option('-n', '--traversals', type='int', default=100,
+                      help='Number of traversals of all dialogues')
+    opts, args = parser.parse_args()
+
+    if args:
+        dialogues = readDialogues(args[0])
+    else:
+        dialogue_parser = YamlDialogueParser()
+        dialogues = [dialogue_parser.load(StringIO(generateDialogue(
+                         index, opts.sections, opts.responses,
+                         opts.greetings)))
+                     for index in xrange(opts.dialogues)]
+    game_state = createGameState(dialogues)
+
+    def run(processor_class):
+        for traversal in xrange(opts.traversals):
+            traverse(processor_class, dialogues, game_state)
+
+    visited = traverse(DialogueProcessor, dialogues, game_state)
+    assert visited == traverse(StringEvalProcessor, dialogues, game_state)
+    strings = measure(lambda: run(StringEvalProcessor), 3)
+    compiled = measure(lambda: run(DialogueProcessor), 3)
+    print '%d dialogues, %d sections visited per traversal' % (
+        len(dialogues), visited)
+    printTable(['conditions', 'ms', 'speedup'],
+               [['strings', '%.1f' % (strings * 1000), '1.0x'],
+                ['compiled', '%.1f' % (compiled * 1000),
+                 '%.1fx' % (strings / compiled)]])
+
+if __name__ == '__main__':
+    main()
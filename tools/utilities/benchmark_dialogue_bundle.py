@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare loading every dialogue by parsing the YAML files with decoding it
+from a dialogue bundle, once only the greetings that starting a dialogue
+needs and once with all sections. Without a data directory, synthetic
+dialogues are generated."""
+import os
+import tempfile
+import shutil
+from optparse import OptionParser
+
+from benchmarking import measure, printTable
+from benchmark_dialogue import generateDialogue
+from compile_dialogues import compileDialogues, findDialogueFiles
+
+from parpg.dialogueparsers import YamlDialogueParser
+from parpg.dialoguebundle import DialogueBundle, writeBundle
+
+def generateData(data_dir, dialogue_count, section_count, response_count,
+                 greeting_count):
+    """Writes dialogue_count synthetic dialogue files"""
+    dialogue_dir = os.path.join(data_dir, 'dialogue')
+    os.makedirs(dialogue_dir)
+    for index in xrange(dialogue_count):
+        with open(os.path.join(dialogue_dir, 'npc_%d.yaml' % index),
+                  'w') as dialogue_file:
+            dialogue_file.write(generateDialogue(index, section_count,
+                                                 response_count,
+                                                 greeting_count))
+
+def parseAll(data_dir, filepaths):
+    parser = YamlDialogueParser()
+    for filepath in filepaths:
+        with open(os.path.join(data_dir, filepath)) as dialogue_file:
+            parser.load(dialogue_file)
+
+def decodeAll(bundle_path, all_sections):
+    bundle = DialogueBundle(bundle_path)
+    for filepath in bundle.getFiles().itervalues():
+        dialogue = bundle.loadDialogue(filepath)
+        if all_sections:
+            for section_id in dialogue.sections:
+                dialogue.sections[section_id]
+    bundle.close()
+
+def main():
+    parser = OptionParser(usage='%prog [options] [data_dir]',
+                          description=__doc__)
+    parser.add_option('-d', '--dialogues', type='int', default=20,
+                      help='Number of dialogues to generate')
+    parser.add_option('-s', '--sections', type='int', default=30,
+                      help='Number of sections per generated dialogue')
+    parser.add_option('-r', '--responses', type='int', default=4,
+                      help='Number of responses per generated section')
+    parser.add_option('-g', '--greetings', type='int', default=5,
+                      help='Number of greetings per generated dialogue')
+    opts, args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        if args:
+            data_dir = os.path.abspath(args[0])
+        else:
+            data_dir = os.path.join(temp_dir, 'data')
+            generateData(data_dir, opts.dialogues, opts.sections,
+                         opts.responses, opts.greetings)
+        filepaths = findDialogueFiles(data_dir, 'dialogue')
+        dialogues, error_count = compileDialogues(data_dir, 'dialogue')
+        bundle_path = os.path.join(temp_dir, 'dialogues.bundle')
+        with open(bundle_path, 'wb') as bundle_file:
+            writeBundle(bundle_file, dialogues)
+
+        parsed = measure(lambda: parseAll(data_dir, filepaths), 3)
+        greetings = measure(lambda: decodeAll(bundle_path, False), 3)
+        decoded = measure(lambda: decodeAll(bundle_path, True), 3)
+        print '%d dialogues, bundle of %d bytes' % (
+            len(dialogues), os.path.getsize(bundle_path))
+        printTable(['load', 'ms', 'speedup'],
+                   [['parse YAML', '%.1f' % (parsed * 1000), '1.0x'],
+                    ['bundle, greetings', '%.1f' % (greetings * 1000),
+                     '%.1fx' % (parsed / greetings)],
+                    ['bundle, all sections', '%.1f' % (decoded * 1000),
+                     '%.1fx' % (parsed / decoded)]])
+    finally:
+        shutil.rmtree(temp_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare dumping a large dialogue with the streaming YAML dumper and with
+the former implementation, which serialized the whole dialogue into a buffer
+and then formatted it with regular expressions, and check that both write
+the same bytes. Without a dialogue file, a synthetic dialogue is
+generated."""
+import re
+import textwrap
+from optparse import OptionParser
+from cStringIO import StringIO
+
+from benchmarking import measure, printTable
+from benchmark_dialogue import generateDialogue
+
+from parpg import COPYRIGHT_HEADER, yamlio
+from parpg.dialogueparsers import YamlDialogueParser
+
+LONG_TEXT = (" This sentence makes the line long enough to be wrapped by the"
+             " dumper, like the longer speeches of the game.")
+
+class CountingStream(object):
+    """Stream that only counts what is written to it"""
+    def __init__(self):
+        self.size = 0
+        self.largest_write = 0
+
+    def write(self, data):
+        self.size += len(data)
+        self.largest_write = max(self.largest_write, len(data))
+
+def representDialogue(parser, dumper, dialogue):
+    """Represents the whole dialogue as one node"""
+    dialogue_node = dumper.represent_dict({})
+    greeting_ids = set(greeting.id for greeting in dialogue.greetings)
+    greeting_ids.add(dialogue.default_greeting.id)
+    items = [
+        ('NPC_NAME', dumper.represent_data(dialogue.npc_name)),
+        ('AVATAR_PATH', dumper.represent_data(dialogue.avatar_path)),
+        ('DEFAULT_GREETING',
+         parser._representDialogueSection(dumper, dialogue.default_greeting)),
+    ]
+    if dialogue.greetings:
+        greetings_node = dumper.represent_list([])
+        greetings_node.value.extend(
+            parser._representRootDialogueSection(dumper, greeting)
+            for greeting in dialogue.greetings)
+        items.append(('GREETINGS', greetings_node))
+    sections = [section for section_id, section in dialogue.sections.items()
+                if section_id not in greeting_ids]
+    if sections:
+        sections_node = dumper.represent_list([])
+        sections_node.value.extend(
+            parser._representDialogueSection(dumper, section)
+            for section in sections)
+        items.append(('SECTIONS', sections_node))
+    for key, value_node in items:
+        dialogue_node.value.append((dumper.represent_data(key), value_node))
+    return dialogue_node
+
+def bufferedDump(parser, dialogue, output_stream):
+    """The former YamlDialogueParser.dump"""
+    intermediate_stream = StringIO()
+    dumper = yamlio.Dumper(intermediate_stream, default_flow_style=False,
+                           indent=4, width=99999, line_break='\n',
+                           allow_unicode=True, explicit_start=True,
+                           explicit_end=True, tags=False)
+    dialogue_node = representDialogue(parser, dumper, dialogue)
+    dumper.open()
+    dumper.serialize(dialogue_node)
+    dumper.close()
+    file_contents = intermediate_stream.getvalue()
+
+    file_contents = re.sub(r'(\n|\r|\r\n)(\s*)(GOTO: .*)', r'\1\2\3\1\2',
+                           file_contents)
+    lines = file_contents.splitlines()
+    max_line_length = 76
+    for i in range(len(lines)):
+        line = lines[i]
+        match = re.match(
+            r'^(\s*(?:-\s+)?)(SAY|REPLY|CONDITION):\s+"(.*)"$',
+            line
+        )
+        if (match and len(line) > max_line_length):
+            initial_indent = len(match.group(1))
+            subsequent_indent = initial_indent + 4
+            text_wrapper = textwrap.TextWrapper(
+                max_line_length,
+                subsequent_indent=' ' * subsequent_indent,
+                break_long_words=False,
+                break_on_hyphens=False
+            )
+            new_lines = text_wrapper.wrap(line)
+            new_lines = (
+                new_lines[:1] + [re.sub(r'^(\s*) (.*)$', r'\1\ \2', l)
+                                 for l in new_lines[1:]]
+            )
+            lines[i] = '\\\n'.join(new_lines)
+
+    output_stream.write(COPYRIGHT_HEADER)
+    output_stream.write('\n'.join(lines))
+
+def main():
+    parser = OptionParser(usage='%prog [options] [dialogue_file]',
+                          description=__doc__)
+    parser.add_option('-s', '--sections', type='int', default=2000,
+                      help='Number of sections of the generated dialogue')
+    parser.add_option('-r', '--responses', type='int', default=4,
+                      help='Number of responses per generated section')
+    parser.add_option('-g', '--greetings', type='int', default=20,
+                      help='Number of greetings of the generated dialogue')
+    opts, args = parser.parse_args()
+
+    dialogue_parser = YamlDialogueParser()
+    if args:
+        with open(args[0]) as dialogue_file:
+            dialogue = dialogue_parser.load(dialogue_file)
+    else:
+        dialogue = dialogue_parser.load(StringIO(generateDialogue(
+            0, opts.sections, opts.responses, opts.greetings)))
+        for section in dialogue.sections.itervalues():
+            section.text += LONG_TEXT
+
+    buffered_output = StringIO()
+    bufferedDump(dialogue_parser, dialogue, buffered_output)
+    streamed_output = StringIO()
+    dialogue_parser.dump(dialogue, streamed_output)
+    if buffered_output.getvalue() != streamed_output.getvalue():
+        raise SystemExit('the dumps differ')
+
+    buffered_stream = CountingStream()
+    streamed_stream = CountingStream()
+    buffered = measure(lambda: bufferedDump(dialogue_parser, dialogue,
+                                            buffered_stream), 3)
+    streamed = measure(lambda: dialogue_parser.dump(dialogue,
+                                                    streamed_stream), 3)
+    size = len(streamed_output.getvalue())
+    print '%d sections, %d bytes of YAML, identical dumps' % (
+        len(dialogue.sections), size)
+    printTable(['dump', 'ms', 'MB/s', 'largest write', 'speedup'],
+               [['buffered', '%.1f' % (buffered * 1000),
+                 '%.2f' % (size / buffered / 1e6),
+                 buffered_stream.largest_write, '1.0x'],
+                ['streaming', '%.1f' % (streamed * 1000),
+                 '%.2f' % (size / streamed / 1e6),
+                 streamed_stream.largest_write,
+                 '%.1fx' % (buffered / streamed)]])
+
+if __name__ == '__main__':
+    main()
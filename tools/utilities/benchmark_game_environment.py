@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare the per-frame cost of the persistent game environment with
+building the environment dictionary on every call."""
+import tempfile
+import shutil
+from optparse import OptionParser
+
+from benchmarking import LocalVFS, measure, printTable
+
+from parpg import vfs
+from parpg.gamestate import GameState
+
+def copyEnvironment(game_state):
+    """The game environment as it was built before it was made persistent"""
+    globals = {}
+    globals.update(game_state.funcs)
+    globals.update(game_state.getObjectDictOfMap(game_state.current_map_name))
+    return globals, game_state.locals
+
+def simulateFrames(get_environment, conditions, frames):
+    for frame in xrange(frames):
+        for condition in conditions:
+            eval(condition, *get_environment())
+
+def main():
+    parser = OptionParser(description=__doc__)
+    parser.add_option('-c', '--conditions', type='int', default=20,
+                      help='Conditions evaluated per frame')
+    parser.add_option('-f', '--frames', type='int', default=100,
+                      help='Number of frames to simulate')
+    opts, args = parser.parse_args()
+
+    quests_dir = tempfile.mkdtemp()
+    try:
+        vfs.VFS = LocalVFS(quests_dir)
+        rows = []
+        for object_count in (10, 100, 1000):
+            game_state = GameState(quests_dir='.')
+            for index in xrange(object_count):
+                game_state.addObject('object_%d' % index, 'map', object())
+            game_state.current_map_name = 'map'
+            conditions = [compile('object_%d is not None and sqrt(4) == 2' %
+                                  (index % object_count), '<bench>', 'eval')
+                          for index in xrange(opts.conditions)]
+            copied = measure(
+                lambda: simulateFrames(lambda: copyEnvironment(game_state),
+                                       conditions, opts.frames),
+                repeat=3
+            )
+            persistent = measure(
+                lambda: simulateFrames(game_state.getGameEnvironment,
+                                       conditions, opts.frames),
+                repeat=3
+            )
+            rows.append([object_count,
+                         '%.3f' % (copied / opts.frames * 1000),
+                         '%.3f' % (persistent / opts.frames * 1000),
+                         '%.1fx' % (copied / persistent)])
+        printTable(['objects', 'copied ms/frame', 'persistent ms/frame',
+                    'speedup'], rows)
+    finally:
+        shutil.rmtree(quests_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare creating the items of an inventory and saving the game when the
+saved values of all entities are updated after every created item, as
+GameModel.createItem did, with saving only the created item and updating the
+other entities that changed when saving."""
+import tempfile
+import shutil
+from optparse import OptionParser
+
+from benchmarking import LocalVFS, measure, printTable
+
+from bGrease.world import BaseWorld
+
+from parpg import vfs, yamlio, components
+from parpg.components import container
+from parpg.entities import createEntity, serializeEntity
+from parpg.gamestate import GameState
+
+class GameWorld(BaseWorld):
+    def configure(self):
+        for name, component in components.components.iteritems():
+            setattr(self.components, name, component)
+
+class SavedObjects(object):
+    """The parts of the GameModel that keep the saved values"""
+
+    def __init__(self, map_object_count):
+        self.world = GameWorld()
+        self.game_state = GameState(quests_dir='.')
+        self.items = {}
+        for index in xrange(map_object_count):
+            identifier = 'barrel_%d' % index
+            barrel = createEntity({'description': {'view_name': 'Barrel',
+                                                   'real_name': 'Barrel',
+                                                   'desc': 'A barrel.'},
+                                   'lockable': {'closed': True,
+                                                'locked': False}},
+                                  identifier, self.world)
+            self.game_state.addObject(identifier, 'map', barrel)
+        self.chest = createEntity({'container': {'children': [],
+                                                 'max_bulk': 100000}},
+                                  'chest', self.world)
+        self.game_state.addObject('chest', 'map', self.chest)
+
+    def saveEntity(self, entity):
+        entity_data, object_data = serializeEntity(entity)
+        saved = self.items.setdefault(entity.general.identifier, {})
+        saved.update(object_data)
+        saved['Entity'] = entity_data
+
+    def saveAll(self):
+        for entity in self.world.entities:
+            self.saveEntity(entity)
+
+    def saveChanged(self):
+        for entity in self.game_state.popUnsavedEntities():
+            if entity in self.world.entities:
+                self.saveEntity(entity)
+
+    def createItem(self, index):
+        identifier = 'coin_%d' % index
+        item = createEntity({'description': {'view_name': 'Coin',
+                                             'real_name': 'Coin',
+                                             'desc': 'A coin.'},
+                             'containable': {'bulk': 1, 'weight': 1,
+                                             'item_type': 'coin'}},
+                            identifier, self.world)
+        self.game_state.addObject(identifier, None, item)
+        return item
+
+def createItemsAndSave(item_count, map_object_count, changed_only):
+    saved_objects = SavedObjects(map_object_count)
+    saved_objects.chest.container.children = [None] * item_count
+    for index in xrange(item_count):
+        item = saved_objects.createItem(index)
+        if changed_only:
+            saved_objects.saveEntity(item)
+        else:
+            saved_objects.saveAll()
+        container.put_item(saved_objects.chest.container, item.containable)
+    if changed_only:
+        saved_objects.saveChanged()
+    else:
+        saved_objects.saveAll()
+    yamlio.dump(saved_objects.items)
+
+def main():
+    parser = OptionParser(description=__doc__)
+    parser.add_option('-i', '--items', type='int', default=500,
+                      help='Number of items to create')
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help='Number of measurements to take the best of')
+    opts, args = parser.parse_args()
+
+    quests_dir = tempfile.mkdtemp()
+    try:
+        vfs.VFS = LocalVFS(quests_dir)
+        rows = []
+        for map_object_count in (0, 100, 1000):
+            full_pass = measure(
+                lambda: createItemsAndSave(opts.items, map_object_count,
+                                           False),
+                opts.repeat
+            )
+            changed_only = measure(
+                lambda: createItemsAndSave(opts.items, map_object_count,
+                                           True),
+                opts.repeat
+            )
+            rows.append([opts.items, map_object_count,
+                         '%.1f' % (full_pass * 1000),
+                         '%.1f' % (changed_only * 1000),
+                         '%.1fx' % (full_pass / changed_only)])
+        printTable(['items', 'map objects', 'all entities ms',
+                    'changed entities ms', 'speedup'], rows)
+    finally:
+        shutil.rmtree(quests_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare finding the object files of an objects directory by parsing every
+XML file, with an empty object index (cold start) and with a stored index
+(warm start). Without an objects directory, synthetic object files are
+generated."""
+import os
+import tempfile
+import shutil
+from optparse import OptionParser
+import xml.etree.cElementTree as ElementTree
+
+from benchmarking import LocalVFS, measure, printTable
+
+from parpg import vfs
+from parpg.objectindex import ObjectIndex
+from parpg.common.utils import locateFiles
+
+OBJECT_TEMPLATE = """\
+<?xml version="1.0" encoding="ascii"?>
+<object id="object_{0}" namespace="PARPG" blocking="1" static="1">
+{1}</object>
+"""
+
+ACTION_TEMPLATE = """\
+  <action id="action_{0}">
+    <animation atlas="object.png" width="64" height="64" frames="8"
+               delay="100" x_offset="-32" y_offset="-48" direction="{1}" />
+  </action>
+"""
+
+def generateData(data_dir, dir_count, file_count):
+    """Writes dir_count directories with file_count object files each"""
+    actions = ''.join(ACTION_TEMPLATE.format(action, direction)
+                      for action in xrange(4)
+                      for direction in xrange(0, 360, 45))
+    for dir_index in xrange(dir_count):
+        object_dir = os.path.join(data_dir, 'objects', 'dir_%d' % dir_index)
+        os.makedirs(object_dir)
+        for file_index in xrange(file_count):
+            object_id = '%d_%d' % (dir_index, file_index)
+            with open(os.path.join(object_dir, 'object_%d.xml' % file_index),
+                      'w') as object_file:
+                object_file.write(OBJECT_TEMPLATE.format(object_id, actions))
+
+def parseAll():
+    """Finds the object files the way GameModel did before the index"""
+    object_files = {}
+    for filepath in locateFiles('*.xml', 'objects'):
+        root = ElementTree.parse(vfs.VFS.open(filepath)).getroot()
+        if root.tag == 'object':
+            object_files[root.attrib['id']] = filepath
+    return object_files
+
+def main():
+    parser = OptionParser(usage='%prog [options] [data_dir]',
+                          description=__doc__)
+    parser.add_option('-d', '--dirs', type='int', default=20,
+                      help='Number of directories to generate')
+    parser.add_option('-n', '--files', type='int', default=50,
+                      help='Number of object files per generated directory')
+    opts, args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        if args:
+            data_dir = os.path.abspath(args[0])
+        else:
+            data_dir = os.path.join(temp_dir, 'data')
+            generateData(data_dir, opts.dirs, opts.files)
+        index_path = os.path.join(temp_dir, 'cache', 'objects.idx')
+        vfs.VFS = LocalVFS(data_dir)
+
+        parsed = measure(parseAll)
+        cold = measure(lambda: ObjectIndex(data_dir, index_path, rebuild=True)
+                       .locateObjects('objects'))
+        warm_index = ObjectIndex(data_dir, index_path)
+        warm = measure(lambda: warm_index.locateObjects('objects'))
+        print '%d object files, %d read with the warm index' % (
+            len(parseAll()), warm_index.parsed_files)
+        printTable(['startup', 'ms', 'speedup'],
+                   [['parse all', '%.1f' % (parsed * 1000), '1.0x'],
+                    ['cold', '%.1f' % (cold * 1000),
+                     '%.1fx' % (parsed / cold)],
+                    ['warm', '%.1f' % (warm * 1000),
+                     '%.1fx' % (parsed / warm)]])
+    finally:
+        shutil.rmtree(temp_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare the save and load times and the peak memory use of YAML saves and
+binary saves for synthetic worlds. Every measurement runs in its own process,
+so that the peak memory use of one doesn't hide that of another. The time of
+copying the world for an autosave, which stalls the main thread, is measured
+too, for the first autosave and for one after 1% of the objects changed."""
+import os
+import time
+import resource
+import tempfile
+import shutil
+import multiprocessing
+from optparse import OptionParser
+
+from benchmarking import printTable
+
+from parpg import yamlio, savegame, delta
+from parpg.autosave import SnapshotCopies
+
+def createWorld(agent_count, map_count):
+    """Returns the agents, items and game state of a synthetic world"""
+    agents = {'All': {}}
+    items = {}
+    for map_index in xrange(map_count):
+        map_agents = agents['Map_%d' % map_index] = {}
+        for index in xrange(agent_count / map_count):
+            identifier = 'Agent_%d_%d' % (map_index, index)
+            map_agents[identifier] = {
+                'Entity': {
+                    'general': {'identifier': identifier},
+                    'description': {'view_name': identifier,
+                                    'real_name': 'Agent %s' % identifier,
+                                    'desc': 'An agent generated by the '
+                                            'benchmark.'},
+                    'graphics': {'gfx': 'barrel'},
+                    'lockable': {'closed': True, 'locked': False},
+                    'container': {'max_bulk': 100},
+                },
+                'Inventory': {'Slots': 10,
+                              'Items': [{'ID': 'Item_%s' % identifier,
+                                         'Slot': 0}]},
+                'Position': (float(index), float(index % 7), 0.0),
+                'Rotation': 90,
+            }
+            items['Item_%s' % identifier] = {
+                'Entity': {
+                    'general': {'identifier': 'Item_%s' % identifier},
+                    'containable': {'bulk': 1, 'weight': 1,
+                                    'item_type': 'Beer', 'slot': 0},
+                    'description': {'view_name': 'Beer',
+                                    'real_name': 'Beer',
+                                    'desc': 'A bottle of beer.'},
+                },
+            }
+    game_state = {'CurrentMap': 'Map_0',
+                  'NPCsMet': set(['Agent_0_1']),
+                  'Quests': {'Variables': {'beer': {'found': 1}},
+                             'ActiveQuests': ['beer'],
+                             'FinishedQuests': [],
+                             'FailedQuests': []},
+                  'locals': {}}
+    return agents, items, game_state
+
+def saveYaml(file_name, agents, items, game_state):
+    with open(file_name, 'wb') as save_file:
+        yamlio.dump({'Agents': agents, 'Items': items,
+                     'GameState': game_state}, save_file)
+
+def saveBinary(file_name, agents, items, game_state):
+    with open(file_name, 'wb') as save_file:
+        savegame.writeSave(save_file, game_state, agents.iteritems(), items)
+
+def loadYaml(file_name):
+    with open(file_name, 'rb') as load_file:
+        save_state = yamlio.load(load_file)
+    return save_state['Agents']['Map_0']
+
+def loadBinary(file_name):
+    with open(file_name, 'rb') as load_file:
+        reader = savegame.SaveReader(load_file)
+        reader.readGameState()
+        agents = reader.readMap('Map_0')
+        for map_name in reader.getMapNames():
+            reader.readMap(map_name)
+        reader.readItems()
+    return agents
+
+def loadBinaryCurrentMap(file_name):
+    with open(file_name, 'rb') as load_file:
+        reader = savegame.SaveReader(load_file)
+        reader.readGameState()
+        return reader.readMap('Map_0')
+
+def copyWorld(copies, agents, items, game_state):
+    """Copies the world like GameModel.createSnapshot"""
+    snapshot = ([(map_name, dict((name, copies.copy(name, values))
+                                 for name, values in map_agents.iteritems()))
+                 for map_name, map_agents in agents.iteritems()],
+                dict((identifier, copies.copy(identifier, values))
+                     for identifier, values in items.iteritems()),
+                delta.copy(game_state))
+    copies.finish()
+    return snapshot
+
+def measureSnapshot(results, agent_count, map_count, changed):
+    agents, items, game_state = createWorld(agent_count, map_count)
+    copies = SnapshotCopies()
+    if changed:
+        copyWorld(copies, agents, items, game_state)
+        identifiers = list(items)
+        for map_agents in agents.itervalues():
+            identifiers.extend(map_agents)
+        for identifier in identifiers[::100]:
+            copies.markChanged(identifier)
+    memory = peakMemory()
+    start = time.time()
+    copyWorld(copies, agents, items, game_state)
+    results.put((time.time() - start, peakMemory() - memory))
+
+def peakMemory():
+    """Returns the peak memory use of the process in KiB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measureSave(results, save, file_name, agent_count, map_count):
+    world = createWorld(agent_count, map_count)
+    memory = peakMemory()
+    start = time.time()
+    save(file_name, *world)
+    results.put((time.time() - start, peakMemory() - memory))
+
+def measureLoad(results, load, file_name):
+    memory = peakMemory()
+    start = time.time()
+    load(file_name)
+    results.put((time.time() - start, peakMemory() - memory))
+
+def runMeasurement(target, *args):
+    """Runs a measurement in a new process and returns its results"""
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=(results,) + args)
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def main():
+    parser = OptionParser(description=__doc__)
+    parser.add_option('-m', '--maps', type='int', default=10,
+                      help='Number of maps of the world')
+    opts, args = parser.parse_args()
+
+    save_dir = tempfile.mkdtemp()
+    try:
+        rows = []
+        for agent_count in (1000, 10000, 50000):
+            yaml_file = os.path.join(save_dir, 'save.yaml')
+            binary_file = os.path.join(save_dir, 'save.dat')
+            for name, save, load, file_name in (
+                    ('yaml', saveYaml, loadYaml, yaml_file),
+                    ('binary', saveBinary, loadBinary, binary_file)):
+                save_time, save_memory = runMeasurement(
+                    measureSave, save, file_name, agent_count, opts.maps)
+                load_time, load_memory = runMeasurement(measureLoad, load,
+                                                        file_name)
+                rows.append([agent_count, name,
+                             '%.0f' % (os.path.getsize(file_name) / 1024.0),
+                             '%.1f' % (save_time * 1000),
+                             '%.0f' % (save_memory / 1024.0),
+                             '%.1f' % (load_time * 1000),
+                             '%.0f' % (load_memory / 1024.0)])
+            load_time, load_memory = runMeasurement(
+                measureLoad, loadBinaryCurrentMap, binary_file)
+            rows.append([agent_count, 'binary, current map', '',
+                         '', '', '%.1f' % (load_time * 1000),
+                         '%.0f' % (load_memory / 1024.0)])
+            for name, changed in (('first snapshot', False),
+                                  ('snapshot, 1% changed', True)):
+                copy_time, copy_memory = runMeasurement(
+                    measureSnapshot, agent_count, opts.maps, changed)
+                rows.append([agent_count, name, '',
+                             '%.1f' % (copy_time * 1000),
+                             '%.0f' % (copy_memory / 1024.0), '', ''])
+        printTable(['agents', 'format', 'KiB', 'save ms', 'save peak MiB',
+                    'load ms', 'load peak MiB'], rows)
+    finally:
+        shutil.rmtree(save_dir)
+
+if __name__ == '__main__':
+    main()
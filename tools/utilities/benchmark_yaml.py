@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare the load and save times of the pure Python YAML loader and dumper
+with those of parpg.yamlio, for the YAML files of a game data directory and
+for synthetic saves."""
+import os
+from optparse import OptionParser
+
+from benchmarking import measure, printTable
+
+import yaml
+
+from parpg import yamlio
+
+def createSaveState(agent_count):
+    """Returns a save state similar to the ones written by GameModel.save"""
+    agents = {}
+    for index in xrange(agent_count):
+        agents['Agent_%d' % index] = {
+            'Entity': {
+                'general': {'identifier': 'Agent_%d' % index},
+                'description': {'view_name': 'Agent %d' % index,
+                                'real_name': 'Agent number %d' % index,
+                                'desc': 'An agent generated by the '
+                                        'benchmark.'},
+                'graphics': {'gfx': 'barrel'},
+                'lockable': {'closed': True, 'locked': False},
+            },
+            'Position': (float(index), float(index % 7), 0.0),
+            'Rotation': 90,
+            'Map': 'Mall',
+        }
+    return {'Agents': {'Mall': agents},
+            'Items': {},
+            'GameState': {'CurrentMap': 'Mall',
+                          'NPCsMet': set(['Agent_1']),
+                          'Quests': {},
+                          'locals': {}}}
+
+def findYamlFiles(data_dir):
+    yaml_files = []
+    for directory, dirnames, filenames in os.walk(data_dir):
+        yaml_files.extend(os.path.join(directory, filename)
+                          for filename in filenames
+                          if filename.endswith('.yaml'))
+    return yaml_files
+
+def loadFiles(yaml_files, load_all):
+    for yaml_file in yaml_files:
+        with open(yaml_file, 'rb') as stream:
+            list(load_all(stream))
+
+def main():
+    parser = OptionParser(usage='%prog [options] [data_dir]',
+                          description=__doc__)
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help='Number of measurements to take the best of')
+    opts, args = parser.parse_args()
+
+    print 'libyaml available: %s' % yamlio.LIBYAML
+    python_load_all = lambda stream: yaml.load_all(stream, Loader=yaml.Loader)
+    python_dump = lambda data: yaml.dump(data, Dumper=yaml.Dumper)
+    rows = []
+    if args:
+        yaml_files = findYamlFiles(args[0])
+        python_time = measure(lambda: loadFiles(yaml_files, python_load_all),
+                              opts.repeat)
+        yamlio_time = measure(lambda: loadFiles(yaml_files, yamlio.load_all),
+                              opts.repeat)
+        rows.append(['load %d data files' % len(yaml_files),
+                     '%.1f' % (python_time * 1000),
+                     '%.1f' % (yamlio_time * 1000),
+                     '%.1fx' % (python_time / yamlio_time)])
+    for agent_count in (100, 1000, 5000):
+        save_state = createSaveState(agent_count)
+        python_time = measure(lambda: python_dump(save_state), opts.repeat)
+        yamlio_time = measure(lambda: yamlio.dump(save_state), opts.repeat)
+        rows.append(['save %d agents' % agent_count,
+                     '%.1f' % (python_time * 1000),
+                     '%.1f' % (yamlio_time * 1000),
+                     '%.1fx' % (python_time / yamlio_time)])
+        saved = yamlio.dump(save_state)
+        python_time = measure(lambda: yaml.load(saved, Loader=yaml.Loader),
+                              opts.repeat)
+        yamlio_time = measure(lambda: yamlio.load(saved), opts.repeat)
+        rows.append(['load %d agents' % agent_count,
+                     '%.1f' % (python_time * 1000),
+                     '%.1f' % (yamlio_time * 1000),
+                     '%.1fx' % (python_time / yamlio_time)])
+    printTable(['operation', 'python ms', 'yamlio ms', 'speedup'], rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Helpers shared by the benchmark scripts.
+
+The benchmarks run without FIFE, so L{LocalVFS} provides the part of the FIFE
+VFS interface that PARPG uses on top of a directory of the local file system.
+"""
+import os.path
+import sys
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                                 os.path.pardir,
+                                                 os.path.pardir)))
+import time
+
+class LocalVFS(object):
+    """Read-only VFS on top of a local directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, path):
+        return os.path.join(self.root, path)
+
+    def open(self, path):
+        return file(self._path(path), 'rb')
+
+    def exists(self, path):
+        return os.path.exists(self._path(path))
+
+    def listFiles(self, path):
+        path = self._path(path)
+        return [name for name in os.listdir(path)
+                if os.path.isfile(os.path.join(path, name))]
+
+    def listDirectories(self, path):
+        path = self._path(path)
+        return [name for name in os.listdir(path)
+                if os.path.isdir(os.path.join(path, name))]
+
+def measure(function, repeat=1):
+    """Calls function repeat times and returns the best time in seconds"""
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        function()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+def printTable(header, rows):
+    """Prints the rows as a table with aligned columns"""
+    rows = [header] + [[str(value) for value in row] for row in rows]
+    widths = [max(len(row[column]) for row in rows)
+              for column in xrange(len(header))]
+    for row in rows:
+        print '  '.join(value.rjust(width) 
+                        for value, width in zip(row, widths))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Validate the YAML dialogue files of a data directory and compile them into
+the dialogue bundle that the game loads instead of the YAML files.
+
+The bundle contains compiled Python code, so it has to be compiled with the
+Python version that runs the game. The game parses the YAML files that
+changed since they were compiled, until the bundle is compiled again. Delete
+it to make the game read all YAML files again."""
+import os.path
+import sys
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                                 os.path.pardir,
+                                                 os.path.pardir)))
+import fnmatch
+import logging
+from optparse import OptionParser
+
+import yaml
+
+from parpg.dialogueparsers import YamlDialogueParser, DialogueFormatError
+from parpg.dialoguebundle import writeBundle
+from parpg.dialoguegraph import DialogueGraph
+
+def findDialogueFiles(data_dir, dialogue_dir):
+    """Returns the VFS paths of the YAML files in and below the dialogue
+    directory"""
+    filepaths = []
+    for root, dirs, files in os.walk(os.path.join(data_dir, dialogue_dir)):
+        dirs.sort()
+        for filename in sorted(fnmatch.filter(files, '*.yaml')):
+            filepath = os.path.relpath(os.path.join(root, filename),
+                                       data_dir)
+            filepaths.append(filepath.replace(os.sep, '/'))
+    return filepaths
+
+def checkDialogue(dialogue):
+    """Returns a list of the problems of a parsed dialogue"""
+    problems = []
+    if not dialogue.npc_name:
+        problems.append('no NPC_NAME')
+    if dialogue.default_greeting is None:
+        problems.append('no DEFAULT_GREETING')
+        return problems
+    for section_id, section in dialogue.sections.iteritems():
+        nodes = [section] + list(getattr(section, 'responses', []))
+        for node in nodes:
+            if None in node.actions:
+                problems.append('unknown action in section {0}'
+                                .format(section_id))
+    for section_id, target in DialogueGraph(dialogue).unknown_targets:
+        problems.append('section {0} goes to unknown section {1}'
+                        .format(section_id, target))
+    return problems
+
+def compileDialogues(data_dir, dialogue_dir):
+    """Parses and checks the dialogue files
+    @return: A list of the dialogues and their VFS paths, and the number of
+    files with problems"""
+    parser = YamlDialogueParser()
+    dialogues = []
+    npc_files = {}
+    error_count = 0
+    for filepath in findDialogueFiles(data_dir, dialogue_dir):
+        try:
+            with open(os.path.join(data_dir, filepath)) as dialogue_file:
+                dialogue = parser.load(dialogue_file)
+            problems = checkDialogue(dialogue)
+        except (DialogueFormatError, AssertionError, yaml.YAMLError) as error:
+            problems = [str(error)]
+        if not problems and dialogue.npc_name in npc_files:
+            problems = ['{0} already has a dialogue in {1}'
+                        .format(dialogue.npc_name,
+                                npc_files[dialogue.npc_name])]
+        if problems:
+            error_count += 1
+            for problem in problems:
+                logging.error('{0}: {1}'.format(filepath, problem))
+            continue
+        npc_files[dialogue.npc_name] = filepath
+        dialogues.append((dialogue, filepath))
+        logging.info('{0}: {1} sections'.format(filepath,
+                                                len(dialogue.sections)))
+    return dialogues, error_count
+
+def main():
+    parser = OptionParser(usage='%prog [options] data_dir',
+                          description=__doc__)
+    parser.add_option('-d', '--dialogues', default='dialogue',
+                      help='Directory of the dialogues in the data directory '
+                           '(DialoguesPath)')
+    parser.add_option('-o', '--output',
+                      help='Bundle to write, by default dialogues.bundle in '
+                           'the data directory (DialogueBundle)')
+    parser.add_option('-n', '--check', action='store_true', default=False,
+                      help='Only check the dialogues')
+    parser.add_option('-v', '--verbose', action='store_true', default=False,
+                      help='List every compiled dialogue')
+    opts, args = parser.parse_args()
+    if len(args) != 1:
+        parser.print_help()
+        sys.exit(1)
+    logging.basicConfig(format='%(message)s',
+                        level=logging.INFO if opts.verbose else logging.WARNING)
+
+    data_dir = args[0]
+    dialogues, error_count = compileDialogues(data_dir, opts.dialogues)
+    if error_count:
+        print '{0} dialogue files have problems, no bundle written'.format(
+            error_count)
+        sys.exit(1)
+    if opts.check:
+        print '{0} dialogues are valid'.format(len(dialogues))
+        return
+    output = opts.output or os.path.join(data_dir, 'dialogues.bundle')
+    temp_path = output + '.tmp'
+    with open(temp_path, 'wb') as bundle_file:
+        writeBundle(bundle_file, dialogues, data_dir)
+    if os.name == 'nt' and os.path.exists(output):
+        os.remove(output)
+    os.rename(temp_path, output)
+    print 'compiled {0} dialogues into {1}'.format(len(dialogues), output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Convert saved games between the binary save format and YAML, for reading
+or editing them while debugging. The format of the output is chosen by its
+extension: .yaml for YAML, anything else for the binary format."""
+import os.path
+import sys
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                                 os.path.pardir,
+                                                 os.path.pardir)))
+from optparse import OptionParser
+
+from parpg import yamlio, savegame
+
+def readSave(file_name):
+    """Returns the saved game in a file of either format"""
+    with open(file_name, 'rb') as save_file:
+        if savegame.isSaveFile(save_file):
+            return savegame.SaveReader(save_file).readAll()
+        return yamlio.load(save_file)
+
+def writeSave(file_name, save_state):
+    with open(file_name, 'wb') as save_file:
+        if file_name.endswith('.yaml'):
+            yamlio.dump(save_state, save_file)
+            return
+        savegame.writeSave(save_file, save_state['GameState'],
+                           save_state['Agents'].iteritems(),
+                           save_state['Items'],
+                           delta=save_state.get('Delta', False))
+
+def main():
+    parser = OptionParser(usage='%prog input_file output_file',
+                          description=__doc__)
+    opts, args = parser.parse_args()
+    if len(args) != 2:
+        parser.error('expected an input and an output file')
+    try:
+        writeSave(args[1], readSave(args[0]))
+    except (IOError, savegame.SaveFormatError), error:
+        sys.exit('unable to convert {0}: {1}'.format(args[0], error))
+
+if __name__ == '__main__':
+    main()